@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark of the embedding API (see happylang_api).
+
+Runs many short distinct scripts (generated by gen_program) and reports the
+runs per second of:
+    spawn: a python happy.py process per script (without the cache)
+    compile+run: Interpreter.compile then Program.run per script, in this process
+    run: Program.run of the scripts compiled beforehand
+The outputs of the three are compared.
+
+usage: python benchmarks/bench_api.py [--scripts N] [--spawn N] [--engine ENGINE]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from happylang_api import Interpreter
+from happy import ENGINES
+from gen_program import generate
+
+
+def spawn(paths, engine):
+    outputs = []
+    for path in paths:
+        result = subprocess.run([sys.executable, os.path.join(ROOT, "happy.py"), "--no-cache",
+                                 "--engine", engine, path],
+                                stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        outputs.append(result.stdout)
+
+    return outputs
+
+
+def compile_and_run(sources, engine):
+    interpreter = Interpreter(engine, programs=0)
+    return [interpreter.compile(source).run() for source in sources]
+
+
+def run(programs):
+    return [program.run() for program in programs]
+
+
+def report(label, runs, elapsed):
+    print(f"  {label:<12} {runs:6} runs {elapsed:8.3f}s  {runs/elapsed:10.1f} runs/s")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Throughput of the embedding API against a process per script")
+    arg_parser.add_argument("--scripts", type=int, default=1000, help="number of scripts run in process")
+    arg_parser.add_argument("--spawn", type=int, default=50, help="number of scripts run by a process each")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="closure")
+    args = arg_parser.parse_args()
+
+    sources = [generate("functions", 5, seed) for seed in range(args.scripts)]
+    print(f"{args.scripts} scripts of {sum(map(len, sources))//len(sources)} chars, engine {args.engine}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, source in enumerate(sources[:args.spawn]):
+            paths.append(os.path.join(directory, f"script{i}.happy"))
+            with open(paths[-1], "w", encoding="utf8") as f:
+                f.write(source)
+
+        start = time.perf_counter()
+        spawned = spawn(paths, args.engine)
+        report("spawn", len(paths), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    compiled = compile_and_run(sources, args.engine)
+    report("compile+run", len(sources), time.perf_counter() - start)
+
+    interpreter = Interpreter(args.engine, programs=len(sources))
+    programs = [interpreter.compile(source) for source in sources]
+    start = time.perf_counter()
+    reused = run(programs)
+    report("run", len(sources), time.perf_counter() - start)
+
+    if spawned != compiled[:len(spawned)] or compiled != reused:
+        print("the outputs differ!")
+        sys.exit(1)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the representation of NUMBER arrays.
+
+Runs bubble-sort and squarelist (with its 10 numbers raised to n) on n
+numbers, with NUMBER arrays stored as array('d') (see happylang_runtime.new_array)
+and as lists of floats (as STRING arrays), and reports the best run time and,
+for squarelist, the peak memory of the run, measured by tracemalloc on a
+separate run (tracing every float of bubble-sort would take too long).
+
+usage: python benchmarks/bench_arrays.py [bubble-sort n] [squarelist n] [repetitions] [engine ...]
+"""
+
+import contextlib
+import gc
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import happy
+import happylang_closure
+import happylang_vm
+from happy import ENGINES, parse_program
+from happylang_runtime import new_array, default_number
+
+SAMPLES = os.path.join(ROOT, "sample_programs")
+
+"""
+Engine modules which allocate the arrays
+"""
+ENGINE_MODULES = [happy, happylang_closure, happylang_vm]
+
+
+def new_list(t, length):
+    """
+    NUMBER arrays as lists of floats, as before array('d')
+    """
+    return [default_number()]*int(length)
+
+
+def use_arrays(allocate):
+    for module in ENGINE_MODULES:
+        module.new_array = allocate
+
+
+def numbers_input(n, with_count, seed=0):
+    rnd = random.Random(seed)
+    numbers = [str(rnd.randint(0, 10*n)) for _ in range(n)]
+    return "\n".join(([str(n)] if with_count else []) + numbers) + "\n"
+
+
+def run(engine, tree, stdin, traced):
+    """
+    Returns
+    -------
+    (output, elapsed seconds, peak bytes or None)
+    """
+    out = io.StringIO()
+    old_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    gc.collect()
+    try:
+        with contextlib.redirect_stdout(out):
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            ENGINES[engine](tree)
+            elapsed = time.perf_counter() - start
+            peak = None
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    finally:
+        sys.stdin = old_stdin
+
+    return out.getvalue(), elapsed, peak
+
+
+if __name__ == "__main__":
+    bubble_n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    square_n = int(sys.argv[2]) if len(sys.argv) > 2 else 10**6
+    repetitions = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    engines = sys.argv[4:] or ["closure", "vm"]
+
+    with open(os.path.join(SAMPLES, "bubble-sort.happy"), encoding="utf8") as f:
+        bubble = parse_program(f)
+    with open(os.path.join(SAMPLES, "squarelist.happy"), encoding="utf8") as f:
+        square = parse_program(io.StringIO(f.read().replace("10", str(square_n))))
+
+    workloads = [(f"bubble-sort n={bubble_n}", bubble, numbers_input(bubble_n, True), False),
+                 (f"squarelist n={square_n}", square, numbers_input(square_n, False), True)]
+
+    for name, tree, stdin, traced in workloads:
+        print(name)
+        for engine in engines:
+            results = {}
+            for label, allocate in (("list", new_list), ("array('d')", new_array)):
+                use_arrays(allocate)
+                elapsed = None
+                for _ in range(repetitions):
+                    output, t, _ = run(engine, tree, stdin, traced=False)
+                    elapsed = t if elapsed is None else min(elapsed, t)
+
+                results[label] = output
+                if traced:
+                    _, _, peak = run(engine, tree, stdin, traced=True)
+                    print(f"  {engine:<8} {label:<11} {elapsed:8.3f}s  peak {peak/(1024*1024):8.2f} MB")
+                else:
+                    print(f"  {engine:<8} {label:<11} {elapsed:8.3f}s")
+
+            if results["list"] != results["array('d')"]:
+                print(f"  output of {engine} differs!")
+                sys.exit(-1)
+
+    use_arrays(new_array)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark of the batch runner (see happylang_batch).
+
+Runs the same CPU-bound batch, the programs of the benchmark suite (see
+run_suite) repeated --rounds times, with a growing number of worker
+processes, and reports the wall time, the speedup against one worker and
+the efficiency (speedup / workers). An efficiency below --limit with no
+more workers than cores is flagged.
+
+usage: python benchmarks/bench_batch.py [--workers N ...] [--rounds R] [--engine ENGINE] [--limit E]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from happylang_batch import Job, run_batch
+from happy import ENGINES
+from run_suite import PROGRAMS, SUITE, make_inputs
+
+
+def suite_jobs(rounds):
+    """
+    Returns
+    -------
+    Job []
+        the programs of the suite, rounds times
+    """
+    make_inputs()
+    jobs = [Job(os.path.join(SUITE, name + ".happy"), None if stdin is None else os.path.join(SUITE, stdin), None)
+            for name, stdin in PROGRAMS.items()]
+    return jobs * rounds
+
+
+if __name__ == "__main__":
+    cores = os.cpu_count() or 1
+    default_workers = sorted({min(w, cores) for w in (1, 2, 4, 8, 16, 32, 64)} | {cores})
+
+    arg_parser = argparse.ArgumentParser(description="Scaling of the batch runner with the number of workers")
+    arg_parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    arg_parser.add_argument("--rounds", type=int, default=None,
+                            help="repetitions of the suite (default: the largest number of workers)")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    arg_parser.add_argument("--limit", type=float, default=0.8, help="efficiency below which the scaling is flagged")
+    args = arg_parser.parse_args()
+
+    jobs = suite_jobs(args.rounds or max(args.workers))
+    print(f"{len(jobs)} jobs, engine {args.engine}, {cores} cores")
+
+    # the speedups are against one worker
+    base = None
+    poor = False
+    for workers in sorted(set(args.workers) | {1}):
+        start = time.perf_counter()
+        results = run_batch(jobs, workers, args.engine)
+        wall = time.perf_counter() - start
+
+        failed = [r for r in results if r.status != "ok"]
+        if failed:
+            print(f"  {len(failed)} jobs failed, e.g. {failed[0].script}: {failed[0].error}")
+            sys.exit(1)
+
+        base = base or wall
+        speedup = base / wall
+        efficiency = speedup / workers
+        flag = efficiency < args.limit and workers <= cores
+        poor = poor or flag
+        print(f"  {workers:3} workers {wall:8.3f}s  speedup {speedup:5.2f}  efficiency {efficiency:5.2f}"
+              f"{'  POOR SCALING' if flag else ''}")
+
+    if poor:
+        sys.exit(1)
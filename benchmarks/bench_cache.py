@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the cache of precompiled programs.
+
+For the sample programs and a generated program of many functions, compares
+the time to get a runnable parse tree by a cold parse (lex, parse, resolve,
+type check) with the time to load it from the cache (.happyc), then the
+startup of happy.py in a new process with --no-cache and with a cache hit.
+
+usage: python benchmarks/bench_cache.py [functions] [repetitions]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happy import load_program
+from happylang_cache import ProgramCache
+
+SAMPLES = os.path.join(ROOT, "sample_programs")
+
+
+def make_program(functions):
+    """
+    Source of a program of the given number of functions, only the first one
+    is called so that running the program takes little time next to its startup
+    """
+    parts = ["main(){", "  NUMBER total"]
+    parts.append("  total := f0(1)")
+    parts.append('  println "total: ", total')
+    parts.append("}")
+
+    for i in range(functions):
+        parts.append(f"""
+f{i}(NUMBER n){{
+  NUMBER i
+  NUMBER s
+  NUMBER[10] a
+  for (i:=0; i<10; i:=i+1){{
+    a[i] := n*i + {i} - i%3
+    if a[i] > s && i <> 5 {{
+      s := s + a[i]/2
+    }}
+  }}
+  return s
+}}""")
+
+    return "\n".join(parts) + "\n"
+
+
+def best_time(fn, repetitions):
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def bench_load(path, cache, repetitions):
+    """
+    Returns
+    -------
+    (cold parse time, cache hit time)
+    """
+    cold = best_time(lambda: load_program(path), repetitions)
+
+    cache.clear(cache.directory(path))
+    load_program(path, cache=cache)
+    hit = best_time(lambda: load_program(path, cache=cache), repetitions)
+
+    return cold, hit
+
+
+def bench_startup(path, cache_dir, repetitions):
+    """
+    Returns
+    -------
+    (wall time of happy.py --no-cache, wall time of happy.py with a cache hit)
+    """
+    happy = os.path.join(ROOT, "happy.py")
+
+    def run(*options):
+        subprocess.run([sys.executable, happy, *options, path], stdout=subprocess.DEVNULL,
+                       stdin=subprocess.DEVNULL, check=True)
+
+    cold = best_time(lambda: run("--no-cache"), repetitions)
+    run("--cache-dir", cache_dir)
+    hit = best_time(lambda: run("--cache-dir", cache_dir), repetitions)
+
+    return cold, hit
+
+
+if __name__ == "__main__":
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    sys.setrecursionlimit(100000)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        cache = ProgramCache(os.path.join(tmp_dir, "cache"))
+
+        generated = os.path.join(tmp_dir, f"generated-{functions}.happy")
+        with open(generated, "w", encoding="utf8") as f:
+            f.write(make_program(functions))
+
+        paths = [os.path.join(SAMPLES, name) for name in sorted(os.listdir(SAMPLES)) if name.endswith(".happy")]
+        paths.append(generated)
+
+        print("parse tree of the program (in process)")
+        for path in paths:
+            cold, hit = bench_load(path, cache, repetitions)
+            print(f"  {os.path.basename(path):<30} cold {cold*1000:8.2f}ms  cache hit {hit*1000:8.2f}ms  x{cold/hit:.1f}")
+
+        print("startup of happy.py (new process)")
+        cold, hit = bench_startup(generated, os.path.join(tmp_dir, "cache"), repetitions)
+        print(f"  {os.path.basename(generated):<30} cold {cold*1000:8.2f}ms  cache hit {hit*1000:8.2f}ms  x{cold/hit:.1f}")
+    finally:
+        shutil.rmtree(tmp_dir)
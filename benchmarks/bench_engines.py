@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the execution engines of happy.py.
+
+Runs sample programs on generated inputs with every engine in happy.ENGINES,
+times the execution (lexing and parsing excluded) and checks that all
+engines print the same output.
+
+usage: python benchmarks/bench_engines.py [repetitions]
+"""
+
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_lexer import HappyLexer
+from happylang_parser import HappyParser
+from happylang_resolver import resolve
+from happylang_typechecker import type_check
+from happy import ENGINES
+
+SAMPLES = os.path.join(ROOT, "sample_programs")
+
+
+def numbers_input(n, seed=0):
+    """
+    stdin of the sorting programs: n followed by n random numbers
+    """
+    rnd = random.Random(seed)
+    return "\n".join([str(n)] + [str(rnd.randint(0, 10 * n)) for _ in range(n)]) + "\n"
+
+
+WORKLOADS = [
+    ("quickSort.happy", numbers_input(2000)),
+    ("bubble-sort.happy", numbers_input(150)),
+    ("tower-of-hanoi-solver.happy", "12\n"),
+    ("squarelist.happy", "".join(f"{i}\n" for i in range(10))),
+]
+
+
+def parse(name):
+    with open(os.path.join(SAMPLES, name), encoding="utf8") as f:
+        tree = HappyParser(HappyLexer(f)).parse()
+
+    resolve(tree)
+    type_check(tree)
+    return tree
+
+
+def run(engine, tree, stdin):
+    """
+    Returns
+    -------
+    (output, elapsed seconds)
+    """
+    out = io.StringIO()
+    old_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    try:
+        with contextlib.redirect_stdout(out):
+            start = time.perf_counter()
+            ENGINES[engine](tree)
+            elapsed = time.perf_counter() - start
+    finally:
+        sys.stdin = old_stdin
+
+    return out.getvalue(), elapsed
+
+
+if __name__ == "__main__":
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    failed = False
+    for name, stdin in WORKLOADS:
+        tree = parse(name)
+        outputs = {}
+        times = {}
+        for engine in ENGINES:
+            for _ in range(repetitions):
+                output, elapsed = run(engine, tree, stdin)
+                times[engine] = min(times.get(engine, elapsed), elapsed)
+            outputs[engine] = output
+
+        base = times["tree"]
+        print(name)
+        for engine in ENGINES:
+            print(f"  {engine:<8} {times[engine]:8.3f}s  x{base/times[engine]:.2f}")
+            if outputs[engine] != outputs["tree"]:
+                print(f"  output of {engine} differs from tree!")
+                failed = True
+
+    if failed:
+        sys.exit(-1)
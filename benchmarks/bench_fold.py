@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the constant folder (see happylang_folder).
+
+Runs programs computing constant expressions and identities in a loop, and
+the programs of the suite (see run_suite.py), with every engine, unfolded
+and folded in turn, and reports the nodes eliminated and the time of the
+runs (min of the repetitions).
+
+usage: python benchmarks/bench_fold.py [-r REPETITIONS] [-n ITERATIONS] [--engine ENGINE ...]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from happylang_api import Interpreter
+from happylang_folder import fold
+from happy import ENGINES, parse_program
+from run_suite import SUITE, PROGRAMS, make_inputs
+
+
+def constants(n):
+    return ("main(){\n  NUMBER i\n  NUMBER x\n"
+            f"  for (i:=0; i<{n}; i:=i+1){{\n"
+            "    x := (2**10*4 - 60*60) / (3 + 5) + 24*60*60 % 7\n"
+            "  }\n  println x\n}\n")
+
+
+def identities(n):
+    return ("main(){\n  NUMBER i\n  NUMBER x\n"
+            f"  for (i:=0; i<{n}; i:=i+1){{\n"
+            "    x := i*1 + i/1 - 0 + i**2\n"
+            "  }\n  println x\n}\n")
+
+
+def concatenation(n):
+    return ("main(){\n  NUMBER i\n  STRING s\n"
+            f"  for (i:=0; i<{n}; i:=i+1){{\n"
+            "    s := \"line \" + 1 + \" of \" + 2*10 + \": \" + \"ok\"\n"
+            "  }\n  println s\n}\n")
+
+
+"""
+Programs of constant expressions -> generator of the program of n iterations
+"""
+PROGRAMS_FOLDED = {"constants": constants, "identities": identities, "concat": concatenation}
+
+
+def read(name):
+    with open(os.path.join(SUITE, name), encoding="utf8") as f:
+        return f.read()
+
+
+def eliminated(source):
+    return fold(parse_program(io.StringIO(source))).eliminated
+
+
+def compare(programs, stdin, repetitions):
+    """
+    Run the programs in turn, repetitions times, so that they are timed alike
+
+    Returns
+    -------
+    [(output, min elapsed seconds of the runs)] of every program
+    """
+    outputs = [None]*len(programs)
+    times = [[] for _ in programs]
+    for _ in range(repetitions):
+        for i, program in enumerate(programs):
+            start = time.perf_counter()
+            outputs[i] = program.run(stdin)
+            times[i].append(time.perf_counter() - start)
+
+    return [(output, min(program_times)) for output, program_times in zip(outputs, times)]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Constant folding against no folding")
+    arg_parser.add_argument("-r", "--repetitions", type=int, default=5)
+    arg_parser.add_argument("-n", "--iterations", type=int, default=20000)
+    arg_parser.add_argument("--engine", nargs="+", choices=sorted(ENGINES), default=list(ENGINES))
+    args = arg_parser.parse_args()
+
+    make_inputs()
+    sources = {name: (make(args.iterations), "") for name, make in PROGRAMS_FOLDED.items()}
+    for name, input_name in PROGRAMS.items():
+        sources[name] = (read(name + ".happy"), read(input_name) if input_name is not None else "")
+
+    for engine in args.engine:
+        unfolded = Interpreter(engine, fold=False)
+        folded = Interpreter(engine)
+        print(f"{engine}:")
+        for name, (source, stdin) in sources.items():
+            (output, unfolded_time), (folded_output, folded_time) = compare(
+                [unfolded.compile(source), folded.compile(source)], stdin, args.repetitions)
+            if folded_output != output:
+                print(f"  the output of {name} differs when folded!")
+                sys.exit(-1)
+
+            print(f"  {name:<10} {eliminated(source):4} nodes eliminated  unfolded {unfolded_time:8.3f}s  "
+                  f"folded {folded_time:8.3f}s  {unfolded_time/folded_time:5.2f}x")
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the resource governors (see happylang_governor).
+
+Runs the programs of the suite (see run_suite.py) with every engine,
+without a governor and with all the limits set high enough not to be
+reached, in turn, and reports the overhead of the limits (min of the
+repetitions).
+Then runs a runaway loop, a huge array, a deep recursion and a growing
+string under limits and prints the error stopping each.
+
+usage: python benchmarks/bench_governor.py [-r REPETITIONS] [--engine ENGINE ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from happylang_api import Interpreter
+from happylang_governor import Governor
+from happylang_errors import HappyLimitError
+from happy import ENGINES
+from run_suite import SUITE, PROGRAMS, make_inputs
+
+"""
+Limits not reached by the programs of the suite
+"""
+HIGH_LIMITS = Governor(max_steps=10**12, max_time=3600, max_elements=10**12, max_depth=10**6)
+
+LOOP = "main(){\n  NUMBER i\n  for (i:=0; i<1; i:=i*1){\n  }\n}\n"
+
+"""
+Programs stopped by a limit -> (source, limits)
+"""
+RUNAWAY = {
+    "runaway loop": (LOOP, Governor(max_steps=10**5)),
+    "endless loop": (LOOP, Governor(max_time=0.5)),
+    "huge array": ("main(){\n  NUMBER [1000000000] a\n}\n", Governor(max_elements=10**7)),
+    "deep recursion": ("main(){\n  println f(0)\n}\n\nf(NUMBER n){\n  NUMBER r\n  r := f(n+1)\n  return r\n}\n",
+                       Governor(max_depth=100)),
+    "growing string": ("main(){\n  STRING s\n  s := \"x\"\n  grow(s)\n}\n\n"
+                       "grow(STRING s){\n  NUMBER i\n  for (i:=0; i<1; i:=i*1){\n    s := s + s\n  }\n}\n",
+                       Governor(max_elements=10**6)),
+}
+
+
+def read(name):
+    with open(os.path.join(SUITE, name), encoding="utf8") as f:
+        return f.read()
+
+
+def compare(programs, stdin, repetitions):
+    """
+    Run the programs in turn, repetitions times, so that they are timed alike
+
+    Returns
+    -------
+    [(output, min elapsed seconds of the runs)] of every program
+    """
+    outputs = [None]*len(programs)
+    times = [[] for _ in programs]
+    for _ in range(repetitions):
+        for i, program in enumerate(programs):
+            start = time.perf_counter()
+            outputs[i] = program.run(stdin)
+            times[i].append(time.perf_counter() - start)
+
+    return [(output, min(program_times)) for output, program_times in zip(outputs, times)]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Overhead of the resource governors")
+    arg_parser.add_argument("-r", "--repetitions", type=int, default=10)
+    arg_parser.add_argument("--engine", nargs="+", choices=sorted(ENGINES), default=list(ENGINES))
+    args = arg_parser.parse_args()
+
+    make_inputs()
+    for engine in args.engine:
+        free = Interpreter(engine)
+        governed = Interpreter(engine, governor=HIGH_LIMITS)
+        print(f"{engine}:")
+        for name, input_name in PROGRAMS.items():
+            source = read(name + ".happy")
+            stdin = read(input_name) if input_name is not None else ""
+
+            (output, free_time), (governed_output, governed_time) = compare(
+                [free.compile(source), governed.compile(source)], stdin, args.repetitions)
+            if governed_output != output:
+                print(f"  the output of {name} differs under the governor!")
+                sys.exit(-1)
+
+            print(f"  {name:<8} {free_time:8.3f}s  governed {governed_time:8.3f}s  "
+                  f"{100*(governed_time/free_time - 1):+6.1f}%  ({HIGH_LIMITS.steps} steps, {HIGH_LIMITS.elements} elements)")
+
+    print("limits:")
+    for engine in args.engine:
+        for name, (source, governor) in RUNAWAY.items():
+            start = time.perf_counter()
+            try:
+                Interpreter(engine, governor=governor).run(source)
+                error = "not stopped!"
+            except HappyLimitError as e:
+                error = f"{type(e).__name__}: {e.message}"
+            print(f"  {engine:<8} {name:<15} {time.perf_counter() - start:8.3f}s  {error}")
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the input of happy.py.
+
+Times a program loading n numbers read from stdin into a NUMBER [n] array,
+reading stdin with builtins.input (one call per number) and with the bulk
+reader of happylang_io (blocks of stdin split into lines), for the given
+engines. stdin is a file.
+
+usage: python benchmarks/bench_input.py [n] [engine ...]
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happy import ENGINES, parse_program
+from happylang_io import bulk_input
+import io
+
+PROGRAM = """main(){
+  NUMBER n
+  input n
+  NUMBER [n] a
+  NUMBER i
+  for (i:=0; i<n; i:=i+1){
+    input a[i]
+  }
+  println a[n-1]
+}
+"""
+
+
+def run(engine, tree, path, bulk):
+    """
+    Returns
+    -------
+    (output, elapsed seconds)
+    """
+    out = io.StringIO()
+    old_stdin = sys.stdin
+    with open(path, encoding="utf8") as f:
+        sys.stdin = f
+        try:
+            with contextlib.redirect_stdout(out):
+                start = time.perf_counter()
+                if bulk:
+                    with bulk_input():
+                        ENGINES[engine](tree)
+                else:
+                    ENGINES[engine](tree)
+                elapsed = time.perf_counter() - start
+        finally:
+            sys.stdin = old_stdin
+
+    return out.getvalue(), elapsed
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    engines = sys.argv[2:] or ["closure", "vm"]
+
+    tree = parse_program(io.StringIO(PROGRAM))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "numbers.txt")
+        with open(path, "w", encoding="utf8") as f:
+            f.write("\n".join([str(n)] + [str(i) for i in range(n)]) + "\n")
+
+        print(f"loading {n} numbers into an array")
+        for engine in engines:
+            input_out, input_time = run(engine, tree, path, bulk=False)
+            bulk_out, bulk_time = run(engine, tree, path, bulk=True)
+            if input_out.split("\n")[-2:] != bulk_out.split("\n")[-2:]:
+                print(f"  {engine}: the outputs differ!")
+                sys.exit(-1)
+
+            print(f"  {engine:<8} input() {input_time:8.3f}s  bulk {bulk_time:8.3f}s  x{input_time/bulk_time:.2f}")
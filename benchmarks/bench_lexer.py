@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the lexer engines.
+
+Lexes a large source made of repeated sample programs with HappyLexer
+reading the stream one character at a time, HappyLexer scanning an
+in-memory buffer, and HappyRegexLexer, and reports tokens/second for each.
+
+usage: python benchmarks/bench_lexer.py [copies] [repetitions]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_lexer import HappyLexer, HappyRegexLexer, Token
+
+SAMPLES = os.path.join(ROOT, "sample_programs")
+
+
+def make_source(copies):
+    """
+    Concatenate every sample program, copies times
+    """
+    parts = []
+    for name in sorted(os.listdir(SAMPLES)):
+        if name.endswith(".happy"):
+            with open(os.path.join(SAMPLES, name), encoding="utf8") as f:
+                parts.append(f.read())
+
+    return "\n".join(parts) * copies
+
+
+MODES = {"read(1)": lambda f: HappyLexer(f, buffered=False),
+         "buffered": lambda f: HappyLexer(f),
+         "regex": lambda f: HappyRegexLexer(f)}
+
+
+def lex_all(stream, mode):
+    """
+    Returns
+    -------
+    TokenDetail []
+    """
+    lex = MODES[mode](stream)
+    toks = []
+    tok = lex.next()
+    while tok.token != Token.EOF:
+        toks.append(tok)
+        tok = lex.next()
+
+    return toks
+
+
+def bench(path, mode, repetitions):
+    best = None
+    toks = None
+    for _ in range(repetitions):
+        with open(path, encoding="utf8") as stream:
+            start = time.perf_counter()
+            toks = lex_all(stream, mode)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return toks, best
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    source = make_source(copies)
+    print(f"source: {len(source)} characters")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.happy")
+        with open(path, "w", encoding="utf8") as f:
+            f.write(source)
+
+        results = {}
+        for mode in MODES:
+            toks, best = bench(path, mode, repetitions)
+            results[mode] = toks
+            print(f"{mode:<9} {len(toks)} tokens in {best:.3f}s: {len(toks)/best:,.0f} tokens/s")
+
+    for mode in MODES:
+        if results[mode] != results["read(1)"]:
+            print(f"token stream of {mode} differs!")
+            sys.exit(-1)
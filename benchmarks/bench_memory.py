@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark of the parse tree.
+
+Parses (and resolves, type checks) a large generated program, then reports
+the memory held by the parse tree: bytes per node, as measured by
+tracemalloc, and the peak memory while parsing. The parse time is measured
+on a separate run, without tracemalloc.
+
+usage: python benchmarks/bench_memory.py [functions]
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happy import parse_program
+from bench_cache import make_program
+import io
+
+
+def count_nodes(tree):
+    """
+    Returns
+    -------
+    int
+        number of nodes of the tree
+    """
+    n = 0
+    stack = [tree]
+    while stack:
+        t = stack.pop()
+        n += 1
+        stack.extend(child for child in t.children if child is not None)
+
+    return n
+
+
+if __name__ == "__main__":
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    sys.setrecursionlimit(100000)
+    source = make_program(functions)
+
+    start = time.perf_counter()
+    parse_program(io.StringIO(source))
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    tree = parse_program(io.StringIO(source))
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = count_nodes(tree)
+    print(f"program of {functions} functions, {len(source)} characters")
+    print(f"  nodes            {nodes}")
+    print(f"  tree memory      {current/(1024*1024):.2f} MB")
+    print(f"  bytes per node   {current/nodes:.1f}")
+    print(f"  peak memory      {peak/(1024*1024):.2f} MB")
+    print(f"  parse time       {elapsed:.3f}s")
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the output modes of happy.py.
+
+Runs a program printing n numbers, one per line, in a new process with
+stdout redirected to /dev/null, for every output mode (see happylang_io)
+and the given engines.
+
+usage: python benchmarks/bench_output.py [n] [engine ...]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_io import OUTPUT_MODES
+
+
+def make_program(n):
+    """
+    Source of a program printing the numbers 0 to n-1
+    """
+    return f"""main(){{
+  NUMBER i
+  for (i:=0; i<{n}; i:=i+1){{
+    println i
+  }}
+}}
+"""
+
+
+def run(path, engine, mode):
+    """
+    Returns
+    -------
+    float
+        wall time of happy.py in seconds
+    """
+    happy = os.path.join(ROOT, "happy.py")
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        subprocess.run([sys.executable, happy, "--no-cache", "--engine", engine, "--output", mode, path],
+                       stdin=subprocess.DEVNULL, stdout=devnull, check=True)
+
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    engines = sys.argv[2:] or ["closure", "vm"]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"print-{n}.happy")
+        with open(path, "w", encoding="utf8") as f:
+            f.write(make_program(n))
+
+        print(f"printing {n} numbers to {os.devnull}")
+        for engine in engines:
+            print(engine)
+            for mode in OUTPUT_MODES:
+                print(f"  {mode:<12} {run(path, engine, mode):8.3f}s")
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of deep happy recursion.
+
+Runs a program recursing to a given depth with every engine of happy.py,
+in a new process, and reports the time or the stack overflow. The tree and
+closure engines recurse in Python (bounded by the Python recursion limit),
+the vm keeps the happy calls on an explicit stack (bounded by --max-depth).
+
+usage: python benchmarks/bench_recursion.py [depth ...]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happy import ENGINES
+
+
+def make_program(depth):
+    """
+    Source of a program whose calls are nested `depth` times
+    """
+    return f"""main(){{
+  NUMBER d
+  d := down({depth})
+  println "depth: ", d
+}}
+
+down(NUMBER n){{
+  NUMBER d
+  if n > 0 {{
+    d := down(n-1)
+  }}
+  return d + 1
+}}
+"""
+
+
+def run(engine, path):
+    """
+    Returns
+    -------
+    (last line of the output, elapsed seconds)
+    """
+    happy = os.path.join(ROOT, "happy.py")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, happy, "--no-cache", "--engine", engine, path],
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+
+    lines = (result.stdout + result.stderr).strip().splitlines()
+    return (lines[-1] if lines else ""), elapsed
+
+
+if __name__ == "__main__":
+    depths = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000, 50000]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for depth in depths:
+            path = os.path.join(tmp_dir, f"down-{depth}.happy")
+            with open(path, "w", encoding="utf8") as f:
+                f.write(make_program(depth))
+
+            print(f"depth {depth}")
+            for engine in ENGINES:
+                output, elapsed = run(engine, path)
+                print(f"  {engine:<8} {elapsed:8.3f}s  {output}")
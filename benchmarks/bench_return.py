@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the early exit of return.
+
+A linear search returning from inside its loop as soon as it finds the value
+stops scanning the array. For every engine, times searches of a value near
+the start, in the middle, at the end and absent from an array, with the early
+return and with a search which scans the whole array (the work of return
+before it unwound).
+
+usage: python benchmarks/bench_return.py [array length] [repetitions]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happy import ENGINES, parse_program
+
+
+def make_program(n, x, search):
+    """
+    Source of a program searching x 10 times in the array [0, 1, ..., n-1] with the given function
+    """
+    return f"""main(){{
+  NUMBER[{n}] a
+  NUMBER i
+  NUMBER r
+  for (i:=0; i<{n}; i:=i+1){{
+    a[i] := i
+  }}
+  for (i:=0; i<10; i:=i+1){{
+    r := {search}(a, {x})
+  }}
+  println r
+}}
+
+find(NUMBER[] arr, NUMBER x){{
+  NUMBER i
+  for (i:=0; i<len(arr); i:=i+1){{
+    if arr[i] = x {{
+      return i
+    }}
+  }}
+  return -1
+}}
+
+find_scan(NUMBER[] arr, NUMBER x){{
+  NUMBER i
+  NUMBER found := -1
+  for (i:=0; i<len(arr); i:=i+1){{
+    if arr[i] = x && found = -1 {{
+      found := i
+    }}
+  }}
+  return found
+}}
+"""
+
+
+def best_time(engine, tree, repetitions):
+    """
+    Returns
+    -------
+    (output, best elapsed seconds)
+    """
+    best = None
+    for _ in range(repetitions):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            start = time.perf_counter()
+            ENGINES[engine](tree)
+            elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return out.getvalue(), best
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    targets = [("start", n//100), ("middle", n//2), ("end", n-1), ("absent", -5)]
+
+    for engine in ENGINES:
+        print(engine)
+        for label, x in targets:
+            early_out, early = best_time(engine, parse_program(io.StringIO(make_program(n, x, "find"))), repetitions)
+            scan_out, scan = best_time(engine, parse_program(io.StringIO(make_program(n, x, "find_scan"))), repetitions)
+            if early_out != scan_out:
+                print(f"  {label}: the outputs differ!")
+                sys.exit(-1)
+
+            print(f"  {label:<8} early return {early*1000:8.2f}ms  full scan {scan*1000:8.2f}ms  x{scan/early:.1f}")
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark of the lexer and the parser.
+
+Generates programs of every shape of gen_program at growing sizes, then
+reports for each size the lex and parse times (best of the repetitions)
+and the peak memory of parsing (measured by tracemalloc on a separate run),
+plots them against the size as text (or as a PNG with --plot, when
+matplotlib is installed), and flags the super-linear growth: the exponent
+of time ~ chars^k (chars: size of the source), fitted on all the sizes,
+above --limit. A program the parser cannot handle (e.g. too deep for the
+Python recursion limit) is reported as failing at that size, and flagged too.
+
+usage: python benchmarks/bench_scaling.py [--shape SHAPE ...] [--scale F] [-r REPETITIONS] [--limit K] [--plot FILE]
+"""
+
+import argparse
+import gc
+import io
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from happylang_lexer import make_lexer, Token
+from happylang_parser import HappyParser
+from happylang_errors import HappySyntaxError
+from gen_program import generate, SHAPES
+
+"""
+Sizes of the programs of every shape
+"""
+SIZES = {"functions": [250, 500, 1000, 2000, 4000],
+         "chain": [250, 500, 1000, 2000, 4000],
+         "nesting": [25, 50, 100, 200, 400],
+         "conditions": [250, 500, 1000, 2000, 4000],
+         "strings": [10**5, 4*10**5, 16*10**5, 64*10**5]}
+
+
+def lex(source):
+    lexer = make_lexer(io.StringIO(source))
+    while lexer.next().token != Token.EOF:
+        pass
+
+
+def parse(source):
+    return HappyParser(make_lexer(io.StringIO(source))).parse()
+
+
+def best_time(f, source, repetitions):
+    best = None
+    for _ in range(repetitions):
+        gc.collect()
+        start = time.perf_counter()
+        f(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def peak_memory(f, source):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        f(source)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(shape, n, repetitions):
+    """
+    Returns
+    -------
+    dict
+        size of the source, lex and parse times, peak memory of parsing, or the error of the parser
+    """
+    source = generate(shape, n)
+    result = {"n": n, "chars": len(source)}
+    try:
+        result["lex"] = best_time(lex, source, repetitions)
+        result["parse"] = best_time(parse, source, repetitions)
+        result["peak"] = peak_memory(parse, source)
+    except RecursionError:
+        result["error"] = "RecursionError"
+    except HappySyntaxError:
+        result["error"] = "parser error"
+
+    return result
+
+
+def exponent(results, key):
+    """
+    Returns
+    -------
+    float or None
+        k of time ~ chars^k (chars: size of the source), fitted by least squares on the logarithms
+    """
+    measured = [(math.log(r["chars"]), math.log(r[key])) for r in results if key in r and r[key] > 0]
+    if len(measured) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in measured) / len(measured)
+    mean_y = sum(y for _, y in measured) / len(measured)
+    return (sum((x - mean_x)*(y - mean_y) for x, y in measured)
+            / sum((x - mean_x)**2 for x, _ in measured))
+
+
+def text_plot(results, key, width=40):
+    """
+    Bars of the given measure against the size
+    """
+    measured = [r for r in results if key in r]
+    if not measured:
+        return []
+
+    top = max(r[key] for r in measured) or 1
+    return [f"    {r['n']:>9} |{'#' * max(1, round(width*r[key]/top))}" for r in measured]
+
+
+def png_plot(path, all_results):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, no plot written")
+        return
+
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    for shape, results in all_results.items():
+        for ax, key in zip(axes, ("lex", "parse", "peak")):
+            measured = [r for r in results if key in r]
+            ax.loglog([r["n"] for r in measured], [r[key] for r in measured], marker="o", label=shape)
+            ax.set_title(key)
+            ax.set_xlabel("size")
+
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f"plot written to {path}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Scaling benchmark of the lexer and the parser")
+    arg_parser.add_argument("--shape", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="factor of the sizes")
+    arg_parser.add_argument("-r", "--repetitions", type=int, default=3)
+    arg_parser.add_argument("--limit", type=float, default=1.2,
+                            help="exponent above which the growth is reported as super-linear")
+    arg_parser.add_argument("--plot", default=None, help="PNG file of the plots (needs matplotlib)")
+    args = arg_parser.parse_args()
+
+    super_linear = False
+    failed = False
+    all_results = {}
+    for shape in args.shape:
+        results = all_results[shape] = []
+        print(shape)
+        for n in SIZES[shape]:
+            result = measure(shape, max(1, int(n*args.scale)), args.repetitions)
+            results.append(result)
+            if "error" in result:
+                failed = True
+                print(f"  n={result['n']:<9} {result['chars']:>10} chars  fails: {result['error']}")
+            else:
+                print(f"  n={result['n']:<9} {result['chars']:>10} chars  lex {result['lex']:8.4f}s"
+                      f"  parse {result['parse']:8.4f}s  peak {result['peak']/(1024*1024):8.2f} MB")
+
+        for key in ("lex", "parse", "peak"):
+            k = exponent(results, key)
+            if k is None:
+                continue
+
+            flag = k > args.limit
+            super_linear = super_linear or flag
+            print(f"  {key}: ~chars^{k:.2f}{'  SUPER-LINEAR' if flag else ''}")
+            if key != "peak":
+                print("\n".join(text_plot(results, key)))
+
+    if args.plot:
+        png_plot(args.plot, all_results)
+
+    if super_linear or failed:
+        sys.exit(1)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Load generator of the execution service (see happylang_server).
+
+Starts a server on a Unix domain socket (or uses the one given by --unix or
+--port), then --clients concurrent clients, each on its own connection,
+send --requests requests one after the other: short distinct programs
+generated by gen_program. Reports the requests per second and the latency
+of the requests (from sending the request to receiving its status):
+median, p99 and max. The outputs are checked against the in-process
+Interpreter.
+
+usage: python benchmarks/bench_server.py [--clients C] [--requests R] [-j WORKERS] [--engine ENGINE] [--unix PATH | --port PORT]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from happylang_server import connect
+from happylang_api import Interpreter
+from happy import ENGINES
+from gen_program import generate
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p*len(ordered)))]
+
+
+async def client(sources, expected, latencies, address):
+    connection = await connect(**address)
+    try:
+        for source, output in zip(sources, expected):
+            start = time.perf_counter()
+            result = await connection.run(source)
+            latencies.append(time.perf_counter() - start)
+            if result["status"] != "ok" or result["output"] != output:
+                raise RuntimeError(f"unexpected result {result}")
+    finally:
+        await connection.close()
+
+
+async def load(args, address):
+    sources = [generate("functions", 5, seed) for seed in range(args.requests)]
+    interpreter = Interpreter(args.engine)
+    expected = [interpreter.run(source) for source in sources]
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(sources, expected, latencies, address) for _ in range(args.clients)))
+    wall = time.perf_counter() - start
+
+    print(f"{len(latencies)} requests from {args.clients} clients in {wall:.3f}s: {len(latencies)/wall:.1f} requests/s")
+    print(f"  latency median {1000*statistics.median(latencies):8.2f}ms"
+          f"  p99 {1000*percentile(latencies, 0.99):8.2f}ms  max {1000*max(latencies):8.2f}ms")
+
+
+async def wait_for_server(address, process, seconds=30):
+    end = time.perf_counter() + seconds
+    while True:
+        try:
+            connection = await connect(**address)
+            await connection.close()
+            return
+        except OSError:
+            if process.poll() is not None or time.perf_counter() > end:
+                raise
+            await asyncio.sleep(0.1)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Load generator of the happy execution service")
+    arg_parser.add_argument("--clients", type=int, default=8, help="number of concurrent clients")
+    arg_parser.add_argument("--requests", type=int, default=100, help="number of requests of every client")
+    arg_parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes of the server started")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    address_group = arg_parser.add_mutually_exclusive_group()
+    address_group.add_argument("--unix", metavar="PATH", help="socket of a running server, none is started")
+    address_group.add_argument("--port", type=int, help="localhost TCP port of a running server, none is started")
+    args = arg_parser.parse_args()
+
+    if args.unix or args.port:
+        address = {"unix": args.unix} if args.unix else {"port": args.port}
+        asyncio.run(load(args, address))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        address = {"unix": os.path.join(directory, "happy.sock")}
+        command = [sys.executable, os.path.join(ROOT, "happylang_server.py"), "--unix", address["unix"],
+                   "--engine", args.engine]
+        if args.workers:
+            command += ["-j", str(args.workers)]
+
+        server = subprocess.Popen(command)
+        try:
+            asyncio.run(wait_for_server(address, server))
+            asyncio.run(load(args, address))
+        finally:
+            server.terminate()
+            server.wait()
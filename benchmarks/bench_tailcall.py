@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the tail calls.
+
+Runs a tail-recursive countdown to n with every engine, its tail calls
+eliminated (see happylang_tailcall) and nested as other calls, and reports
+the time and the peak memory (measured by tracemalloc on a countdown to
+n/100) or the stack overflow.
+
+usage: python benchmarks/bench_tailcall.py [n] [engine ...]
+"""
+
+import contextlib
+import gc
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happy import ENGINES, run_vm, parse_program
+from happylang_errors import HappyError
+
+
+def make_program(n):
+    """
+    Source of a program counting down from n by tail calls
+    """
+    return f"""main(){{
+  println "count: ", countdown({n}, 0)
+}}
+
+countdown(NUMBER n, NUMBER acc){{
+  if n = 0 {{
+    return acc
+  }}
+  return countdown(n - 1, acc + 1)
+}}
+"""
+
+
+def parse(n, tail_calls):
+    tree = parse_program(io.StringIO(make_program(n)))
+    if not tail_calls:
+        stack = [tree]
+        while stack:
+            t = stack.pop()
+            if t is not None:
+                t.tail_call = None
+                stack.extend(t.children)
+
+    return tree
+
+
+def run(engine, tree, traced=False):
+    """
+    Returns
+    -------
+    (last line of the output, elapsed seconds, peak bytes or None)
+    """
+    out = io.StringIO()
+    gc.collect()
+    peak = None
+    with contextlib.redirect_stdout(out):
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            if engine == "vm":
+                # as deep as the nested calls can go
+                run_vm(tree, 10**7)
+            else:
+                ENGINES[engine](tree)
+        except HappyError as e:
+            print(e.message)
+        elapsed = time.perf_counter() - start
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    lines = out.getvalue().strip().splitlines()
+    return (lines[-1] if lines else ""), elapsed, peak
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    engines = sys.argv[2:] or list(ENGINES)
+
+    print(f"countdown n={n}")
+    for engine in engines:
+        for label, tail_calls in (("tail calls", True), ("nested", False)):
+            output, elapsed, _ = run(engine, parse(n, tail_calls))
+            _, _, peak = run(engine, parse(max(1, n // 100), tail_calls), traced=True)
+            print(f"  {engine:<8} {label:<10} {elapsed:8.3f}s  peak(n/100) {peak/1024:9.1f} KB  {output}")
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the vectorized loops.
+
+Runs element-wise loops over NUMBER arrays of n elements (squarelist's loop
+and a loop of several assignments) with every engine, as usual and
+vectorized (see happylang_vectorizer), and reports the best run time.
+The vectorized runs need NumPy.
+
+usage: python benchmarks/bench_vectorize.py [n] [repetitions] [engine ...]
+"""
+
+import contextlib
+import gc
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happy import ENGINES, parse_program
+from happylang_vectorizer import vectorize
+import happylang_vectorizer
+
+
+def make_program(n):
+    """
+    Source of a program filling arrays of n numbers and running element-wise loops over them
+    """
+    return f"""main(){{
+  NUMBER [{n}] a
+  NUMBER [{n}] b
+  NUMBER [{n}] c
+  NUMBER i
+  for (i:=0; i<len(a); i:=i+1){{
+    a[i] := i
+  }}
+  squareList(a)
+  for (i:=0; i<len(a); i:=i+1){{
+    b[i] := a[i] * 0.5 + i
+    c[i] := (a[i] - b[i]) / 3 % 7
+    a[i] := -c[i] ** 2
+  }}
+  println a[{n}-1], " ", b[{n}-1], " ", c[{n}-1]
+}}
+
+squareList(NUMBER[] array){{
+  NUMBER i
+  for (i:=0; i<len(array); i:=i+1){{
+    array[i] := array[i]**2
+  }}
+}}
+"""
+
+
+def run(engine, tree):
+    """
+    Returns
+    -------
+    (output, elapsed seconds)
+    """
+    out = io.StringIO()
+    gc.collect()
+    with contextlib.redirect_stdout(out):
+        start = time.perf_counter()
+        ENGINES[engine](tree)
+        elapsed = time.perf_counter() - start
+
+    return out.getvalue(), elapsed
+
+
+def best(engine, tree, repetitions):
+    output, elapsed = None, None
+    for _ in range(repetitions):
+        output, t = run(engine, tree)
+        elapsed = t if elapsed is None else min(elapsed, t)
+
+    return output, elapsed
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    engines = sys.argv[3:] or list(ENGINES)
+
+    if happylang_vectorizer.np is None:
+        print("NumPy is not installed, the loops can only run as usual")
+        sys.exit(0)
+
+    source = make_program(n)
+    scalar = parse_program(io.StringIO(source))
+    vectorized = parse_program(io.StringIO(source))
+    loops = vectorize(vectorized)
+
+    print(f"element-wise loops n={n}, {len(loops)} vectorized")
+    for engine in engines:
+        scalar_output, scalar_elapsed = best(engine, scalar, repetitions)
+        vector_output, vector_elapsed = best(engine, vectorized, repetitions)
+        print(f"  {engine:<8} scalar {scalar_elapsed:8.3f}s  vectorized {vector_elapsed:8.3f}s"
+              f"  x{scalar_elapsed/vector_elapsed:.1f}")
+
+        if scalar_output != vector_output:
+            print(f"  output of {engine} differs!")
+            sys.exit(-1)
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Generator of large synthetic happy programs.
+
+Every generator of SHAPES returns the source of a valid happy program
+growing with n:
+    functions: n functions, each called once from main
+    chain: an assignment of n operands alternating + and *
+    nesting: n nested if blocks
+    conditions: an if whose condition is n comparisons joined by && and ||
+    strings: string literals of n characters in total
+
+usage: python benchmarks/gen_program.py SHAPE N [OUTPUT]
+"""
+
+import random
+import sys
+
+
+def functions(n, seed=0):
+    rnd = random.Random(seed)
+    lines = ["main(){", "\tNUMBER total := 0"]
+    lines += [f"\ttotal := total + f{i}(total)" for i in range(n)]
+    lines += ["\tprintln \"total: \", total", "}", ""]
+
+    for i in range(n):
+        k = rnd.randint(1, 9)
+        lines += [f"f{i}(NUMBER x){{",
+                  f"\tNUMBER y := x * {k} + {i}",
+                  "\tif y > 1000 {",
+                  "\t\ty := y % 1000",
+                  "\t}",
+                  "\treturn y",
+                  "}",
+                  ""]
+
+    return "\n".join(lines)
+
+
+def chain(n, seed=0):
+    rnd = random.Random(seed)
+    operands = [str(rnd.randint(1, 9)) for _ in range(n)]
+    expr = operands[0]
+    for i, operand in enumerate(operands[1:]):
+        expr += (" + " if i % 2 == 0 else " * ") + operand
+
+    return "\n".join(["main(){",
+                      "\tNUMBER x",
+                      f"\tx := {expr}",
+                      "\tprintln \"x: \", x",
+                      "}",
+                      ""])
+
+
+def nesting(n, seed=0):
+    lines = ["main(){", "\tNUMBER x := 0"]
+    for depth in range(n):
+        lines.append("\t" * (depth + 1) + f"if x < {depth + 1} {{")
+        lines.append("\t" * (depth + 2) + "x := x + 1")
+
+    for depth in reversed(range(n)):
+        lines.append("\t" * (depth + 1) + "}")
+
+    lines += ["\tprintln \"x: \", x", "}", ""]
+    return "\n".join(lines)
+
+
+def conditions(n, seed=0):
+    rnd = random.Random(seed)
+    comparisons = [f"x {rnd.choice(['<', '<=', '>', '>=', '<>'])} {rnd.randint(0, 9)}" for _ in range(n)]
+    condition = comparisons[0]
+    for i, comparison in enumerate(comparisons[1:]):
+        condition += (" && " if i % 2 == 0 else " || ") + comparison
+
+    return "\n".join(["main(){",
+                      "\tNUMBER x := 5",
+                      f"\tif {condition} {{",
+                      "\t\tprintln \"true\"",
+                      "\t}",
+                      "\tprintln \"done\"",
+                      "}",
+                      ""])
+
+
+def strings(n, seed=0):
+    rnd = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz ,.;:!?"
+    lines = ["main(){", "\tSTRING s := \"\""]
+    pattern = "".join(rnd.choice(alphabet) for _ in range(1 << 10))
+    left = n
+    while left > 0:
+        size = min(left, 1 << 16)
+        text = (pattern * (size // len(pattern) + 1))[:size]
+        lines.append(f"\ts := s + \"{text}\"")
+        left -= size
+
+    lines += ["\tNUMBER size := len(s) + 0", "\tprintln \"size: \", size", "}", ""]
+    return "\n".join(lines)
+
+
+SHAPES = {"functions": functions,
+          "chain": chain,
+          "nesting": nesting,
+          "conditions": conditions,
+          "strings": strings}
+
+
+def generate(shape, n, seed=0):
+    """
+    Returns
+    -------
+    str
+        the source of a program of the given shape and size
+    """
+    return SHAPES[shape](n, seed)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in SHAPES:
+        print(__doc__)
+        sys.exit(-1)
+
+    source = generate(sys.argv[1], int(sys.argv[2]))
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], "w", encoding="utf8") as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
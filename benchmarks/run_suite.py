@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Runner of the benchmark suite.
+
+Runs the non-interactive programs of benchmarks/suite on their input files
+(generated with a fixed seed, see INPUTS), timing separately over several
+repetitions:
+    lex: tokenizing the source
+    parse: parsing the tokens (lexed beforehand)
+    check: resolving and type checking the parse tree
+    eval: running the program, with every engine
+and writes the times (min, median, max in seconds) as JSON. Comparing two
+result files reports the times which grew by more than a threshold.
+
+usage: python benchmarks/run_suite.py [-r REPETITIONS] [-o RESULTS.json] [--engine ENGINE ...] [--only NAME ...]
+       python benchmarks/run_suite.py --compare BASE.json NEW.json [--threshold 0.1]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_lexer import make_lexer, Token
+from happylang_parser import HappyParser
+from happylang_resolver import resolve
+from happylang_typechecker import type_check
+from happy import ENGINES
+
+SUITE = os.path.join(ROOT, "benchmarks", "suite")
+
+
+def numbers_input(n, seed=0):
+    """
+    n followed by n random numbers
+    """
+    rnd = random.Random(seed)
+    return "\n".join([str(n)] + [str(rnd.randint(0, 10 * n)) for _ in range(n)]) + "\n"
+
+
+"""
+Input files of the programs of the suite -> their content
+"""
+INPUTS = {"sort.in": lambda: numbers_input(2000)}
+
+"""
+Programs of the suite -> input file, None for no input
+"""
+PROGRAMS = {"sort": "sort.in",
+            "fib": None,
+            "hanoi": None,
+            "strings": None,
+            "stacks": None,
+            "loops": None,
+            "calls": None}
+
+
+class TokenReplay:
+    """
+    Lexer replaying the tokens of another one, to time the parser alone
+    """
+    def __init__(self, tokens):
+        self.__tokens = iter(tokens)
+        self.__token_detail = None
+
+    def next(self):
+        self.__token_detail = next(self.__tokens)
+        return self.__token_detail
+
+    def get_tok(self):
+        return self.__token_detail
+
+
+def make_inputs():
+    """
+    Write the input files which are missing
+    """
+    for name, make in INPUTS.items():
+        path = os.path.join(SUITE, name)
+        if not os.path.exists(path):
+            with open(path, "w", encoding="utf8") as f:
+                f.write(make())
+
+
+def lex(source):
+    """
+    Returns
+    -------
+    TokenDetail [], ending with EOF
+    """
+    lexer = make_lexer(io.StringIO(source))
+    tokens = [lexer.next()]
+    while tokens[-1].token != Token.EOF:
+        tokens.append(lexer.next())
+
+    return tokens
+
+
+def run(engine, tree, stdin):
+    """
+    Returns
+    -------
+    (output, elapsed seconds)
+    """
+    out = io.StringIO()
+    old_stdin = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    try:
+        with contextlib.redirect_stdout(out):
+            start = time.perf_counter()
+            ENGINES[engine](tree)
+            elapsed = time.perf_counter() - start
+    finally:
+        sys.stdin = old_stdin
+
+    return out.getvalue(), elapsed
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def summary(times):
+    return {"min": min(times), "median": statistics.median(times), "max": max(times)}
+
+
+def bench(name, engines, repetitions):
+    """
+    Returns
+    -------
+    dict
+        the times of the phases of the program, and the digest of its output
+    """
+    with open(os.path.join(SUITE, name + ".happy"), encoding="utf8") as f:
+        source = f.read()
+
+    stdin = ""
+    if PROGRAMS[name] is not None:
+        with open(os.path.join(SUITE, PROGRAMS[name]), encoding="utf8") as f:
+            stdin = f.read()
+
+    times = {"lex": [], "parse": [], "check": []}
+    for _ in range(repetitions):
+        tokens, elapsed = timed(lex, source)
+        times["lex"].append(elapsed)
+
+        tree, elapsed = timed(lambda: HappyParser(TokenReplay(tokens)).parse())
+        times["parse"].append(elapsed)
+
+        _, elapsed = timed(lambda: (resolve(tree), type_check(tree)))
+        times["check"].append(elapsed)
+
+    result = {phase: summary(phase_times) for phase, phase_times in times.items()}
+    result["eval"] = {}
+
+    outputs = set()
+    for engine in engines:
+        engine_times = []
+        for _ in range(repetitions):
+            output, elapsed = run(engine, tree, stdin)
+            outputs.add(output)
+            engine_times.append(elapsed)
+
+        result["eval"][engine] = summary(engine_times)
+
+    if len(outputs) > 1:
+        print(f"  the output of {name} differs between the engines or the repetitions!")
+        sys.exit(-1)
+
+    result["output"] = hashlib.sha1(outputs.pop().encode("utf8")).hexdigest() if outputs else None
+    return result
+
+
+def timings(results):
+    """
+    Returns
+    -------
+    dict
+        (program, phase) -> min time, the phase of an engine being eval/engine
+    """
+    flat = {}
+    for name, result in results["programs"].items():
+        for phase in ("lex", "parse", "check"):
+            flat[(name, phase)] = result[phase]["min"]
+        for engine, engine_times in result["eval"].items():
+            flat[(name, "eval/" + engine)] = engine_times["min"]
+
+    return flat
+
+
+def compare(base_path, new_path, threshold):
+    """
+    Print the times of the new results against the base ones
+
+    Returns
+    -------
+    bool
+        no time grew by more than threshold (a fraction), no output changed
+    """
+    with open(base_path, encoding="utf8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf8") as f:
+        new = json.load(f)
+
+    base_times = timings(base)
+    new_times = timings(new)
+
+    ok = True
+    print(f"{'program':<10} {'phase':<14} {'base':>10} {'new':>10} {'change':>8}")
+    for key in sorted(base_times.keys() & new_times.keys()):
+        before = base_times[key]
+        after = new_times[key]
+        change = after/before - 1 if before else 0.0
+        regression = change > threshold
+        ok = ok and not regression
+        print(f"{key[0]:<10} {key[1]:<14} {before:9.5f}s {after:9.5f}s {100*change:+7.1f}%"
+              f"{'  REGRESSION' if regression else ''}")
+
+    for name in sorted(base["programs"].keys() & new["programs"].keys()):
+        if base["programs"][name]["output"] != new["programs"][name]["output"]:
+            print(f"the output of {name} changed")
+            ok = False
+
+    return ok
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the benchmark suite of happy")
+    arg_parser.add_argument("-r", "--repetitions", type=int, default=5)
+    arg_parser.add_argument("-o", "--output", default="results.json", help="JSON file of the results")
+    arg_parser.add_argument("--engine", nargs="+", choices=sorted(ENGINES), default=list(ENGINES))
+    arg_parser.add_argument("--only", nargs="+", choices=list(PROGRAMS), default=list(PROGRAMS),
+                            help="programs to run")
+    arg_parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"),
+                            help="compare two result files instead of running the suite")
+    arg_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="growth of a time reported as a regression (default: %(default)s)")
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.threshold) else 1)
+
+    make_inputs()
+    results = {"python": platform.python_version(),
+               "platform": platform.platform(),
+               "repetitions": args.repetitions,
+               "programs": {}}
+
+    for name in args.only:
+        print(name)
+        result = results["programs"][name] = bench(name, args.engine, args.repetitions)
+        for phase in ("lex", "parse", "check"):
+            print(f"  {phase:<14} {result[phase]['min']:9.5f}s")
+        for engine, engine_times in result["eval"].items():
+            print(f"  {'eval/' + engine:<14} {engine_times['min']:9.5f}s")
+
+    with open(args.output, "w", encoding="utf8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
@@ -6,71 +6,28 @@ Created on Wed Nov 30 07:23:27 2022
 """
 
 from happylang_parser import ParseType, HappyParser, RefType
-from happylang_lexer import HappyLexer, Token, TokenDetail
+from happylang_lexer import HappyLexer, Token, TokenDetail, LEXER_ENGINES, make_lexer
+from happylang_runtime import Ref, RefEnv, default_number, new_array, stack_overflow, read_input, DEFAULT_MAX_DEPTH
+from happylang_resolver import resolve
+from happylang_typechecker import type_check, STRING
+from happylang_tailcall import mark_tail_calls, TailCall
+from happylang_closure import compile_tree, compile_traced, compile_governed
+from happylang_compiler import compile_program, disassemble
+from happylang_cache import ProgramCache, CACHE_DIR_NAME, DEFAULT_CACHE_SIZE
+from happylang_vectorizer import vectorize, report
+from happylang_profiler import HappyProfiler
+from happylang_flamegraph import CallStacks, trace_tail_call
+from happylang_io import buffered_output, bulk_input, prompt, OUTPUT_MODES
+from happylang_errors import HappyError, HappyRuntimeError
+from happylang_governor import governed
+import happylang_governor
+import happylang_folder
+import happylang_runtime
+import happylang_vm
+from contextlib import contextmanager
 import sys
-from collections import ChainMap
-
-"""
-Outer reference  environments consist of functions
-Inner reference environments consist of variables, stacks, and arrays
-"""
-
-
-class Ref:
-    def __init__(self, ref_type, ref_tree, val=None):
-        """        
-
-        Parameters
-        ----------
-        ref_type : RefType
-        ref_tree: Parse Tree
-        val : Value of the reference
-
-        """
-        self.ref_type = ref_type
-        self.ref_tree = ref_tree
-        self.val = val
-
-
-class RefEnv:
-    def __init__(self, parent=None):
-        self.parent = parent
-        self.table = ChainMap()
-
-        if parent:
-            self.table = ChainMap(self.table, parent.table)
-            
-        self.return_val = None
-
-    def lookup(self, ref_name):
-        """
-        Looks up the value of the reference from the env, from the inner most to the outer most
-
-        Parameters
-        ----------
-        r : Ref name
-
-        Returns
-        -------
-        ParseTree
-
-        """
-
-        if ref_name in self.table:
-            return self.table[ref_name]
-
-        return None
-
-    def insert(self, ref_name, ref):
-        """
-        Insert the reference into the inner most env
-
-        Parameters
-        ----------
-        ref_name: the string name of the reference
-        ref: Ref
-        """
-        self.table[ref_name] = ref
+import io
+import argparse
 
 
 def eval_parse_tree(t, env):
@@ -178,28 +135,25 @@ def eval_FUN(t, env):
     """
     store the ref to the function ready to be used
     """
-    fun_name = t.token_detail.lexeme
+    fun_name = t.lexeme
 
     if env.lookup(fun_name):
-        print(f"Function defined twice on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Function defined twice on line {t.line}", t.line)
 
     env.insert(fun_name, Ref(RefType.FUN, t))
 
 
 def eval_CALL(t, env):
-    fun_name = t.children[0].token_detail.lexeme
+    fun_name = t.children[0].lexeme
     fun_args = t.children[1:]
 
     # check the existence of the function
     fun_ref = env.lookup(fun_name)
     if not fun_ref:
-        print(f"Undefined function is called on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Undefined function is called on line {t.line}", t.line)
         
     if fun_ref.ref_type != RefType.FUN:
-        print(f"Non function is called on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Non function is called on line {t.line}", t.line)
         
     fun_tree = fun_ref.ref_tree
 
@@ -207,20 +161,26 @@ def eval_CALL(t, env):
     # obtain the definition of function parameters
     param_trees = fun_tree.children[:-1:1]
     if len(fun_args) != len(param_trees):
-        print(
-            f"Number of arguments does not MATCH number of function's parameters on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(
+            f"Number of arguments does not MATCH number of function's parameters on line {t.line}", t.line)
 
     called_fun_env = RefEnv(env.parent)
     for i, param in enumerate(param_trees):
         # parameter
-        param_data_type = param.children[0].token_detail.lexeme
+        param_data_type = param.children[0].lexeme
         param_ref_type = param.ref_type
-        param_name = param.children[1].token_detail.lexeme
+        param_name = param.children[1].lexeme
         
         # argument
         arg = eval_parse_tree(fun_args[i], env)
         
+        # the arguments match the parameters (see happylang_typechecker)
+        if t.type_checked:
+            arg_value = arg if param_ref_type == RefType.PRIMITIVE else arg.val
+            called_fun_env.insert(param_name, Ref(
+                param_ref_type, param_trees[i], arg_value))
+            continue
+        
         arg_ref_type = None
         arg_data_type = None
         arg_value = None
@@ -234,55 +194,73 @@ def eval_CALL(t, env):
             arg_value = arg
         else:
             arg_ref_type = arg.ref_type
-            arg_data_type = arg.ref_tree.children[0].token_detail.lexeme
+            arg_data_type = arg.ref_tree.children[0].lexeme
             arg_value = arg.val
             
         
         # check param and arg
         if param_data_type != arg_data_type or param_ref_type != arg_ref_type:
-            print(
-                f"Data Type not matched on line {t.token_detail.line}, column {param.children[1].token_detail.col}.\nExpect {param_data_type+' '+param_ref_type.name}, but received {arg_data_type+' '+arg_ref_type.name}")
-            sys.exit(-1)
+            raise HappyRuntimeError(
+                f"Data Type not matched on line {t.line}, column {param.children[1].col}.\nExpect {param_data_type+' '+param_ref_type.name}, but received {arg_data_type+' '+arg_ref_type.name}", t.line)
 
         # bind the variable to the enviroment
         called_fun_env.insert(param_name, Ref(
             param_ref_type, param_trees[i], arg_value))
 
-    # eval the fun's block
-    eval_parse_tree(fun_tree.children[-1], called_fun_env)
+    if t.tail_call is not None:
+        # the call runs in place of the current one, see below
+        env.tail_env = called_fun_env
+        env.tail_discard = t.tail_call == TailCall.STATEMENT
+        env.returned = True
+        return None
+
+    # eval the fun's block, then the blocks of the tail calls
+    discard = False
+    while True:
+        try:
+            eval_parse_tree(fun_tree.children[-1], called_fun_env)
+        except RecursionError:
+            # the innermost call reports the overflow (see happylang_vm for deeper recursion)
+            stack_overflow(t.line)
+
+        if called_fun_env.tail_env is None:
+            break
+
+        discard = discard or called_fun_env.tail_discard
+        called_fun_env = called_fun_env.tail_env
     
-    return called_fun_env.return_val
+    return None if discard else called_fun_env.return_val
 
 def eval_RETURN(t, env):
     env.return_val = eval_parse_tree(t.children[0], env)
+    env.returned = True
 
 def eval_BLOCK(t, env):
     """
-    eval stmt and var-decl
+    eval stmt and var-decl, until a return runs
     """
     for stmt in t.children:
         eval_parse_tree(stmt, env)
-
-def default_number():
-    return float(0)
+        
+        if env.returned:
+            return
 
 def eval_VAR(t, env):
     """
     stored declared variables inside the local env
     """
-    var_name = t.children[1].token_detail.lexeme
+    var_name = t.children[1].lexeme
 
     if env.lookup(var_name):
-        print(f"Reference declared twice on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Reference declared twice on line {t.line}", t.line)
     
     val = default_number()
-    if t.ref_type == RefType.PRIMITIVE and t.children[0].token_detail.token==Token.STRING_TP:
+    if t.ref_type == RefType.PRIMITIVE and t.children[0].token==Token.STRING_TP:
         val=""
     
     if t.ref_type == RefType.ARRAY:
         length = eval_parse_tree(t.children[-1], env)
-        val = [default_number()]*int(length)
+        val = new_array(t, length)
         
     if t.ref_type == RefType.STACK:
         val = []
@@ -295,14 +273,13 @@ def eval_ATOMIC(t, env):
     return value for primitive data type
     otherwise Ref
     """
-    if t.token_detail.token in [Token.STRING, Token.NUMBER]:
-        return t.token_detail.value
+    if t.token in [Token.STRING, Token.NUMBER]:
+        return t.value
     
-    identifier = t.token_detail.lexeme
+    identifier = t.lexeme
     var_ref = env.lookup(identifier)
     if not var_ref:
-        print(f"Undefined variable {identifier} on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Undefined variable {identifier} on line {t.line}", t.line)
         
     if var_ref.ref_type == RefType.PRIMITIVE:
         return var_ref.val
@@ -312,8 +289,8 @@ def eval_ATOMIC(t, env):
 def eval_INPUT(t, env):
     refs = t.children
     
-    if refs[0].token_detail.token==Token.STRING:
-        print(refs[0].token_detail.lexeme)
+    if refs[0].token==Token.STRING:
+        prompt(refs[0].lexeme)
         refs = refs[1:]
         
     for r in refs:
@@ -321,19 +298,15 @@ def eval_INPUT(t, env):
         var_ref, idx = eval_REF(r, env)
         
         # read the input
-        input_val = input()
-        if var_ref.ref_tree.children[0].token_detail.lexeme=="NUMBER":
-            input_val = float(input_val)
+        input_val = read_input(var_ref.ref_tree, t.line)
         
         # assign the input value to the Ref object
-        if idx==-1:
+        if idx is None:
             var_ref.val = input_val
         else:
             
             if idx>=len(var_ref.val):
-                print(f"Index out of range on line {t.token_detail.line}")
-                print(f"List of size {len(var_ref.val)}")
-                sys.exit(-1)
+                raise HappyRuntimeError(f"Index out of range on line {t.line}\nList of size {len(var_ref.val)}", t.line)
             
             var_ref.val[idx] = input_val
         
@@ -344,16 +317,14 @@ def eval_INDEXING(t, env):
     
     """    
     if type(a)!=Ref or a.ref_type not in [RefType.ARRAY, RefType.STACK]:
-        print(f"Indexing only applies to ARRAY or STACK, on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Indexing only applies to ARRAY or STACK, on line {t.line}", t.line)
     """
     if type(a)==Ref and a.ref_type in [RefType.ARRAY, RefType.STACK]:
         seq = a.val
     
         index = int(eval_parse_tree(t.children[1], env))
-        if index>=len(seq):
-            print(f"Index out of range on line {t.token_detail.line}")
-            sys.exit(-1)
+        if index<0 or index>=len(seq):
+            raise HappyRuntimeError(f"Index out of range on line {t.line}", t.line)
         
         return seq[index]
     
@@ -362,23 +333,23 @@ def eval_INDEXING(t, env):
 
         return a[index]
     
-    print(f"Indexing only applies to ARRAY or STACK or STRING, on line {t.token_detail.line}")
-    sys.exit(-1)
+    raise HappyRuntimeError(f"Indexing only applies to ARRAY or STACK or STRING, on line {t.line}", t.line)
     
 
 def eval_PUSH(t, env):
     var_ref = eval_VAR_REF(t.children[0], env)
     
     if var_ref.ref_type != RefType.STACK:
-        print(f"Expect a stack on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Expect a stack on line {t.line}", t.line)
     
     pushed_value = eval_parse_tree(t.children[1], env)
     
-    stack_data_type = var_ref.ref_tree.children[0].token_detail.lexeme
-    if (type(pushed_value)==str and stack_data_type!="STRING") or (type(pushed_value)==float and stack_data_type!="NUMBER"):
-        print(f"On line {t.token_detail.line}, stack is of type {stack_data_type}, but the pushed value is not a {stack_data_type}")
-        sys.exit(-1)
+    stack_data_type = var_ref.ref_tree.children[0].lexeme
+    if not t.type_checked and ((type(pushed_value)==str and stack_data_type!="STRING") or (type(pushed_value)==float and stack_data_type!="NUMBER")):
+        raise HappyRuntimeError(f"On line {t.line}, stack is of type {stack_data_type}, but the pushed value is not a {stack_data_type}", t.line)
+
+    if happylang_runtime.governor is not None:
+        happylang_runtime.governor.allocate(1, t.line)
         
     var_ref.val.append(pushed_value)
     
@@ -389,8 +360,7 @@ def eval_POP(t, env):
     var_ref = eval_VAR_REF(t.children[0], env)
     
     if var_ref.ref_type != RefType.STACK:
-        print(f"Expect a stack on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Expect a stack on line {t.line}", t.line)
     
     popped_val = var_ref.val[-1]
     del var_ref.val[-1]
@@ -402,20 +372,17 @@ def eval_ASSIGN(t, env):
     val = eval_parse_tree(t.children[1], env)
     
     
-    if idx==-1:
-        if type(val)!=type(var_ref.val):
-            print(f"Unmatched type when do the assignment on line {t.token_detail.line}")
-            sys.exit(-1)
+    if idx is None:
+        if not t.type_checked and type(val)!=type(var_ref.val):
+            raise HappyRuntimeError(f"Unmatched type when do the assignment on line {t.line}", t.line)
 
         var_ref.val = val
     else:
         if idx>=len(var_ref.val):
-            print(f"Index out of range on line {t.token_detail.line}")
-            sys.exit(-1)
+            raise HappyRuntimeError(f"Index out of range on line {t.line}", t.line)
             
-        if type(val)!=type(var_ref.val[idx]):
-            print(f"Unmatched type when do the assignment on line {t.token_detail.line}")
-            sys.exit(-1)
+        if not t.type_checked and type(val)!=type(var_ref.val[idx]):
+            raise HappyRuntimeError(f"Unmatched type when do the assignment on line {t.line}", t.line)
             
         var_ref.val[idx] = val
         
@@ -424,29 +391,26 @@ def eval_SWAP(t, env):
     right_var_ref, right_idx = eval_REF(t.children[1], env)
     
     left_val = None
-    if left_idx==-1:
+    if left_idx is None:
         left_val = left_var_ref.val
     else:
         if left_idx>=len(left_var_ref.val):
-            print(f"Index out of range on line {t.token_detail.line}")
-            sys.exit(-1)
+            raise HappyRuntimeError(f"Index out of range on line {t.line}", t.line)
         
         left_val = left_var_ref.val[left_idx]
     
     right_val = None
-    if right_idx==-1:
+    if right_idx is None:
         right_val = right_var_ref.val
     else:
         if right_idx>=len(right_var_ref.val):
-            print(f"Index out of range on line {t.token_detail.line}")
-            sys.exit(-1)
+            raise HappyRuntimeError(f"Index out of range on line {t.line}", t.line)
             
         right_val = right_var_ref.val[right_idx]
         
     # check data type
-    if type(left_val)!=type(right_val):
-        print(f"Unmatched data type when do the swap on line {t.token_detail.line}")
-        sys.exit(-1)
+    if not t.type_checked and type(left_val)!=type(right_val):
+        raise HappyRuntimeError(f"Unmatched data type when do the swap on line {t.line}", t.line)
     
     # swap
     tmp = left_val
@@ -455,12 +419,12 @@ def eval_SWAP(t, env):
     
     
     # assign value to Refs
-    if left_idx==-1:
+    if left_idx is None:
         left_var_ref.val = left_val
     else:
         left_var_ref.val[left_idx] = left_val
     
-    if right_idx==-1:
+    if right_idx is None:
         right_var_ref.val = right_val
     else:
         right_var_ref.val[right_idx] = right_val
@@ -471,7 +435,7 @@ def eval_REF(t, env):
     Returns
     -------
     var_ref : Ref
-    idx : -1 or the index
+    idx : None or the index
 
     """
     var_ref = None
@@ -479,9 +443,10 @@ def eval_REF(t, env):
     if t.parse_type == ParseType.INDEXING:
         var_ref = eval_VAR_REF(t.children[0], env)
         idx = int(eval_parse_tree(t.children[1], env))
+        if idx<0:
+            raise HappyRuntimeError(f"Index out of range on line {t.line}", t.line)
     else:
         var_ref = eval_VAR_REF(t, env)
-        idx = -1
         
     return (var_ref, idx)
 
@@ -490,15 +455,13 @@ def eval_VAR_REF(t, env):
     var_ref : Ref
 
     """
-    identifier = t.token_detail.lexeme
+    identifier = t.lexeme
     var_ref = env.lookup(identifier)
     if not var_ref:
-        print(f"Undefined variable {identifier} on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Undefined variable {identifier} on line {t.line}", t.line)
         
     if var_ref.ref_type == RefType.FUN:
-        print(f"{identifier} is not a variable, on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"{identifier} is not a variable, on line {t.line}", t.line)
         
     return var_ref
 
@@ -506,11 +469,17 @@ def eval_ADD(t, env):
     left = eval_parse_tree(t.children[0], env)
     right = eval_parse_tree(t.children[1], env)
     
-    if type(left)==str or type(right)==str:
-        left = str(left)
-        right = str(right)
+    if t.type_checked:
+        if t.expr_type != STRING:
+            return left + right
+    elif type(left)!=str and type(right)!=str:
+        return left + right
 
-    return left + right
+    s = str(left) + str(right)
+    if happylang_runtime.governor is not None:
+        happylang_runtime.governor.allocate(len(s), t.line)
+
+    return s
 
 
 def eval_SUB(t, env):
@@ -532,8 +501,7 @@ def eval_DIV(t, env):
     right = eval_parse_tree(t.children[1], env)
 
     if right == 0:
-        print(f"Division by 0 on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Division by 0 on line {t.line}", t.line)
 
     return left/right
 
@@ -542,8 +510,7 @@ def eval_MOD(t, env):
     right = eval_parse_tree(t.children[1], env)
 
     if right == 0:
-        print(f"Division by 0 on line {t.token_detail.line}")
-        sys.exit(-1)
+        raise HappyRuntimeError(f"Division by 0 on line {t.line}", t.line)
 
     return left%right
 
@@ -560,30 +527,33 @@ def eval_NEG(t, env):
 
 
 def eval_PRINT(t, env):
-    string = ""
+    """
+    one write of the joined values (see happylang_io)
+    """
+    parts = []
 
     for arg in t.children:
         val = eval_parse_tree(arg, env)
         if type(val) == float:
             val = str(val)
         
-        string += val
+        parts.append(val)
 
-    print(string, end="")
+    sys.stdout.write("".join(parts))
 
 
 def eval_PRINTLN(t, env):
-    string = ""
+    parts = []
 
     for arg in t.children:
         val = eval_parse_tree(arg, env)
         if type(val) == float:
             val =str(val)
             
-            
-        string += val
+        parts.append(val)
 
-    print(string)
+    parts.append("\n")
+    sys.stdout.write("".join(parts))
 
 
 def eval_IF(t, env):
@@ -662,6 +632,15 @@ def eval_LT(t, env):
 
 
 def eval_LOOP(t, env):
+    # loops marked by happylang_vectorizer
+    if t.vector_loop is not None and t.vector_loop.run(lambda r: env.lookup(r.lexeme).val, 
+                                                       lambda r, val: setattr(env.lookup(r.lexeme), "val", val)):
+        return
+
+    # an iteration is a step of the governor (see happylang_governor)
+    governor = happylang_runtime.governor
+    line = t.line
+    
     condition_idx = 0
     
     for i in range(len(t.children)):
@@ -678,10 +657,16 @@ def eval_LOOP(t, env):
     for t in start_loop_assign_trees:
         eval_parse_tree(t, env)
 
-    # loop
+    # loop, until a return runs in the block
     while eval_parse_tree(condition_tree, env):
+        if governor is not None:
+            governor.spend(1, line)
+
         eval_parse_tree(block, env)
         
+        if env.returned:
+            return
+        
         for t in loop_assign_trees:
             eval_parse_tree(t, env)
         
@@ -695,23 +680,332 @@ def eval_LEN(t, env):
     if type(v)==str:
         return len(v)
         
-    print(f"len() expects argument of type ARRAY or STACK or STRING on line {t.token_detail.line}")
-    sys.exit(-1)
+    raise HappyRuntimeError(f"len() expects argument of type ARRAY or STACK or STRING on line {t.line}", t.line)
     
     
 
+def run_tree(t):
+    """
+    Walk the given parse tree with eval_parse_tree, looking up
+    the references by name
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM)
+    """
+    eval_parse_tree(t, RefEnv())
+
+
+def run_profiled(t, profiler):
+    """
+    run_tree, every evaluation being profiled
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM)
+    profiler : HappyProfiler of t
+    """
+    global eval_parse_tree
+
+    # the eval_* functions evaluate their children with the global eval_parse_tree
+    evaluate = eval_parse_tree
+    eval_parse_tree = profiler.wrap(evaluate)
+    try:
+        profiler.run(run_tree, t)
+    finally:
+        eval_parse_tree = evaluate
+
+
+def run_traced(t, stacks, engine="tree", max_depth=DEFAULT_MAX_DEPTH):
+    """
+    Run the given parse tree on an engine, every happy call being reported to stacks
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+    stacks : CallStacks (see happylang_flamegraph)
+    engine : one of ENGINES
+    max_depth : bound of the number of nested happy calls on the vm engine
+    """
+    global eval_CALL
+
+    stacks.start()
+    try:
+        if engine == "vm":
+            happylang_vm.run(compile_program(t), max_depth, stacks)
+        elif engine == "closure":
+            compile_traced(t, stacks)()
+        else:
+            # eval_parse_tree evaluates the calls with the global eval_CALL
+            call = eval_CALL
+            # of every running call: a tail call of its chain nests (see happylang_flamegraph.trace_tail_call)
+            chains = []
+
+            def traced_CALL(t, env):
+                if t.tail_call is not None:
+                    value = call(t, env)
+                    trace_tail_call(stacks, chains, t.children[0].lexeme, t.line, t.tail_call)
+                    return value
+
+                stacks.enter(t.children[0].lexeme, t.line)
+                chains.append(False)
+                try:
+                    return call(t, env)
+                finally:
+                    if chains.pop():
+                        stacks.leave()
+                    stacks.leave()
+
+            eval_CALL = traced_CALL
+            try:
+                run_tree(t)
+            finally:
+                eval_CALL = call
+    finally:
+        stacks.stop()
+
+
+def run_governed(t, governor, engine="tree", max_depth=DEFAULT_MAX_DEPTH):
+    """
+    Run the given parse tree on an engine, within the limits of governor
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+    governor : Governor (see happylang_governor)
+    engine : one of ENGINES
+    max_depth : bound of the number of nested happy calls on the vm engine
+    """
+    with governed(governor):
+        if engine == "vm":
+            happylang_vm.run(compile_program(t), max_depth, governor=governor)
+        elif engine == "closure":
+            compile_governed(t, governor)()
+        else:
+            with governed_calls(governor):
+                run_tree(t)
+
+
+@contextmanager
+def governed_calls(governor):
+    """
+    Report the calls evaluated by the tree engine to governor until the end of the block
+    """
+    global eval_CALL
+
+    # eval_parse_tree evaluates the calls with the global eval_CALL
+    call = eval_CALL
+
+    def governed_CALL(t, env):
+        governor.enter(t.line)
+        try:
+            return call(t, env)
+        finally:
+            governor.leave()
+
+    eval_CALL = governed_CALL
+    try:
+        yield
+    finally:
+        eval_CALL = call
+
+
+def run_compiled(t):
+    """
+    Compile the given parse tree into closures (see happylang_closure),
+    then run the compiled form
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+    """
+    compile_tree(t)()
+
+
+def run_vm(t, max_depth=DEFAULT_MAX_DEPTH):
+    """
+    Compile the given parse tree into bytecode (see happylang_compiler),
+    then run it on the virtual machine (see happylang_vm)
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+    max_depth : bound of the number of nested happy calls
+    """
+    happylang_vm.run(compile_program(t), max_depth)
+
+
+def parse_program(f, lexer_engine="scan"):
+    """
+    Parse, resolve and type check a program, and mark its tail calls
+
+    Parameters
+    ----------
+    f : text file of the source
+    lexer_engine : see happylang_lexer.LEXER_ENGINES
+
+    Returns
+    -------
+    ParseTree(ParseType.PROGRAM)
+    """
+    pt = HappyParser(make_lexer(f, lexer_engine)).parse()
+    resolve(pt)
+    type_check(pt)
+    mark_tail_calls(pt)
+    return pt
+
+
+def load_program(filename, lexer_engine="scan", cache=None):
+    """
+    Load the program of the given source file from the cache (see happylang_cache),
+    otherwise parse it and store it in the cache
+
+    Parameters
+    ----------
+    filename : path of the source file
+    lexer_engine : see happylang_lexer.LEXER_ENGINES
+    cache : ProgramCache, None to always parse the source
+
+    Returns
+    -------
+    ParseTree(ParseType.PROGRAM)
+    """
+    if cache is None:
+        with open(filename, encoding="utf8") as f:
+            return parse_program(f, lexer_engine)
+
+    with open(filename, "rb") as f:
+        source = f.read()
+
+    pt = cache.load(filename, source)
+    if pt is None:
+        pt = parse_program(io.StringIO(source.decode("utf8"), newline=None), lexer_engine)
+        cache.store(filename, source, pt)
+
+    return pt
+
+
+@contextmanager
+def reported_errors():
+    """
+    Print the message of a HappyError raised in the block, then exit
+    """
+    try:
+        yield
+    except HappyError as e:
+        print(e.message)
+        sys.exit(-1)
+
+
+"""
+Execution engines, all of them run a resolved parse tree:
+    tree: walk the parse tree with eval_parse_tree (reference mode)
+    closure: run the parse tree compiled into closures
+    vm: run the parse tree compiled into bytecode on a stack-based virtual machine,
+        the happy calls are kept on an explicit stack (deep recursion, see --max-depth)
+The tree and closure engines recurse in Python for every happy call, their depth is
+bounded by the Python recursion limit.
+"""
+ENGINES = {'tree': run_tree,
+           'closure': run_compiled,
+           'vm': run_vm}
+
   
 if __name__ == "__main__":
-    f = None
-    if len(sys.argv) == 2:
-        f = open(sys.argv[1], encoding="utf8")
-        l = HappyLexer(f)
-    else:
-        l = HappyLexer()
-
-    parser = HappyParser(l)
-    pt = parser.parse()
-    eval_parse_tree(pt, RefEnv())
+    arg_parser = argparse.ArgumentParser(description="Run a program written in happy")
+    arg_parser.add_argument("filename", nargs="?", help="source file, read from stdin if omitted")
+    arg_parser.add_argument("--lexer", choices=sorted(LEXER_ENGINES), default="scan",
+                            help="lexer engine (default: scan)")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree",
+                            help="execution engine (default: tree)")
+    arg_parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH,
+                            help="bound of the number of nested happy calls on the vm engine (default: %(default)s)")
+    arg_parser.add_argument("--output", choices=OUTPUT_MODES, default=None,
+                            help="flush policy of the output (default: line on a terminal, block otherwise)")
+    arg_parser.add_argument("--prompts", action="store_true",
+                            help="print the prompts of the input statements even when the input is not a terminal")
+    arg_parser.add_argument("--no-fold", action="store_true",
+                            help="evaluate the constant expressions when they run, not once before")
+    arg_parser.add_argument("--fold-report", action="store_true",
+                            help="print the number of constant expressions folded and of nodes eliminated to stderr")
+    arg_parser.add_argument("--no-vectorize", action="store_true",
+                            help="run the element-wise loops as usual, not as NumPy operations")
+    arg_parser.add_argument("--vectorize-report", action="store_true",
+                            help="print the vectorized loops to stderr")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="print the time spent by line and by function to stderr (tree engine)")
+    arg_parser.add_argument("--profile-json", metavar="FILE", default=None,
+                            help="write the profile as JSON to FILE, - for stdout (tree engine)")
+    arg_parser.add_argument("--flamegraph", metavar="FILE", default=None,
+                            help="write the time of the happy call stacks as collapsed stacks to FILE, - for stdout")
+    arg_parser.add_argument("--disassemble", action="store_true",
+                            help="print the bytecode of the program instead of running it")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="parse the source without using the cache of precompiled programs")
+    arg_parser.add_argument("--clear-cache", action="store_true",
+                            help="remove the precompiled programs of the cache directory first")
+    arg_parser.add_argument("--cache-dir", default=None,
+                            help=f"directory of the precompiled programs (default: {CACHE_DIR_NAME} next to the source)")
+    arg_parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE//(1024*1024),
+                            help="size bound of the cache directory in MB (default: %(default)s)")
+    happylang_governor.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if (args.profile or args.profile_json) and args.engine != "tree":
+        arg_parser.error("--profile and --profile-json profile the tree engine")
+    if args.flamegraph and (args.profile or args.profile_json):
+        arg_parser.error("--flamegraph cannot be combined with --profile")
+    governor = happylang_governor.from_arguments(args)
+    if governor is not None and (args.profile or args.profile_json or args.flamegraph):
+        arg_parser.error("the limits --max-steps, --max-time, --max-elements and --max-call-depth cannot be combined with --profile or --flamegraph")
+    
+    cache = ProgramCache(args.cache_dir, args.cache_size*1024*1024)
+    if args.clear_cache:
+        if args.filename or args.cache_dir:
+            cache.clear(cache.directory(args.filename or "."))
+        if not args.filename:
+            sys.exit(0)
     
-    if f:
-        f.close()
+    with reported_errors():
+        if args.filename:
+            pt = load_program(args.filename, args.lexer, None if args.no_cache else cache)
+        else:
+            pt = parse_program(sys.stdin, args.lexer)
+
+    if not args.no_fold:
+        folding = happylang_folder.fold(pt)
+        if args.fold_report:
+            happylang_folder.report(folding)
+
+    if not args.no_vectorize:
+        loops = vectorize(pt)
+        if args.vectorize_report:
+            report(loops)
+
+    if args.disassemble:
+        print(disassemble(compile_program(pt)))
+    elif args.profile or args.profile_json:
+        profiler = HappyProfiler(pt)
+        try:
+            with buffered_output(args.output), bulk_input(args.prompts), reported_errors():
+                run_profiled(pt, profiler)
+        finally:
+            if args.profile:
+                profiler.report()
+            if args.profile_json:
+                profiler.write_json(args.profile_json)
+    elif args.flamegraph:
+        stacks = CallStacks()
+        try:
+            with buffered_output(args.output), bulk_input(args.prompts), reported_errors():
+                run_traced(pt, stacks, args.engine, args.max_depth)
+        finally:
+            stacks.write(args.flamegraph)
+    elif governor is not None:
+        with buffered_output(args.output), bulk_input(args.prompts), reported_errors():
+            run_governed(pt, governor, args.engine, args.max_depth)
+    else:
+        with buffered_output(args.output), bulk_input(args.prompts), reported_errors():
+            if args.engine == "vm":
+                run_vm(pt, args.max_depth)
+            else:
+                ENGINES[args.engine](pt)
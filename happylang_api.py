@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Embedding API of the happy language.
+
+A host process compiles the source of a program once and runs it as many
+times as it wants, without starting a Python process per run:
+
+    interpreter = Interpreter(engine="closure")
+    program = interpreter.compile(source)
+    output = program.run(stdin="5\\n")
+
+Errors are raised as HappyError (see happylang_errors): HappySyntaxError or
+HappyCheckError from compile, HappyRuntimeError from run. They do not stop
+the host.
+
+A Governor (see happylang_governor) given to the Interpreter bounds the
+steps, the time, the allocations and the call depth of every run, a limit
+reached raising a HappyLimitError from run.
+
+Every run has its own state: the references of the program are created anew
+(a RefEnv, frames), and sys.stdin and sys.stdout are redirected to the input
+and the output of the run while it runs, then restored. As the engines read
+and write through sys.stdin and sys.stdout, the runs of a process are one
+at a time (RUN_LOCK); run programs in several processes to run them at once.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import io
+import sys
+import threading
+
+from happylang_lexer import LEXER_ENGINES
+from happylang_runtime import DEFAULT_MAX_DEPTH
+from happylang_closure import compile_tree, compile_governed
+from happylang_compiler import compile_program
+from happylang_folder import fold
+from happylang_vectorizer import vectorize
+from happylang_io import HappyOutput, HappyInput
+from happylang_governor import governed
+import happylang_vm
+import happy
+
+"""
+Number of compiled programs kept by an Interpreter, by source
+"""
+DEFAULT_PROGRAMS = 256
+
+"""
+Held while a program runs, sys.stdin and sys.stdout being those of the run
+"""
+RUN_LOCK = threading.Lock()
+
+
+@contextmanager
+def redirected(stdin, stdout, prompts=False, output_mode="block"):
+    """
+    Redirect the input and the output of the engines to the given streams until the end of the block
+
+    Parameters
+    ----------
+    stdin : text stream of the input
+    stdout : text stream of the output
+    prompts : print the prompts of the input statements
+    output_mode : flush policy of the output, one of happylang_io.OUTPUT_MODES
+    """
+    with RUN_LOCK:
+        old_stdin = sys.stdin
+        old_stdout = sys.stdout
+        output = HappyOutput(stdout, output_mode)
+        sys.stdin = HappyInput(stdin, prompts)
+        sys.stdout = output
+        try:
+            yield
+        finally:
+            sys.stdin = old_stdin
+            sys.stdout = old_stdout
+            output.flush()
+
+
+class Program:
+    """
+    A program compiled for an engine, run any number of times
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM), resolved and type checked (see happy.parse_program)
+    engine : one of happy.ENGINES
+    max_depth : bound of the number of nested happy calls on the vm engine
+    governor : Governor bounding every run (see happylang_governor), None
+    """
+    def __init__(self, tree, engine="tree", max_depth=DEFAULT_MAX_DEPTH, governor=None):
+        if engine not in happy.ENGINES:
+            raise ValueError(f"unknown engine {engine}")
+
+        self.tree = tree
+        self.engine = engine
+        self.max_depth = max_depth
+        self.governor = governor
+
+        # the compiled form, made once for all the runs
+        if engine == "closure":
+            self.__main = compile_tree(tree) if governor is None else compile_governed(tree, governor)
+        elif engine == "vm":
+            bytecode = compile_program(tree)
+            self.__main = lambda: happylang_vm.run(bytecode, max_depth, governor=governor)
+        elif governor is None:
+            self.__main = lambda: happy.run_tree(tree)
+        else:
+            def main():
+                with happy.governed_calls(governor):
+                    happy.run_tree(tree)
+
+            self.__main = main
+
+    def run(self, stdin="", stdout=None, prompts=False, output_mode="block"):
+        """
+        Run the program
+
+        Parameters
+        ----------
+        stdin : str or text stream, input of the program
+        stdout : text stream the output is written to, None to return it
+        prompts : print the prompts of the input statements
+        output_mode : flush policy of the output written to stdout, one of happylang_io.OUTPUT_MODES
+
+        Returns
+        -------
+        str or None
+            the output of the program when stdout is None
+
+        Raises
+        ------
+        HappyRuntimeError (HappyLimitError when a limit of the governor is reached),
+        the output written before the error being written to stdout
+        """
+        if isinstance(stdin, str):
+            stdin = io.StringIO(stdin)
+
+        output = io.StringIO() if stdout is None else stdout
+        with redirected(stdin, output, prompts, output_mode):
+            if self.governor is None:
+                self.__main()
+            else:
+                with governed(self.governor):
+                    self.__main()
+
+        return output.getvalue() if stdout is None else None
+
+
+class Interpreter:
+    """
+    Compiler of happy programs, keeping the last programs compiled
+
+    Parameters
+    ----------
+    engine : one of happy.ENGINES
+    lexer : one of happylang_lexer.LEXER_ENGINES
+    max_depth : bound of the number of nested happy calls on the vm engine
+    fold : fold the constant expressions before running (see happylang_folder)
+    vectorize : run the element-wise loops as NumPy operations (see happylang_vectorizer)
+    programs : number of compiled programs kept, by source
+    governor : Governor bounding every run (see happylang_governor), None
+    """
+    def __init__(self, engine="tree", lexer="scan", max_depth=DEFAULT_MAX_DEPTH,
+                 fold=True, vectorize=True, programs=DEFAULT_PROGRAMS, governor=None):
+        if engine not in happy.ENGINES:
+            raise ValueError(f"unknown engine {engine}")
+        if lexer not in LEXER_ENGINES:
+            raise ValueError(f"unknown lexer {lexer}")
+
+        self.engine = engine
+        self.lexer = lexer
+        self.max_depth = max_depth
+        self.fold = fold
+        self.vectorize = vectorize
+        self.programs = programs
+        self.governor = governor
+
+        # source -> Program, the least recently compiled first
+        self.__programs = OrderedDict()
+
+    def compile(self, source):
+        """
+        Parse, check and compile a program, unless it was compiled lately
+
+        Parameters
+        ----------
+        source : str, source of the program
+
+        Returns
+        -------
+        Program
+
+        Raises
+        ------
+        HappySyntaxError, HappyCheckError
+        """
+        program = self.__programs.get(source)
+        if program is not None:
+            self.__programs.move_to_end(source)
+            return program
+
+        tree = happy.parse_program(io.StringIO(source), self.lexer)
+        if self.fold:
+            fold(tree)
+        if self.vectorize:
+            vectorize(tree)
+
+        program = Program(tree, self.engine, self.max_depth, self.governor)
+        if self.programs > 0:
+            self.__programs[source] = program
+            while len(self.__programs) > self.programs:
+                self.__programs.popitem(last=False)
+
+        return program
+
+    def run(self, source, stdin="", stdout=None, prompts=False, output_mode="block"):
+        """
+        Compile a program (see compile) and run it (see Program.run)
+        """
+        return self.compile(source).run(stdin, stdout, prompts, output_mode)
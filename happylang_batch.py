@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Batch runner of happy scripts.
+
+Runs the jobs of a manifest on a pool of worker processes, as many as the
+cores by default: the tree walking engines hold the GIL, the jobs run in
+parallel in separate processes only. Every worker keeps an Interpreter (see
+happylang_api): a script run by several jobs of a worker is parsed once.
+
+The manifest holds a job per line, as a JSON object:
+    {"script": "sort.happy", "stdin": "sort.in", "expected": "sort.out"}
+stdin (the input of the script) and expected (its expected output) are
+optional; relative paths are relative to the directory of the manifest.
+
+The output of a job is what happy.py prints: the output of the script, then
+the message of its error. The summary of every job (status, exit status of
+happy.py, wall time, SHA-1 of the output, whether it is the expected one,
+message of the error) is written as JSON or CSV.
+
+Job statuses (STATUSES):
+    ok: the script ran to its end
+    error: the script stopped on a HappyError (exit status -1)
+    timeout: the job ran longer than --timeout seconds, stopped
+    crash: the interpreter failed (a Python exception), or its worker process died
+A job whose expected output cannot be read is unchecked: its match is None,
+with the error. The jobs of a worker process which died (e.g. killed by the
+system) are run again one at a time, so that only the job killing its
+worker crashes.
+The timeout needs signal.setitimer (not on Windows), otherwise it is not enforced.
+The limits of happylang_governor (--max-steps, --max-time, --max-elements,
+--max-call-depth) stop a job on a HappyLimitError, with the error status.
+
+usage: python happylang_batch.py MANIFEST [-j WORKERS] [--engine ENGINE] [--timeout SECONDS] [--json FILE] [--csv FILE] [LIMITS]
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+
+from happylang_api import Interpreter
+from happylang_errors import HappyError
+from happylang_runtime import DEFAULT_MAX_DEPTH
+import happylang_governor
+from happy import ENGINES
+
+STATUSES = ("ok", "error", "timeout", "crash")
+
+"""
+A job of the manifest: paths of the script, of its input and of its expected output (None if not given)
+"""
+Job = namedtuple("Job", ["script", "stdin", "expected"])
+
+"""
+Summary of a job run
+"""
+JobResult = namedtuple("JobResult", ["script", "status", "exit", "wall", "output_sha1", "matched", "error", "worker"])
+
+"""
+Interpreter of the worker process, made by init_worker
+"""
+worker_interpreter = None
+
+
+class JobTimeout(Exception):
+    pass
+
+
+def read_manifest(path):
+    """
+    Returns
+    -------
+    Job []
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+
+    def resolve_path(p):
+        return None if p is None else os.path.join(directory, p)
+
+    jobs = []
+    with open(path, encoding="utf8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+
+            entry = json.loads(line)
+            if "script" not in entry:
+                print(f"No script in the job on line {line_no} of {path}")
+                sys.exit(-1)
+
+            jobs.append(Job(resolve_path(entry["script"]), resolve_path(entry.get("stdin")),
+                            resolve_path(entry.get("expected"))))
+
+    return jobs
+
+
+def read_text(path):
+    with open(path, encoding="utf8", newline=None) as f:
+        return f.read()
+
+
+def init_worker(engine, max_depth, governor=None):
+    global worker_interpreter
+    worker_interpreter = Interpreter(engine, max_depth=max_depth, governor=governor)
+
+
+def timed_out(signum, frame):
+    raise JobTimeout()
+
+
+def run_job(job, timeout=None):
+    """
+    Run a job in the worker process
+
+    Parameters
+    ----------
+    job : Job
+    timeout : bound of the wall time of the job in seconds, None for no bound
+
+    Returns
+    -------
+    JobResult
+    """
+    error = None
+    status = "ok"
+    exit_status = 0
+    start = time.perf_counter()
+
+    alarm = timeout is not None and hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, timed_out)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    # the output written before an error is kept
+    stdout = io.StringIO()
+    try:
+        source = read_text(job.script)
+        stdin = read_text(job.stdin) if job.stdin is not None else ""
+        worker_interpreter.run(source, stdin, stdout)
+    except HappyError as e:
+        status = "error"
+        exit_status = -1
+        error = e.message
+        stdout.write(e.message + "\n")
+    except JobTimeout:
+        status = "timeout"
+        exit_status = None
+        error = f"timeout after {timeout}s"
+    except Exception:
+        status = "crash"
+        exit_status = 1
+        error = traceback.format_exc(limit=-1).strip()
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    wall = time.perf_counter() - start
+    output = stdout.getvalue()
+
+    matched = None
+    if job.expected is not None:
+        try:
+            matched = read_text(job.expected) == output
+        except (OSError, UnicodeDecodeError) as e:
+            unchecked = f"the expected output cannot be read: {e}"
+            error = unchecked if error is None else f"{error}\n{unchecked}"
+
+    return JobResult(job.script, status, exit_status, wall,
+                     hashlib.sha1(output.encode("utf8")).hexdigest(), matched, error, os.getpid())
+
+
+def run_batch(jobs, workers=None, engine="tree", timeout=None, max_depth=DEFAULT_MAX_DEPTH, governor=None):
+    """
+    Run the jobs on a pool of worker processes
+
+    Parameters
+    ----------
+    jobs : Job []
+    workers : number of worker processes, None for the number of cores
+    engine : one of happy.ENGINES
+    timeout : bound of the wall time of a job in seconds, None for no bound
+    max_depth : bound of the number of nested happy calls on the vm engine
+    governor : Governor bounding every job (see happylang_governor), None
+
+    Returns
+    -------
+    JobResult [], in the order of the jobs
+    """
+    initargs = (engine, max_depth, governor)
+    results = [None]*len(jobs)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as executor:
+        futures = [executor.submit(run_job, job, timeout) for job in jobs]
+        for i, future in enumerate(futures):
+            try:
+                results[i] = future.result()
+            except BrokenProcessPool:
+                # a worker died: the jobs not run are run again below
+                pass
+            except Exception as e:
+                results[i] = crashed(jobs[i], f"the job failed: {e!r}")
+
+    # one at a time, the job killing its worker being the one running
+    executor = None
+    try:
+        for i, job in enumerate(jobs):
+            if results[i] is not None:
+                continue
+
+            if executor is None:
+                executor = ProcessPoolExecutor(1, initializer=init_worker, initargs=initargs)
+            try:
+                results[i] = executor.submit(run_job, job, timeout).result()
+            except BrokenProcessPool:
+                results[i] = crashed(job, "the worker process stopped")
+                executor.shutdown()
+                executor = None
+            except Exception as e:
+                results[i] = crashed(job, f"the job failed: {e!r}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return results
+
+
+def crashed(job, error):
+    """
+    Returns
+    -------
+    JobResult of a job which could not run in its worker
+    """
+    return JobResult(job.script, "crash", 1, 0.0, None, None, error, None)
+
+
+def summary(jobs, results, wall):
+    """
+    Returns
+    -------
+    dict
+        number of jobs by status, of jobs matching or not their expected output
+        or whose expected output was not compared, wall times
+    """
+    return {"jobs": len(results),
+            "statuses": {status: sum(r.status == status for r in results) for status in STATUSES},
+            "matched": sum(r.matched is True for r in results),
+            "mismatched": sum(r.matched is False for r in results),
+            "unchecked": sum(job.expected is not None and r.matched is None for job, r in zip(jobs, results)),
+            "wall": wall,
+            "job_wall": sum(r.wall for r in results)}
+
+
+def write_json(path, results, total):
+    with open(path, "w", encoding="utf8") as f:
+        json.dump({"summary": total, "jobs": [r._asdict() for r in results]}, f, indent=2)
+
+
+def write_csv(path, results):
+    with open(path, "w", encoding="utf8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(JobResult._fields)
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run the happy scripts of a manifest on a pool of processes")
+    arg_parser.add_argument("manifest", help="JSON lines file of the jobs: script, stdin, expected")
+    arg_parser.add_argument("-j", "--workers", type=int, default=None,
+                            help="number of worker processes (default: the number of cores)")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree",
+                            help="execution engine (default: tree)")
+    arg_parser.add_argument("--timeout", type=float, default=None, help="bound of the wall time of a job in seconds")
+    arg_parser.add_argument("--json", metavar="FILE", default=None, help="write the summary of the jobs as JSON to FILE")
+    arg_parser.add_argument("--csv", metavar="FILE", default=None, help="write the summary of the jobs as CSV to FILE")
+    happylang_governor.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    jobs = read_manifest(args.manifest)
+    start = time.perf_counter()
+    results = run_batch(jobs, args.workers, args.engine, args.timeout,
+                        governor=happylang_governor.from_arguments(args))
+    total = summary(jobs, results, time.perf_counter() - start)
+
+    for job, r in zip(jobs, results):
+        if r.matched is None:
+            match = "" if job.expected is None else "  UNCHECKED"
+        else:
+            match = "  matched" if r.matched else "  MISMATCHED"
+        print(f"{r.status:<8} {r.wall:8.3f}s  {r.script}{match}")
+    print(f"{total['jobs']} jobs in {total['wall']:.3f}s: "
+          + ", ".join(f"{n} {status}" for status, n in total["statuses"].items() if n))
+
+    if args.json:
+        write_json(args.json, results, total)
+    if args.csv:
+        write_csv(args.csv, results)
+
+    if total["mismatched"] or total["unchecked"] or total["statuses"]["timeout"] or total["statuses"]["crash"]:
+        sys.exit(1)
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of precompiled happy programs (.happyc files).
+
+A .happyc file holds the ParseTree of a program once parsed, resolved
+(see happylang_resolver) and type checked (see happylang_typechecker),
+serialized with pickle. It is keyed by a hash of the source and of the
+interpreter version, so an edited source or interpreter never loads a
+stale tree.
+
+Unpickling runs code, so a cache file is only unpickled when it was
+written by the user running the interpreter. The file starts with a plain
+header: MAGIC, the key of the program and an HMAC-SHA256 of the key and
+the pickle, made with a secret of the user (a random key in SECRET_PATH,
+readable and writable by the user alone, created on first use). A file
+whose header does not match the source, or whose HMAC does not match the
+pickle, is never unpickled but ignored, as is every cache file when the
+secret cannot be read or is readable or writable by other users. The
+trust boundary is the secret file: whoever can read it can make cache
+files the interpreter will run, whoever can write the cache directories
+can only make the interpreter parse the sources again.
+
+The cache files are stored in a cache directory, by default __happycache__
+next to the source. The size of a cache directory is bounded: when it grows
+over the bound, the least recently used files are evicted.
+"""
+
+import hashlib
+import hmac
+import os
+import pickle
+import sys
+
+CACHE_DIR_NAME = "__happycache__"
+CACHE_SUFFIX = ".happyc"
+DEFAULT_CACHE_SIZE = 64*1024*1024
+
+"""
+First line of a cache file, then the key of the program and the HMAC of the pickle, a line each
+"""
+MAGIC = b"HAPPYC 1"
+
+"""
+File of the secret of the user signing the cache files
+"""
+SECRET_PATH = os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config"),
+                           "happylang", "cache.secret")
+
+SECRET_SIZE = 32
+
+"""
+Modules which define the cached parse trees: any change to them is a new interpreter version
+"""
+INTERPRETER_MODULES = ["happylang_lexer", "happylang_parser", "happylang_resolver",
+                       "happylang_typechecker", "happylang_tailcall", "happylang_cache"]
+
+_interpreter_version = None
+
+
+def interpreter_version():
+    """
+    Returns
+    -------
+    str
+        hash of the interpreter modules and of the Python version
+
+    """
+    global _interpreter_version
+
+    if _interpreter_version is None:
+        h = hashlib.sha256(sys.version.encode("utf8"))
+        for name in INTERPRETER_MODULES:
+            module = sys.modules.get(name) or __import__(name)
+            with open(module.__file__, "rb") as f:
+                h.update(f.read())
+
+        _interpreter_version = h.hexdigest()
+
+    return _interpreter_version
+
+
+def cache_key(source):
+    """
+    Parameters
+    ----------
+    source : bytes, the source of a program
+
+    Returns
+    -------
+    str
+        key of the program in the cache
+
+    """
+    h = hashlib.sha256(interpreter_version().encode("utf8"))
+    h.update(source)
+    return h.hexdigest()
+
+
+def user_secret(secret_path=SECRET_PATH):
+    """
+    Read the secret of the user, created if it does not exist
+
+    Returns
+    -------
+    bytes or None
+        None if the secret cannot be read or created, or if another user
+        owns it or may read or write it
+    """
+    try:
+        os.makedirs(os.path.dirname(secret_path), mode=0o700, exist_ok=True)
+        fd = os.open(secret_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(SECRET_SIZE))
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+
+    try:
+        with open(secret_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+                return None
+
+            secret = f.read()
+    except OSError:
+        return None
+
+    return secret if len(secret) == SECRET_SIZE else None
+
+
+def signature(secret, key, payload):
+    """
+    Returns
+    -------
+    bytes
+        hex HMAC-SHA256 of the key and the pickle of a cache file
+    """
+    return hmac.new(secret, key + b"\n" + payload, hashlib.sha256).hexdigest().encode("ascii")
+
+
+class ProgramCache:
+    """
+    Cache of the parse trees of programs
+
+    Parameters
+    ----------
+    cache_dir : directory of the cache files, None for __happycache__ next to each source
+    max_size : bound of the size of a cache directory, in bytes
+    secret_path : file of the secret signing the cache files, see user_secret
+    """
+    def __init__(self, cache_dir=None, max_size=DEFAULT_CACHE_SIZE, secret_path=SECRET_PATH):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.secret_path = secret_path
+        self.__secret = None
+
+    def secret(self):
+        """
+        Returns
+        -------
+        bytes or None
+            the secret signing the cache files, None when the cache cannot be trusted
+        """
+        if self.__secret is None:
+            self.__secret = user_secret(self.secret_path)
+
+        return self.__secret
+
+    def directory(self, source_path):
+        """
+        Returns
+        -------
+        str
+            cache directory of the given source file
+
+        """
+        if self.cache_dir is not None:
+            return self.cache_dir
+
+        return os.path.join(os.path.dirname(os.path.abspath(source_path)), CACHE_DIR_NAME)
+
+    def path(self, source_path, source):
+        """
+        Returns
+        -------
+        str
+            path of the cache file of the given source
+
+        """
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(self.directory(source_path), f"{stem}.{cache_key(source)[:32]}{CACHE_SUFFIX}")
+
+    def load(self, source_path, source):
+        """
+        Load the cached parse tree of the given source
+
+        Parameters
+        ----------
+        source_path : path of the source file
+        source : bytes, content of the source file
+
+        Returns
+        -------
+        ParseTree or None
+            None if the program is not cached (or the cache file is
+            unreadable, or not signed by the secret of the user)
+
+        """
+        secret = self.secret()
+        if secret is None:
+            return None
+
+        path = self.path(source_path, source)
+        key = cache_key(source).encode("ascii")
+        try:
+            with open(path, "rb") as f:
+                # the plain header first: the pickle of another program or user is never read
+                if f.readline() != MAGIC + b"\n" or f.readline() != key + b"\n":
+                    return None
+
+                file_signature = f.readline().rstrip(b"\n")
+                payload = f.read()
+        except OSError:
+            return None
+
+        if not hmac.compare_digest(file_signature, signature(secret, key, payload)):
+            return None
+
+        try:
+            tree = pickle.loads(payload)
+        except Exception:
+            return None
+
+        # recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return tree
+
+    def store(self, source_path, source, tree):
+        """
+        Store the parse tree of the given source, then evict the least
+        recently used files if the cache directory is over its size bound.
+        A cache which cannot be written is ignored.
+
+        Parameters
+        ----------
+        source_path : path of the source file
+        source : bytes, content of the source file
+        tree : ParseTree, resolved and type checked
+        """
+        secret = self.secret()
+        if secret is None:
+            return
+
+        path = self.path(source_path, source)
+        key = cache_key(source).encode("ascii")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            payload = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(b"\n".join([MAGIC, key, signature(secret, key, payload), payload]))
+
+            # other processes never read a partially written file
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self.evict(os.path.dirname(path))
+
+    def entries(self, directory):
+        """
+        Returns
+        -------
+        (path, size, last use time) []
+            cache files of the given directory, the least recently used first
+
+        """
+        entries = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return entries
+
+        for name in names:
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+
+            entries.append((path, st.st_size, st.st_mtime))
+
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def evict(self, directory):
+        """
+        Remove the least recently used files until the size of the directory fits its bound
+        """
+        entries = self.entries(directory)
+        size = sum(entry[1] for entry in entries)
+
+        for path, entry_size, _ in entries:
+            if size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            size -= entry_size
+
+    def clear(self, directory):
+        """
+        Remove every cache file of the given directory
+
+        Returns
+        -------
+        int
+            number of removed files
+
+        """
+        removed = 0
+        for path, _, _ in self.entries(directory):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+
+        return removed
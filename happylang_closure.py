@@ -0,0 +1,1244 @@
+# -*- coding: utf-8 -*-
+"""
+Closure compiler for the happy language.
+
+compile_tree converts a ParseTree, once, into nested Python closures:
+every node becomes a function of the frame of the running FUN/MAIN which
+calls the pre-compiled functions of its children directly, so running the
+program no longer dispatches on ParseType at every node.
+
+The tree must have been resolved (see happylang_resolver): a frame is a list
+indexed by the slots of the resolver, holding the value of a primitive
+variable or the Ref of an array/stack; calls are bound to their function
+when compiled.
+The compiled program behaves as happy.eval_parse_tree (same output,
+same error messages).
+"""
+
+from happylang_parser import ParseType, RefType
+from happylang_lexer import Token
+from happylang_io import prompt
+from happylang_runtime import Ref, SlotRef, default_number, new_array, stack_overflow, read_input
+from happylang_resolver import RETURN_SLOT
+from happylang_typechecker import STRING
+from happylang_tailcall import TailCall
+from happylang_errors import HappyRuntimeError
+from happylang_governor import CHECK_STEPS
+from happylang_flamegraph import trace_tail_call
+import sys
+
+
+class Function:
+    """
+    A compiled function
+
+    Parameters
+    ----------
+    params : (data type, RefType, slot, PARAM parse tree, column) []
+    frame_size : number of slots of the function's frame
+    block : function(frame), compiled block of the function
+    """
+    def __init__(self, params, frame_size):
+        self.params = params
+        self.frame_size = frame_size
+        self.block = None
+
+
+class TailFrame:
+    """
+    Value of a tail call (see happylang_tailcall): the frame of the call,
+    run in place of the current one
+
+    Parameters
+    ----------
+    frame : frame of the called function, its arguments bound
+    discard : the value of the call is discarded
+    """
+    __slots__ = ("frame", "discard")
+
+    def __init__(self, frame, discard):
+        self.frame = frame
+        self.discard = discard
+
+
+def run_tail_calls(block, frame):
+    """
+    Run the tail calls, one after the other
+
+    Parameters
+    ----------
+    block : compiled block of the function
+    frame : frame of the call, its return slot holding the TailFrame of the first tail call
+
+    Returns
+    -------
+    value of the call
+    """
+    discard = False
+    result = frame[RETURN_SLOT]
+    while type(result) is TailFrame:
+        # unlinked, the frame run is freed
+        frame[RETURN_SLOT] = None
+        discard = discard or result.discard
+        frame = result.frame
+        block(frame)
+        result = frame[RETURN_SLOT]
+
+    return None if discard else result
+
+
+def compile_tree(t, funs=None):
+    """
+    Compile the given parse tree
+
+    Parameters
+    ----------
+    t : ParseTree, resolved by happylang_resolver
+    funs : dict, function name -> Function of the program being compiled
+
+    Returns
+    -------
+    function(frame), function() for a PROGRAM
+
+    """
+    return COMPILERS.get(t.parse_type, compile_NOTHING)(t, funs)
+
+
+def compile_traced(t, stacks):
+    """
+    Compile the given program, every call being reported to stacks
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+    stacks : CallStacks (see happylang_flamegraph)
+
+    Returns
+    -------
+    function()
+    """
+    # of every running call: a tail call of its chain nests (see happylang_flamegraph.trace_tail_call)
+    chains = []
+
+    def compile_traced_CALL(t, funs):
+        call = compile_CALL(t, funs)
+        name = t.children[0].lexeme
+        line = t.line
+        tail_call = t.tail_call
+
+        if tail_call is not None:
+            def traced_tail_call(frame):
+                tail = call(frame)
+                trace_tail_call(stacks, chains, name, line, tail_call)
+                return tail
+
+            return traced_tail_call
+
+        def traced_call(frame):
+            stacks.enter(name, line)
+            chains.append(False)
+            try:
+                return call(frame)
+            finally:
+                if chains.pop():
+                    stacks.leave()
+                stacks.leave()
+
+        return traced_call
+
+    COMPILERS[ParseType.CALL] = compile_traced_CALL
+    try:
+        return compile_tree(t)
+    finally:
+        COMPILERS[ParseType.CALL] = compile_CALL
+
+
+def compile_governed(t, governor):
+    """
+    Compile the given program, its use of the resources being bounded by governor
+
+    Parameters
+    ----------
+    t : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+    governor : Governor (see happylang_governor), started by happylang_governor.governed before every run
+
+    Returns
+    -------
+    function()
+    """
+    # the checks are compiled into the closures themselves: a wrapper would
+    # add a Python frame to every call of a recursion
+    governed_compilers = {ParseType.CALL: lambda t, funs: compile_CALL(t, funs, governor),
+                          ParseType.PUSH: lambda t, funs: compile_PUSH(t, funs, governor),
+                          ParseType.ADD: lambda t, funs: compile_ADD(t, funs, governor),
+                          ParseType.LOOP: lambda t, funs: compile_LOOP(t, funs, governor)}
+    compilers = {parse_type: COMPILERS[parse_type] for parse_type in governed_compilers}
+    COMPILERS.update(governed_compilers)
+    try:
+        return compile_tree(t)
+    finally:
+        COMPILERS.update(compilers)
+
+
+def compile_NOTHING(t, funs):
+    """
+    parse types which evaluate to nothing (e.g. PARAM)
+    """
+    def nothing(frame):
+        return None
+
+    return nothing
+
+
+def undefined_variable(identifier, line):
+    raise HappyRuntimeError(f"Undefined variable {identifier} on line {line}", line)
+
+
+def compile_PROGRAM(t, funs):
+    """
+    functions are bound when compiled: every Function is created before the
+    blocks are compiled
+    """
+    funs = {}
+    for fun_tree in t.children[1:]:
+        params = []
+        for param in fun_tree.children[:-1:1]:
+            params.append((param.children[0].lexeme,
+                           param.ref_type,
+                           param.slot,
+                           param,
+                           param.children[1].col))
+
+        funs[fun_tree.lexeme] = Function(params, fun_tree.frame_size)
+
+    for fun_tree in t.children[1:]:
+        funs[fun_tree.lexeme].block = compile_tree(fun_tree.children[-1], funs)
+
+    main = compile_tree(t.children[0], funs)
+
+    def program():
+        main(None)
+
+    return program
+
+
+def compile_MAIN(t, funs):
+    block = compile_tree(t.children[0], funs)
+    frame_size = t.frame_size
+
+    def main(frame):
+        block([None]*frame_size)
+
+    return main
+
+
+def compile_CALL(t, funs, governor=None):
+    """
+    governor : Governor the calls are reported to (see compile_governed), None
+    """
+    fun_name = t.children[0].lexeme
+    fun_args = [compile_tree(arg, funs) for arg in t.children[1:]]
+    n_args = len(fun_args)
+    line = t.line
+
+    # check the existence of the function
+    if t.children[0].decl is not None:
+        message = f"Non function is called on line {line}"
+    elif fun_name not in funs:
+        message = f"Undefined function is called on line {line}"
+    elif n_args != len(funs[fun_name].params):
+        message = f"Number of arguments does not MATCH number of function's parameters on line {line}"
+    else:
+        message = None
+
+    if message is not None:
+        def fail(frame):
+            raise HappyRuntimeError(message, line)
+
+        return fail
+
+    fun = funs[fun_name]
+    params = fun.params
+    frame_size = fun.frame_size
+
+    bind = compile_binding(params, fun_args, frame_size, line, t.type_checked)
+
+    if t.tail_call is not None:
+        # the call runs in place of the current one (see run_tail_calls)
+        discard = t.tail_call == TailCall.STATEMENT
+
+        if governor is not None:
+            def governed_tail_call(frame):
+                steps = governor.steps + 1
+                governor.steps = steps
+                if steps >= governor.next_check:
+                    governor.check(line)
+
+                frame[RETURN_SLOT] = tail = TailFrame(bind(frame), discard)
+                return tail
+
+            return governed_tail_call
+
+        def tail_call(frame):
+            frame[RETURN_SLOT] = tail = TailFrame(bind(frame), discard)
+            return tail
+
+        return tail_call
+
+    if governor is not None:
+        max_depth = governor.max_depth
+
+        def governed_call(frame):
+            called_fun_frame = bind(frame)
+            # a step, counted inline as the calls are frequent (see Governor.spend)
+            steps = governor.steps + 1
+            governor.steps = steps
+            if steps >= governor.next_check:
+                governor.check(line)
+
+            depth = governor.depth
+            if depth == max_depth:
+                raise governor.depth_limit(line)
+
+            # eval the fun's block, one call deeper
+            governor.depth = depth + 1
+            try:
+                fun.block(called_fun_frame)
+                result = called_fun_frame[RETURN_SLOT]
+                if type(result) is TailFrame:
+                    result = run_tail_calls(fun.block, called_fun_frame)
+            except RecursionError:
+                stack_overflow(line)
+            finally:
+                governor.depth = depth
+
+            return result
+
+        return governed_call
+
+    def call(frame):
+        called_fun_frame = bind(frame)
+
+        # eval the fun's block
+        try:
+            fun.block(called_fun_frame)
+            result = called_fun_frame[RETURN_SLOT]
+            if type(result) is TailFrame:
+                result = run_tail_calls(fun.block, called_fun_frame)
+        except RecursionError:
+            stack_overflow(line)
+
+        return result
+
+    return call
+
+
+def compile_binding(params, fun_args, frame_size, line, type_checked):
+    """
+    Returns
+    -------
+    function(frame)
+        the frame of a call, its arguments evaluated, checked against the
+        parameters (unless type_checked) and bound
+    """
+    if type_checked:
+        # the arguments match the parameters (see happylang_typechecker)
+        bindings = tuple((param_slot, param_ref_type, param_tree, fun_arg)
+                         for (_, param_ref_type, param_slot, param_tree, _), fun_arg in zip(params, fun_args))
+
+        def bind_checked(frame):
+            called_fun_frame = [None]*frame_size
+            for param_slot, param_ref_type, param_tree, fun_arg in bindings:
+                if param_ref_type is RefType.PRIMITIVE:
+                    called_fun_frame[param_slot] = fun_arg(frame)
+                else:
+                    called_fun_frame[param_slot] = Ref(param_ref_type, param_tree, fun_arg(frame).val)
+
+            return called_fun_frame
+
+        return bind_checked
+
+    def bind(frame):
+        called_fun_frame = [None]*frame_size
+        for (param_data_type, param_ref_type, param_slot, param_tree, param_col), fun_arg in zip(params, fun_args):
+            arg = fun_arg(frame)
+
+            if type(arg)==str:
+                arg_ref_type = RefType.PRIMITIVE
+                arg_data_type = "STRING"
+                arg_value = arg
+            elif type(arg)==float:
+                arg_ref_type = RefType.PRIMITIVE
+                arg_data_type = "NUMBER"
+                arg_value = arg
+            else:
+                arg_ref_type = arg.ref_type
+                arg_data_type = arg.ref_tree.children[0].lexeme
+                arg_value = arg.val
+
+            # check param and arg
+            if param_data_type != arg_data_type or param_ref_type != arg_ref_type:
+                raise HappyRuntimeError(
+                    f"Data Type not matched on line {line}, column {param_col}.\nExpect {param_data_type+' '+param_ref_type.name}, but received {arg_data_type+' '+arg_ref_type.name}", line)
+
+            # bind the variable to the frame
+            if param_ref_type == RefType.PRIMITIVE:
+                called_fun_frame[param_slot] = arg_value
+            else:
+                called_fun_frame[param_slot] = Ref(param_ref_type, param_tree, arg_value)
+
+        return called_fun_frame
+
+    return bind
+
+
+def compile_RETURN(t, funs):
+    value = compile_tree(t.children[0], funs)
+
+    def return_(frame):
+        frame[RETURN_SLOT] = value(frame)
+        return True
+
+    return return_
+
+
+def may_return(t):
+    """
+    Returns
+    -------
+    bool
+        a return may run in the statement t: its closure then returns True once a return ran
+    """
+    if t is None:
+        return False
+
+    if t.parse_type == ParseType.RETURN:
+        return True
+
+    if t.parse_type in (ParseType.BLOCK, ParseType.IF, ParseType.IFELSE, ParseType.LOOP):
+        return any(may_return(child) for child in t.children)
+
+    return False
+
+
+def compile_BLOCK(t, funs):
+    stmts = tuple(compile_tree(stmt, funs) for stmt in t.children)
+
+    if not may_return(t):
+        def block(frame):
+            for stmt in stmts:
+                stmt(frame)
+
+        return block
+
+    # the value of the other statements is not a return flag
+    steps = tuple((stmt, may_return(stmt_tree)) for stmt, stmt_tree in zip(stmts, t.children))
+
+    def block_returning(frame):
+        for stmt, returns in steps:
+            if stmt(frame) and returns:
+                return True
+
+    return block_returning
+
+
+def compile_VAR(t, funs):
+    """
+    declaring a variable twice in the same function is reported by the resolver,
+    unless the first declaration may not have run (in a branch or a loop body)
+    """
+    slot = t.slot
+    line = t.line
+    ref_type = t.ref_type
+
+    def declare(frame, val):
+        if frame[slot] is not None:
+            raise HappyRuntimeError(f"Reference declared twice on line {line}", line)
+
+        frame[slot] = val
+
+    if ref_type == RefType.ARRAY:
+        length = compile_tree(t.children[-1], funs)
+
+        def var(frame):
+            declare(frame, Ref(ref_type, t, new_array(t, length(frame))))
+
+    elif ref_type == RefType.STACK:
+        def var(frame):
+            declare(frame, Ref(ref_type, t, []))
+
+    elif t.children[0].token==Token.STRING_TP:
+        def var(frame):
+            declare(frame, "")
+
+    else:
+        def var(frame):
+            declare(frame, default_number())
+
+    return var
+
+
+def compile_ATOMIC(t, funs):
+    """
+    return value for primitive data type
+    otherwise Ref
+    """
+    if t.token in [Token.STRING, Token.NUMBER]:
+        value = t.value
+
+        def literal(frame):
+            return value
+
+        return literal
+
+    slot = t.slot
+
+    if t.check_declared:
+        identifier = t.lexeme
+        line = t.line
+
+        def atomic(frame):
+            if frame[slot] is None:
+                undefined_variable(identifier, line)
+
+            return frame[slot]
+
+        return atomic
+
+    def atomic(frame):
+        return frame[slot]
+
+    return atomic
+
+
+def compile_INPUT(t, funs):
+    refs = t.children
+    line = t.line
+
+    prompt_text = None
+    if refs[0].token==Token.STRING:
+        prompt_text = refs[0].lexeme
+        refs = refs[1:]
+
+    refs = [compile_REF(r, funs) for r in refs]
+
+    def input_(frame):
+        if prompt_text is not None:
+            prompt(prompt_text)
+
+        for ref in refs:
+            # get the ref object of the variable
+            var_ref, idx = ref(frame)
+
+            # read the input
+            input_val = read_input(var_ref.ref_tree, line)
+
+            # assign the input value to the Ref object
+            if idx is None:
+                var_ref.val = input_val
+            else:
+                if idx>=len(var_ref.val):
+                    raise HappyRuntimeError(f"Index out of range on line {line}\nList of size {len(var_ref.val)}", line)
+
+                var_ref.val[idx] = input_val
+
+    return input_
+
+
+def compile_INDEXING(t, funs):
+    seq_of = compile_tree(t.children[0], funs)
+    index_of = compile_tree(t.children[1], funs)
+    line = t.line
+
+    if t.decl.ref_type != RefType.PRIMITIVE and not t.children[0].check_declared:
+        slot = t.slot
+
+        def indexing(frame):
+            seq = frame[slot].val
+
+            index = int(index_of(frame))
+            if index<0 or index>=len(seq):
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            return seq[index]
+
+        return indexing
+
+    def indexing(frame):
+        a = seq_of(frame)
+
+        if type(a)==Ref and a.ref_type in [RefType.ARRAY, RefType.STACK]:
+            seq = a.val
+
+            index = int(index_of(frame))
+            if index<0 or index>=len(seq):
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            return seq[index]
+
+        if type(a)==str:
+            index = int(index_of(frame))
+
+            return a[index]
+
+        raise HappyRuntimeError(f"Indexing only applies to ARRAY or STACK or STRING, on line {line}", line)
+
+    return indexing
+
+
+def compile_PUSH(t, funs, governor=None):
+    """
+    governor : Governor the pushed values are allocated to (see compile_governed), None
+    """
+    line = t.line
+
+    if t.children[0].decl.ref_type != RefType.STACK:
+        def fail(frame):
+            raise HappyRuntimeError(f"Expect a stack on line {line}", line)
+
+        return fail
+
+    stack_of = compile_VAR_REF(t.children[0], funs)
+    value_of = compile_tree(t.children[1], funs)
+    stack_data_type = t.children[0].decl.children[0].lexeme
+    type_checked = t.type_checked
+
+    if governor is not None:
+        element_bound = governor.element_bound
+
+        def governed_push(frame):
+            var_ref = stack_of(frame)
+            pushed_value = value_of(frame)
+
+            if not type_checked and ((type(pushed_value)==str and stack_data_type!="STRING") or (type(pushed_value)==float and stack_data_type!="NUMBER")):
+                raise HappyRuntimeError(f"On line {line}, stack is of type {stack_data_type}, but the pushed value is not a {stack_data_type}", line)
+
+            # allocated, counted inline (see Governor.allocate)
+            elements = governor.elements + 1
+            governor.elements = elements
+            if elements > element_bound:
+                raise governor.allocation_limit(line)
+
+            var_ref.val.append(pushed_value)
+            return pushed_value
+
+        return governed_push
+
+    if type_checked:
+        def push(frame):
+            var_ref = stack_of(frame)
+            pushed_value = value_of(frame)
+            var_ref.val.append(pushed_value)
+            return pushed_value
+
+        return push
+
+    def push(frame):
+        var_ref = stack_of(frame)
+        pushed_value = value_of(frame)
+
+        if (type(pushed_value)==str and stack_data_type!="STRING") or (type(pushed_value)==float and stack_data_type!="NUMBER"):
+            raise HappyRuntimeError(f"On line {line}, stack is of type {stack_data_type}, but the pushed value is not a {stack_data_type}", line)
+
+        var_ref.val.append(pushed_value)
+
+        return pushed_value
+
+    return push
+
+
+def compile_POP(t, funs):
+    line = t.line
+
+    if t.children[0].decl.ref_type != RefType.STACK:
+        def fail(frame):
+            raise HappyRuntimeError(f"Expect a stack on line {line}", line)
+
+        return fail
+
+    stack_of = compile_VAR_REF(t.children[0], funs)
+
+    def pop(frame):
+        val = stack_of(frame).val
+        popped_val = val[-1]
+        del val[-1]
+        return popped_val
+
+    return pop
+
+
+def compile_ASSIGN(t, funs):
+    target = t.children[0]
+    value_of = compile_tree(t.children[1], funs)
+    line = t.line
+    type_checked = t.type_checked
+
+    if target.parse_type != ParseType.INDEXING and target.decl.ref_type == RefType.PRIMITIVE:
+        # the most frequent assignment, stored straight into the frame
+        slot = target.slot
+        check_declared = target.check_declared
+        identifier = target.lexeme
+        target_line = target.line
+
+        if type_checked and not check_declared:
+            def assign(frame):
+                frame[slot] = value_of(frame)
+
+            return assign
+
+        def assign(frame):
+            if check_declared and frame[slot] is None:
+                undefined_variable(identifier, target_line)
+
+            val = value_of(frame)
+            if not type_checked and type(val)!=type(frame[slot]):
+                raise HappyRuntimeError(f"Unmatched type when do the assignment on line {line}", line)
+
+            frame[slot] = val
+
+        return assign
+
+    ref_of = compile_REF(target, funs)
+
+    def assign(frame):
+        var_ref, idx = ref_of(frame)
+        val = value_of(frame)
+
+        if idx is None:
+            if not type_checked and type(val)!=type(var_ref.val):
+                raise HappyRuntimeError(f"Unmatched type when do the assignment on line {line}", line)
+
+            var_ref.val = val
+        else:
+            if idx>=len(var_ref.val):
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            if not type_checked and type(val)!=type(var_ref.val[idx]):
+                raise HappyRuntimeError(f"Unmatched type when do the assignment on line {line}", line)
+
+            var_ref.val[idx] = val
+
+    return assign
+
+
+def compile_SWAP(t, funs):
+    left_of = compile_REF(t.children[0], funs)
+    right_of = compile_REF(t.children[1], funs)
+    line = t.line
+    type_checked = t.type_checked
+
+    def swap(frame):
+        left_var_ref, left_idx = left_of(frame)
+        right_var_ref, right_idx = right_of(frame)
+
+        if left_idx is None:
+            left_val = left_var_ref.val
+        else:
+            if left_idx>=len(left_var_ref.val):
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            left_val = left_var_ref.val[left_idx]
+
+        if right_idx is None:
+            right_val = right_var_ref.val
+        else:
+            if right_idx>=len(right_var_ref.val):
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            right_val = right_var_ref.val[right_idx]
+
+        # check data type
+        if not type_checked and type(left_val)!=type(right_val):
+            raise HappyRuntimeError(f"Unmatched data type when do the swap on line {line}", line)
+
+        # assign the swapped values to Refs
+        if left_idx is None:
+            left_var_ref.val = right_val
+        else:
+            left_var_ref.val[left_idx] = right_val
+
+        if right_idx is None:
+            right_var_ref.val = left_val
+        else:
+            right_var_ref.val[right_idx] = left_val
+
+    return swap
+
+
+def compile_REF(t, funs):
+    """
+    Returns
+    -------
+    function(frame) returning (var_ref : Ref, idx : None or the index)
+
+    """
+    if t.parse_type == ParseType.INDEXING:
+        var_ref_of = compile_VAR_REF(t.children[0], funs)
+        index_of = compile_tree(t.children[1], funs)
+        line = t.line
+
+        def ref(frame):
+            var_ref = var_ref_of(frame)
+            idx = int(index_of(frame))
+            if idx<0:
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            return (var_ref, idx)
+
+        return ref
+
+    var_ref_of = compile_VAR_REF(t, funs)
+
+    def ref(frame):
+        return (var_ref_of(frame), None)
+
+    return ref
+
+
+def compile_VAR_REF(t, funs):
+    """
+    Returns
+    -------
+    function(frame) returning var_ref : Ref, a SlotRef for a primitive variable
+
+    """
+    slot = t.slot
+    decl = t.decl
+    check_declared = t.check_declared
+    identifier = t.lexeme
+    line = t.line
+
+    if decl.ref_type == RefType.PRIMITIVE:
+        def var_ref_of(frame):
+            if check_declared and frame[slot] is None:
+                undefined_variable(identifier, line)
+
+            return SlotRef(frame, slot, decl)
+
+        return var_ref_of
+
+    def var_ref_of(frame):
+        if check_declared and frame[slot] is None:
+            undefined_variable(identifier, line)
+
+        return frame[slot]
+
+    return var_ref_of
+
+
+def compile_ADD(t, funs, governor=None):
+    """
+    governor : Governor the characters of the strings made are allocated to (see compile_governed), None
+    """
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+    line = t.line
+
+    if governor is not None and not (t.type_checked and t.expr_type != STRING):
+        element_bound = governor.element_bound
+
+        def governed_add(frame):
+            left = left_of(frame)
+            right = right_of(frame)
+
+            if type(left)==str or type(right)==str:
+                s = str(left) + str(right)
+                # allocated, counted inline (see Governor.allocate)
+                elements = governor.elements + len(s)
+                governor.elements = elements
+                if elements > element_bound:
+                    raise governor.allocation_limit(line)
+
+                return s
+
+            return left + right
+
+        return governed_add
+
+    if t.type_checked and t.expr_type == STRING:
+        def concat(frame):
+            return str(left_of(frame)) + str(right_of(frame))
+
+        return concat
+
+    if t.type_checked:
+        def add(frame):
+            return left_of(frame) + right_of(frame)
+
+        return add
+
+    def add(frame):
+        left = left_of(frame)
+        right = right_of(frame)
+
+        if type(left)==str or type(right)==str:
+            left = str(left)
+            right = str(right)
+
+        return left + right
+
+    return add
+
+
+def compile_SUB(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def sub(frame):
+        return left_of(frame) - right_of(frame)
+
+    return sub
+
+
+def compile_MUL(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def mul(frame):
+        return left_of(frame) * right_of(frame)
+
+    return mul
+
+
+def compile_DIV(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+    line = t.line
+
+    def div(frame):
+        left = left_of(frame)
+        right = right_of(frame)
+
+        if right == 0:
+            raise HappyRuntimeError(f"Division by 0 on line {line}", line)
+
+        return left/right
+
+    return div
+
+
+def compile_MOD(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+    line = t.line
+
+    def mod(frame):
+        left = left_of(frame)
+        right = right_of(frame)
+
+        if right == 0:
+            raise HappyRuntimeError(f"Division by 0 on line {line}", line)
+
+        return left%right
+
+    return mod
+
+
+def compile_POW(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def pow_(frame):
+        return left_of(frame) ** right_of(frame)
+
+    return pow_
+
+
+def compile_NEG(t, funs):
+    value_of = compile_tree(t.children[0], funs)
+
+    def neg(frame):
+        return -value_of(frame)
+
+    return neg
+
+
+def compile_PRINT(t, funs):
+    args = tuple(compile_tree(arg, funs) for arg in t.children)
+
+    def print_(frame):
+        parts = []
+
+        for arg in args:
+            val = arg(frame)
+            if type(val) == float:
+                val = str(val)
+
+            parts.append(val)
+
+        sys.stdout.write("".join(parts))
+
+    return print_
+
+
+def compile_PRINTLN(t, funs):
+    args = tuple(compile_tree(arg, funs) for arg in t.children)
+
+    def println(frame):
+        parts = []
+
+        for arg in args:
+            val = arg(frame)
+            if type(val) == float:
+                val = str(val)
+
+            parts.append(val)
+
+        parts.append("\n")
+        sys.stdout.write("".join(parts))
+
+    return println
+
+
+def compile_IF(t, funs):
+    cond = compile_tree(t.children[0], funs)
+    block = compile_tree(t.children[1], funs)
+
+    def if_(frame):
+        if cond(frame):
+            return block(frame)
+
+    return if_
+
+
+def compile_IFELSE(t, funs):
+    cond = compile_tree(t.children[0], funs)
+    b1 = compile_tree(t.children[1], funs)
+    b2 = compile_tree(t.children[2], funs)
+
+    def ifelse(frame):
+        if cond(frame):
+            return b1(frame)
+        else:
+            return b2(frame)
+
+    return ifelse
+
+
+"""
+Both operands of the conditions are always evaluated, as in happy.eval_AND, happy.eval_OR
+"""
+def compile_AND(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def and_(frame):
+        left = left_of(frame)
+        right = right_of(frame)
+
+        return left and right
+
+    return and_
+
+
+def compile_OR(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def or_(frame):
+        left = left_of(frame)
+        right = right_of(frame)
+
+        return left or right
+
+    return or_
+
+
+def compile_EQ(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def eq(frame):
+        return left_of(frame) == right_of(frame)
+
+    return eq
+
+
+def compile_NE(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def ne(frame):
+        return left_of(frame) != right_of(frame)
+
+    return ne
+
+
+def compile_GE(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def ge(frame):
+        return left_of(frame) >= right_of(frame)
+
+    return ge
+
+
+def compile_GT(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def gt(frame):
+        return left_of(frame) > right_of(frame)
+
+    return gt
+
+
+def compile_LE(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def le(frame):
+        return left_of(frame) <= right_of(frame)
+
+    return le
+
+
+def compile_LT(t, funs):
+    left_of = compile_tree(t.children[0], funs)
+    right_of = compile_tree(t.children[1], funs)
+
+    def lt(frame):
+        return left_of(frame) < right_of(frame)
+
+    return lt
+
+
+def compile_LOOP(t, funs, governor=None):
+    """
+    governor : Governor the iterations are spent to as steps (see compile_governed), None
+    """
+    condition_idx = 0
+
+    for i in range(len(t.children)):
+        if t.children[i].parse_type in [ParseType.AND, ParseType.OR, ParseType.LT, ParseType.LE, ParseType.GT, ParseType.GE, ParseType.NE, ParseType.EQ]:
+            condition_idx = i
+            break
+
+    condition = compile_tree(t.children[condition_idx], funs)
+    start_loop_assigns = tuple(compile_tree(a, funs) for a in t.children[:condition_idx])
+    loop_assigns = tuple(compile_tree(a, funs) for a in t.children[condition_idx+1:-1])
+    block = compile_tree(t.children[-1], funs)
+
+    if governor is not None:
+        spend = governor.spend
+        line = t.line
+        returning = may_return(t.children[-1])
+
+        def governed_loop(frame):
+            for assign in start_loop_assigns:
+                assign(frame)
+
+            # the iterations are counted here, spent CHECK_STEPS at a time
+            steps = 0
+            while condition(frame):
+                steps += 1
+                if steps == CHECK_STEPS:
+                    spend(steps, line)
+                    steps = 0
+
+                if block(frame) and returning:
+                    spend(steps, line)
+                    return True
+
+                for assign in loop_assigns:
+                    assign(frame)
+
+            spend(steps, line)
+
+        loop = governed_loop
+
+    elif may_return(t.children[-1]):
+        def loop_returning(frame):
+            for assign in start_loop_assigns:
+                assign(frame)
+
+            # loop, until a return runs in the block
+            while condition(frame):
+                if block(frame):
+                    return True
+
+                for assign in loop_assigns:
+                    assign(frame)
+
+        return loop_returning
+
+    else:
+        def loop(frame):
+            # start loop assignments
+            for assign in start_loop_assigns:
+                assign(frame)
+
+            # loop
+            while condition(frame):
+                block(frame)
+
+                for assign in loop_assigns:
+                    assign(frame)
+
+    vector_loop = t.vector_loop
+    if vector_loop is not None:
+        # marked by happylang_vectorizer
+        def vector_or_loop(frame):
+            if not vector_loop.run_frame(frame):
+                loop(frame)
+
+        return vector_or_loop
+
+    return loop
+
+
+def compile_LEN(t, funs):
+    value_of = compile_tree(t.children[0], funs)
+    line = t.line
+
+    def len_(frame):
+        v = value_of(frame)
+
+        if type(v)==Ref and v.ref_type in [RefType.ARRAY, RefType.STACK]:
+            return len(v.val)
+
+        if type(v)==str:
+            return len(v)
+
+        raise HappyRuntimeError(f"len() expects argument of type ARRAY or STACK or STRING on line {line}", line)
+
+    return len_
+
+
+COMPILERS = {
+    ParseType.PROGRAM: compile_PROGRAM,
+    ParseType.MAIN: compile_MAIN,
+    ParseType.VAR: compile_VAR,
+    ParseType.BLOCK: compile_BLOCK,
+    ParseType.ATOMIC: compile_ATOMIC,
+    ParseType.ADD: compile_ADD,
+    ParseType.SUB: compile_SUB,
+    ParseType.MUL: compile_MUL,
+    ParseType.DIV: compile_DIV,
+    ParseType.MOD: compile_MOD,
+    ParseType.POW: compile_POW,
+    ParseType.NEG: compile_NEG,
+    ParseType.LEN: compile_LEN,
+    ParseType.INDEXING: compile_INDEXING,
+    ParseType.CALL: compile_CALL,
+    ParseType.ASSIGN: compile_ASSIGN,
+    ParseType.SWAP: compile_SWAP,
+    ParseType.PUSH: compile_PUSH,
+    ParseType.POP: compile_POP,
+    ParseType.IF: compile_IF,
+    ParseType.IFELSE: compile_IFELSE,
+    ParseType.AND: compile_AND,
+    ParseType.OR: compile_OR,
+    ParseType.EQ: compile_EQ,
+    ParseType.NE: compile_NE,
+    ParseType.LT: compile_LT,
+    ParseType.LE: compile_LE,
+    ParseType.GT: compile_GT,
+    ParseType.GE: compile_GE,
+    ParseType.LOOP: compile_LOOP,
+    ParseType.PRINT: compile_PRINT,
+    ParseType.PRINTLN: compile_PRINTLN,
+    ParseType.INPUT: compile_INPUT,
+    ParseType.RETURN: compile_RETURN,
+}
@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+Bytecode compiler for the happy language.
+
+HappyCompiler lowers the ParseTree produced by HappyParser into a flat list
+of instructions for the stack-based virtual machine in happylang_vm.
+Every instruction is (op, arg, line): an OpCode, its argument and the
+source line used in error messages.
+
+The tree must have been resolved (see happylang_resolver): variables are
+addressed by their slot in the frame of the running FUN/MAIN, which holds the
+value of a primitive variable or the Ref of an array/stack, and calls are
+bound to their function when compiled.
+
+Layout of the compiled program:
+    ENTER_MAIN, the main block, HALT
+    the block of every function, each one ending with END_FUN
+    the return of the tail calls whose value is discarded: POP_TOP, CONST None, RETURN
+Control flow uses absolute jump targets. A return leaves its function at once:
+RETURN in a function, a jump to HALT in main.
+
+A call in tail position (see happylang_tailcall) is a TAIL_CALL: the called
+function runs in the frame slot of the current one. When the value of the call
+is discarded, the current call returns through the discarding return instead,
+added once below a run of tail calls.
+"""
+
+from happylang_parser import ParseType, RefType
+from happylang_lexer import Token
+from happylang_typechecker import STRING
+from happylang_tailcall import TailCall
+from enum import Enum, auto
+from collections import namedtuple
+
+
+class OpCode(Enum):
+    # expressions, push their value on the operand stack
+    CONST = auto()          # arg: value
+    LOAD = auto()           # arg: slot. push the value of a primitive, otherwise the Ref
+    LOAD_SEQ = auto()       # arg: slot. push the array/stack list or the string to index
+    INDEX = auto()          # pop index, sequence. push sequence[index]
+    LEN = auto()            # arg: slot
+    ADD = auto()
+    ADD_NUMBER = auto()     # ADD of two numbers (see happylang_typechecker)
+    CONCAT = auto()         # ADD of a string and any value (see happylang_typechecker)
+    SUB = auto()
+    MUL = auto()
+    DIV = auto()
+    MOD = auto()
+    POW = auto()
+    NEG = auto()
+    AND = auto()
+    OR = auto()
+    EQ = auto()
+    NE = auto()
+    LT = auto()
+    LE = auto()
+    GT = auto()
+    GE = auto()
+
+    # references
+    CHECK_DECLARED = auto() # arg: (slot, identifier). the variable may not be declared yet
+    LOAD_REF = auto()       # arg: (slot, VAR or PARAM parse tree). push the SlotRef of a primitive variable
+    STORE_LOCAL = auto()    # arg: slot. pop the value of a primitive variable
+    STORE_LOCAL_FAST = auto()   # arg: slot. STORE_LOCAL of a value of the type of the variable
+    STORE = auto()          # arg: type checked. pop value, Ref
+    STORE_INDEX = auto()    # arg: type checked. pop value, index, Ref
+    SWAP = auto()           # arg: (left is indexed, right is indexed, type checked)
+    PUSH = auto()           # arg: type checked. pop value, Ref of the stack. push value
+    POP = auto()            # pop Ref of the stack. push the popped value
+
+    # declarations
+    VAR = auto()            # arg: (slot, VAR parse tree). an ARRAY pops its length
+    ENTER_MAIN = auto()     # arg: size of the frame of main
+
+    # statements
+    POP_TOP = auto()        # discard the value of an expression statement
+    PRINT = auto()          # arg: number of values to pop
+    PRINTLN = auto()        # arg: number of values to pop
+    PROMPT = auto()         # arg: text printed before reading the input
+    INPUT = auto()          # pop Ref
+    INPUT_INDEX = auto()    # pop index, Ref
+
+    # control flow
+    JUMP = auto()           # arg: target
+    JUMP_BACK = auto()      # arg: target. JUMP of the end of a loop to its condition, a step of the governor
+    JUMP_IF_FALSE = auto()  # arg: target. pop the condition
+    VECTOR_LOOP = auto()    # arg: (VectorLoop, target). jump to target if the loop ran vectorized
+
+    # calls
+    CALL_BEGIN = auto()     # arg: CompiledFun. push the call being prepared
+    BIND_ARG = auto()       # arg: index of the parameter. pop the argument
+    BIND_ARG_FAST = auto()  # arg: index of the parameter. BIND_ARG of an argument of the type of the parameter
+    CALL = auto()           # pop the prepared call, push a frame and jump to the function
+    TAIL_CALL = auto()      # arg: discarding return or None. pop the prepared call, replace the frame and jump to the function
+    RETURN = auto()         # pop the return value of the current function, then as END_FUN
+    END_FUN = auto()        # pop the frame, push the return value
+    FAIL = auto()           # arg: error message. an error known when compiling, reported when reached
+    HALT = auto()
+
+
+Instruction = namedtuple('Instruction', ['op', 'arg', 'line'])
+
+
+class CompiledFun:
+    """
+    A function of the compiled program
+
+    Parameters
+    ----------
+    name : function name
+    tree : ParseTree(ParseType.FUN)
+    params : (data type, RefType, slot, PARAM parse tree, column) []
+    frame_size : number of slots of the function's frame
+    entry : address of the first instruction of the function's block
+    """
+    def __init__(self, name, tree, params):
+        self.name = name
+        self.tree = tree
+        self.params = params
+        self.frame_size = tree.frame_size
+        self.entry = None
+
+
+class Program:
+    """
+    Compiled happy program
+
+    Parameters
+    ----------
+    code : Instruction []
+    functions : CompiledFun []
+    """
+    def __init__(self, code, functions):
+        self.code = code
+        self.functions = functions
+
+
+"""
+Parse types of expressions: as a statement, their value is discarded
+"""
+EXPRESSIONS = {ParseType.ATOMIC, ParseType.ADD, ParseType.SUB, ParseType.MUL, ParseType.DIV,
+               ParseType.MOD, ParseType.POW, ParseType.NEG, ParseType.LEN, ParseType.INDEXING,
+               ParseType.CALL, ParseType.PUSH, ParseType.POP, ParseType.AND, ParseType.OR,
+               ParseType.EQ, ParseType.NE, ParseType.LT, ParseType.LE, ParseType.GT, ParseType.GE}
+
+"""
+Parse types compiled into a single instruction after both operands
+"""
+BINARY_OPS = {ParseType.ADD: OpCode.ADD,
+              ParseType.SUB: OpCode.SUB,
+              ParseType.MUL: OpCode.MUL,
+              ParseType.DIV: OpCode.DIV,
+              ParseType.MOD: OpCode.MOD,
+              ParseType.POW: OpCode.POW,
+              ParseType.AND: OpCode.AND,
+              ParseType.OR: OpCode.OR,
+              ParseType.EQ: OpCode.EQ,
+              ParseType.NE: OpCode.NE,
+              ParseType.LT: OpCode.LT,
+              ParseType.LE: OpCode.LE,
+              ParseType.GT: OpCode.GT,
+              ParseType.GE: OpCode.GE}
+
+CONDITIONS = [ParseType.AND, ParseType.OR, ParseType.LT, ParseType.LE, ParseType.GT, ParseType.GE, ParseType.NE, ParseType.EQ]
+
+
+class HappyCompiler:
+    """
+    Compile a ParseTree(ParseType.PROGRAM) into a Program.
+    Each private method emits the instructions of one kind of parse tree.
+    """
+    def __init__(self, tree):
+        self.__tree = tree
+        self.__code = []
+        self.__functions = []
+
+        # function name -> CompiledFun
+        self.__bindings = {}
+
+        # addresses of the jumps of the returns of main, None in a function
+        self.__main_returns = None
+
+        # addresses of the tail calls whose value is discarded
+        self.__discarding_tail_calls = []
+
+    def compile(self):
+        """
+        Returns
+        -------
+        Program
+
+        """
+        self.__program(self.__tree)
+        return Program(self.__code, self.__functions)
+
+    def __emit(self, op, arg=None, line=None):
+        """
+        Append an instruction
+
+        Returns
+        -------
+        int
+            address of the instruction
+
+        """
+        self.__code.append(Instruction(op, arg, line))
+        return len(self.__code) - 1
+
+    def __patch(self, address, target):
+        """
+        Set the target of the jump at the given address
+        """
+        op, arg, line = self.__code[address]
+        self.__code[address] = Instruction(op, target, line)
+
+    def __here(self):
+        """
+        Returns
+        -------
+        int
+            address of the next instruction
+        """
+        return len(self.__code)
+
+    def __program(self, t):
+        """
+        functions are bound when compiled: every CompiledFun is created before the blocks are compiled
+        """
+        funs = []
+        for fun_tree in t.children[1:]:
+            fun = self.__fun_decl(fun_tree)
+            funs.append((fun, fun_tree))
+            self.__bindings[fun.name] = fun
+
+        # main
+        self.__emit(OpCode.ENTER_MAIN, t.children[0].frame_size)
+        self.__main_returns = []
+        self.__stmt(t.children[0].children[0])
+        for address in self.__main_returns:
+            self.__patch(address, self.__here())
+        self.__main_returns = None
+        self.__emit(OpCode.HALT)
+
+        for fun, fun_tree in funs:
+            fun.entry = self.__here()
+            self.__stmt(fun_tree.children[-1])
+            self.__emit(OpCode.END_FUN)
+
+        if self.__discarding_tail_calls:
+            discarding_return = self.__emit(OpCode.POP_TOP)
+            self.__emit(OpCode.CONST, None)
+            self.__emit(OpCode.RETURN)
+            for address in self.__discarding_tail_calls:
+                self.__patch(address, discarding_return)
+
+    def __fun_decl(self, t):
+        """
+        Returns
+        -------
+        CompiledFun
+
+        """
+        params = []
+        for param in t.children[:-1:1]:
+            params.append((param.children[0].lexeme,
+                           param.ref_type,
+                           param.slot,
+                           param,
+                           param.children[1].col))
+
+        fun = CompiledFun(t.lexeme, t, params)
+        self.__functions.append(fun)
+        return fun
+
+    def __stmt(self, t):
+        """
+        Compile a statement, leaving the operand stack unchanged
+        """
+        pt = t.parse_type
+
+        if pt == ParseType.BLOCK:
+            for stmt in t.children:
+                self.__stmt(stmt)
+        elif pt == ParseType.VAR:
+            self.__var(t)
+        elif pt == ParseType.ASSIGN:
+            self.__assign(t)
+        elif pt == ParseType.SWAP:
+            self.__swap(t)
+        elif pt == ParseType.IF:
+            self.__if(t)
+        elif pt == ParseType.IFELSE:
+            self.__ifelse(t)
+        elif pt == ParseType.LOOP:
+            self.__loop(t)
+        elif pt == ParseType.PRINT or pt == ParseType.PRINTLN:
+            self.__print(t)
+        elif pt == ParseType.INPUT:
+            self.__input(t)
+        elif pt == ParseType.RETURN:
+            self.__expr(t.children[0])
+            if self.__main_returns is None:
+                self.__emit(OpCode.RETURN)
+            else:
+                self.__emit(OpCode.POP_TOP)
+                self.__main_returns.append(self.__emit(OpCode.JUMP))
+        elif pt in EXPRESSIONS:
+            self.__expr(t)
+            self.__emit(OpCode.POP_TOP)
+
+    def __var(self, t):
+        if t.ref_type == RefType.ARRAY:
+            self.__expr(t.children[-1])
+
+        self.__emit(OpCode.VAR, (t.slot, t), t.line)
+
+    def __check_declared(self, t):
+        """
+        Check the declaration of a variable which may not be declared yet
+
+        Returns
+        -------
+        int
+            slot of the variable
+
+        """
+        if t.check_declared:
+            self.__emit(OpCode.CHECK_DECLARED, (t.slot, t.lexeme), t.line)
+
+        return t.slot
+
+    def __var_ref(self, t):
+        """
+        Push the Ref of the variable
+        """
+        slot = self.__check_declared(t)
+        if t.decl.ref_type == RefType.PRIMITIVE:
+            self.__emit(OpCode.LOAD_REF, (slot, t.decl), t.line)
+        else:
+            self.__emit(OpCode.LOAD, slot, t.line)
+
+    def __ref(self, t):
+        """
+        Push the Ref of the variable, then the index if t is INDEXING
+
+        Returns
+        -------
+        bool
+            True if t is INDEXING
+
+        """
+        if t.parse_type == ParseType.INDEXING:
+            self.__var_ref(t.children[0])
+            self.__expr(t.children[1])
+            return True
+
+        self.__var_ref(t)
+        return False
+    
+    def __load_stack(self, t, stack_tree):
+        """
+        Push the Ref of the stack of a PUSH or POP tree
+
+        Returns
+        -------
+        bool
+            False if the variable is not a stack
+        """
+        if stack_tree.decl.ref_type != RefType.STACK:
+            self.__emit(OpCode.FAIL, f"Expect a stack on line {t.line}", t.line)
+            return False
+
+        self.__emit(OpCode.LOAD, self.__check_declared(stack_tree), t.line)
+        return True
+
+    def __assign(self, t):
+        target = t.children[0]
+        if target.parse_type != ParseType.INDEXING and target.decl.ref_type == RefType.PRIMITIVE:
+            # the most frequent assignment, stored straight into the frame
+            slot = self.__check_declared(target)
+            self.__expr(t.children[1])
+            op = OpCode.STORE_LOCAL_FAST if t.type_checked else OpCode.STORE_LOCAL
+            self.__emit(op, slot, t.line)
+            return
+
+        indexed = self.__ref(target)
+        self.__expr(t.children[1])
+        self.__emit(OpCode.STORE_INDEX if indexed else OpCode.STORE, t.type_checked, t.line)
+
+    def __swap(self, t):
+        left_indexed = self.__ref(t.children[0])
+        right_indexed = self.__ref(t.children[1])
+        self.__emit(OpCode.SWAP, (left_indexed, right_indexed, t.type_checked), t.line)
+
+    def __if(self, t):
+        self.__expr(t.children[0])
+        jump_end = self.__emit(OpCode.JUMP_IF_FALSE)
+        self.__stmt(t.children[1])
+        self.__patch(jump_end, self.__here())
+
+    def __ifelse(self, t):
+        self.__expr(t.children[0])
+        jump_else = self.__emit(OpCode.JUMP_IF_FALSE)
+        self.__stmt(t.children[1])
+        jump_end = self.__emit(OpCode.JUMP)
+        self.__patch(jump_else, self.__here())
+        self.__stmt(t.children[2])
+        self.__patch(jump_end, self.__here())
+
+    def __loop(self, t):
+        condition_idx = 0
+
+        for i in range(len(t.children)):
+            if t.children[i].parse_type in CONDITIONS:
+                condition_idx = i
+                break
+
+        # marked by happylang_vectorizer
+        vector_loop = None
+        if t.vector_loop is not None:
+            vector_loop = self.__emit(OpCode.VECTOR_LOOP, None, t.line)
+
+        # start loop assignments
+        for assign in t.children[:condition_idx]:
+            self.__stmt(assign)
+
+        start = self.__here()
+        self.__expr(t.children[condition_idx])
+        jump_end = self.__emit(OpCode.JUMP_IF_FALSE)
+
+        self.__stmt(t.children[-1])
+        for assign in t.children[condition_idx+1:-1]:
+            self.__stmt(assign)
+
+        self.__emit(OpCode.JUMP_BACK, start, t.line)
+        self.__patch(jump_end, self.__here())
+
+        if vector_loop is not None:
+            self.__patch(vector_loop, (t.vector_loop, self.__here()))
+
+    def __print(self, t):
+        for arg in t.children:
+            self.__expr(arg)
+
+        op = OpCode.PRINT if t.parse_type == ParseType.PRINT else OpCode.PRINTLN
+        self.__emit(op, len(t.children), t.line)
+
+    def __input(self, t):
+        refs = t.children
+        if refs[0].token==Token.STRING:
+            self.__emit(OpCode.PROMPT, refs[0].lexeme, t.line)
+            refs = refs[1:]
+
+        for r in refs:
+            indexed = self.__ref(r)
+            self.__emit(OpCode.INPUT_INDEX if indexed else OpCode.INPUT, None, t.line)
+
+    def __expr(self, t):
+        """
+        Compile an expression, pushing its value on the operand stack
+        """
+        pt = t.parse_type
+
+        if pt in BINARY_OPS:
+            self.__expr(t.children[0])
+            self.__expr(t.children[1])
+
+            op = BINARY_OPS[pt]
+            if pt == ParseType.ADD and t.type_checked:
+                op = OpCode.CONCAT if t.expr_type == STRING else OpCode.ADD_NUMBER
+            self.__emit(op, None, t.line)
+        elif pt == ParseType.ATOMIC:
+            if t.token in [Token.STRING, Token.NUMBER]:
+                self.__emit(OpCode.CONST, t.value, t.line)
+            else:
+                self.__emit(OpCode.LOAD, self.__check_declared(t), t.line)
+        elif pt == ParseType.INDEXING:
+            # the indexed identifier is checked before the index is evaluated
+            self.__emit(OpCode.LOAD_SEQ, self.__check_declared(t.children[0]), t.line)
+            self.__expr(t.children[1])
+            self.__emit(OpCode.INDEX, None, t.line)
+        elif pt == ParseType.NEG:
+            self.__expr(t.children[0])
+            self.__emit(OpCode.NEG)
+        elif pt == ParseType.LEN:
+            self.__emit(OpCode.LEN, self.__check_declared(t.children[0]), t.line)
+        elif pt == ParseType.CALL:
+            self.__call(t)
+        elif pt == ParseType.PUSH:
+            if self.__load_stack(t, t.children[0]):
+                self.__expr(t.children[1])
+                self.__emit(OpCode.PUSH, t.type_checked, t.line)
+        elif pt == ParseType.POP:
+            if self.__load_stack(t, t.children[0]):
+                self.__emit(OpCode.POP, None, t.line)
+        else:
+            # not an expression, evaluates to nothing
+            self.__emit(OpCode.CONST, None)
+
+    def __call(self, t):
+        fun_name = t.children[0].lexeme
+        fun_args = t.children[1:]
+        line = t.line
+
+        # check the existence of the function
+        fun = self.__bindings.get(fun_name)
+        if t.children[0].decl is not None:
+            self.__emit(OpCode.FAIL, f"Non function is called on line {line}", line)
+        elif fun is None:
+            self.__emit(OpCode.FAIL, f"Undefined function is called on line {line}", line)
+        elif len(fun_args) != len(fun.params):
+            self.__emit(OpCode.FAIL, f"Number of arguments does not MATCH number of function's parameters on line {line}", line)
+        else:
+            self.__emit(OpCode.CALL_BEGIN, fun, line)
+            for i, arg in enumerate(fun_args):
+                self.__expr(arg)
+                self.__emit(OpCode.BIND_ARG_FAST if t.type_checked else OpCode.BIND_ARG, i, line)
+            if t.tail_call is None:
+                self.__emit(OpCode.CALL, None, line)
+            elif t.tail_call == TailCall.STATEMENT:
+                self.__discarding_tail_calls.append(self.__emit(OpCode.TAIL_CALL, None, line))
+            else:
+                self.__emit(OpCode.TAIL_CALL, None, line)
+
+
+def compile_program(tree):
+    """
+    Compile the given parse tree
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM)
+
+    Returns
+    -------
+    Program
+
+    """
+    return HappyCompiler(tree).compile()
+
+
+def disassemble(program):
+    """
+    Human readable listing of the compiled program
+
+    Parameters
+    ----------
+    program : Program
+
+    Returns
+    -------
+    str
+
+    """
+    entries = {fun.entry: fun.name for fun in program.functions}
+
+    lines = []
+    for address, (op, arg, line) in enumerate(program.code):
+        if address in entries:
+            lines.append(f"\n{entries[address]}:")
+
+        if isinstance(arg, CompiledFun):
+            arg = f"{arg.name} @{arg.entry}"
+        elif op == OpCode.VAR:
+            slot, tree = arg
+            arg = f"{tree.children[0].lexeme} {tree.ref_type.name} {tree.children[1].lexeme} @{slot}"
+        elif op == OpCode.LOAD_REF:
+            slot, tree = arg
+            arg = f"{tree.children[1].lexeme} @{slot}"
+        elif op in (OpCode.JUMP, OpCode.JUMP_BACK, OpCode.JUMP_IF_FALSE) or (op == OpCode.TAIL_CALL and arg is not None):
+            arg = f"-> {arg}"
+        elif op == OpCode.VECTOR_LOOP:
+            arg = f"-> {arg[1]}"
+        elif arg is None:
+            arg = ""
+        else:
+            arg = repr(arg)
+
+        source_line = f"line {line}" if line else ""
+        lines.append(f"{address:>6}  {op.name:<14} {arg:<30} {source_line}".rstrip())
+
+    return "\n".join(lines)
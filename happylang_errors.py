@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Errors of the happy language.
+
+The parser, the checks and the engines raise a HappyError with the message
+of the error and its line; happy.py prints the message and stops, a program
+embedding the interpreter (see happylang_api) catches it.
+    HappySyntaxError: reported by the parser
+    HappyCheckError: reported by the resolver or the type checker
+    HappyRuntimeError: reported while the program runs
+    HappyStackOverflow: a call going deeper than the bound of the engine
+    HappyLimitError: a limit of a Governor is reached (see happylang_governor):
+        HappyStepLimit, HappyTimeLimit, HappyAllocationLimit, HappyDepthLimit
+"""
+
+
+class HappyError(Exception):
+    """
+    Error of a happy program
+
+    Parameters
+    ----------
+    message : message printed by happy.py
+    line : line of the error in the source, None when unknown
+    """
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+
+    def __reduce__(self):
+        # sent between processes with its line
+        return (type(self), (self.message, self.line))
+
+
+class HappySyntaxError(HappyError):
+    pass
+
+
+class HappyCheckError(HappyError):
+    pass
+
+
+class HappyRuntimeError(HappyError):
+    pass
+
+
+class HappyStackOverflow(HappyRuntimeError):
+    pass
+
+
+class HappyLimitError(HappyRuntimeError):
+    pass
+
+
+class HappyStepLimit(HappyLimitError):
+    pass
+
+
+class HappyTimeLimit(HappyLimitError):
+    pass
+
+
+class HappyAllocationLimit(HappyLimitError):
+    pass
+
+
+class HappyDepthLimit(HappyLimitError):
+    pass
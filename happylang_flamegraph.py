@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Happy call stacks of a running program, written as collapsed stacks.
+
+The engines report every happy call to a CallStacks while the program runs
+with --flamegraph: enter when a function is called, leave when it returns.
+The time between two reports is charged to the current happy call stack,
+main first, each call named after the function and the line of the call:
+
+    main;quickSort:31;quickSort:30 1234
+
+one stack per line followed by its time in microseconds, the collapsed
+format read by the flame graph tools (e.g. flamegraph.pl, speedscope).
+
+A tail call (see happylang_tailcall) leaves the current call and enters
+the function called, except the first tail call of a chain whose value is
+discarded, which nests (see trace_tail_call): every engine reports the
+same stacks.
+
+The stacks are kept as a tree of calling contexts, so that a call costs
+the same at any depth.
+"""
+
+import sys
+import time
+
+from happylang_tailcall import TailCall
+
+
+class CallStacks:
+    """
+    Happy call stacks and their time
+
+    Parameters
+    ----------
+    root : name of the bottom of every stack
+    """
+    def __init__(self, root="main"):
+        # calling contexts: (parent context, name) -> context,
+        # a context being an index of names, parents and weights
+        self.contexts = {}
+        self.names = [root]
+        self.parents = [None]
+        self.weights = [0.0]
+
+        # contexts of the running calls, innermost last
+        self.stack = [0]
+        self.last = None
+
+    def start(self):
+        """
+        Start charging the time to the stacks
+        """
+        self.last = time.perf_counter()
+
+    def stop(self):
+        """
+        Charge the time up to now to the current stack
+        """
+        self.__charge()
+
+    def enter(self, name, line):
+        """
+        A call of the function name on the given line starts
+        """
+        self.__charge()
+
+        parent = self.stack[-1]
+        label = f"{name}:{line}"
+        context = self.contexts.get((parent, label))
+        if context is None:
+            context = self.contexts[(parent, label)] = len(self.names)
+            self.names.append(label)
+            self.parents.append(parent)
+            self.weights.append(0.0)
+
+        self.stack.append(context)
+
+    def leave(self):
+        """
+        The innermost call returns
+        """
+        self.__charge()
+        self.stack.pop()
+
+    def __charge(self):
+        now = time.perf_counter()
+        if self.last is not None:
+            self.weights[self.stack[-1]] += now - self.last
+
+        self.last = now
+
+    def __path(self, context):
+        names = []
+        while context is not None:
+            names.append(self.names[context])
+            context = self.parents[context]
+
+        return ";".join(reversed(names))
+
+    def collapsed(self):
+        """
+        Returns
+        -------
+        str []
+            the stacks which took at least a microsecond, with their time in microseconds
+        """
+        lines = []
+        for context, weight in enumerate(self.weights):
+            microseconds = round(weight*1e6)
+            if microseconds > 0:
+                lines.append(f"{self.__path(context)} {microseconds}")
+
+        return lines
+
+    def write(self, path):
+        """
+        Write the collapsed stacks to the given file, "-" for stdout
+        """
+        text = "".join(line + "\n" for line in self.collapsed())
+        if path == "-":
+            sys.stdout.write(text)
+            return
+
+        with open(path, "w", encoding="utf8") as f:
+            f.write(text)
+
+
+def trace_tail_call(stacks, chains, name, line, tail_call):
+    """
+    Report a tail call to stacks as the vm does (see happylang_vm.run): it
+    replaces the current call, except the first tail call of a chain whose
+    value is discarded, which nests, the call of the chain returning through it
+
+    Parameters
+    ----------
+    stacks : CallStacks
+    chains : of every running call, innermost last: a tail call of its chain nested
+    name, line : function called and line of the call
+    tail_call : TailCall of the call (see happylang_tailcall)
+    """
+    if tail_call == TailCall.STATEMENT and not chains[-1]:
+        chains[-1] = True
+    else:
+        stacks.leave()
+
+    stacks.enter(name, line)
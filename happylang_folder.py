@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Constant folder of the happy language.
+
+fold walks a resolved and type checked ParseTree (see happylang_resolver,
+happylang_typechecker), from the leaves up, and rewrites in place:
+    an operation (+, -, *, /, %, ** or the negation) of literals into the
+    literal of its value, computed as the engines compute it: a + with a
+    STRING operand concatenates the strings of the operands, e.g.
+    "a" + 1 is "a1.0"
+    the identities of a NUMBER expression x: x*1, 1*x, x-0, x/1 and x**1
+    into x
+The engines then evaluate a folded literal once, instead of its operands
+and its operation on every run.
+
+An operation whose run reports an error (a division by 0) or fails (e.g. a
+string times a number, an overflow), or whose value is neither a number
+nor a string (the complex (-8)**0.5), is left as it is: the error is
+reported when it runs, on its line. x+0 is not simplified, -0.0+0 being
+0.0, nor x**2 into x*x: x*x may differ from x**2 in the last digit, and
+gives inf where x**2 overflows. An expression whose type is not known
+before running (the value of a call, of a POP) is never simplified.
+"""
+
+from collections import namedtuple
+import sys
+
+from happylang_parser import ParseType, ParseTree
+from happylang_lexer import Token, TokenDetail
+from happylang_typechecker import NUMBER, STRING
+
+
+def fold_ADD(left, right):
+    if type(left)==str or type(right)==str:
+        return str(left) + str(right)
+
+    return left + right
+
+
+"""
+Parse types of the operations folded -> the operation, as run by the engines
+"""
+OPERATIONS = {ParseType.ADD: fold_ADD,
+              ParseType.SUB: lambda left, right: left - right,
+              ParseType.MUL: lambda left, right: left*right,
+              ParseType.DIV: lambda left, right: left/right,
+              ParseType.MOD: lambda left, right: left%right,
+              ParseType.POW: lambda left, right: left**right}
+
+"""
+Number of literals folded, of identities simplified and of nodes eliminated by fold
+"""
+Folding = namedtuple("Folding", ["folded", "simplified", "eliminated"])
+
+
+def literal(t):
+    """
+    t is a NUMBER or STRING literal
+    """
+    return t.parse_type == ParseType.ATOMIC and t.token in (Token.NUMBER, Token.STRING)
+
+
+def number_literal(t, value):
+    return t.parse_type == ParseType.ATOMIC and t.token == Token.NUMBER and t.value == value
+
+
+def make_literal(value, t):
+    """
+    Returns
+    -------
+    ParseTree(ParseType.ATOMIC) of the literal of value, at the place of t
+    """
+    if type(value) == str:
+        folded = ParseTree(ParseType.ATOMIC, TokenDetail(Token.STRING, value, value, t.line, t.col))
+        folded.expr_type = STRING
+    else:
+        folded = ParseTree(ParseType.ATOMIC, TokenDetail(Token.NUMBER, str(value), value, t.line, t.col))
+        folded.expr_type = NUMBER
+
+    return folded
+
+
+class HappyFolder:
+    """
+    Fold the constant expressions of a resolved and type checked ParseTree(ParseType.PROGRAM)
+    """
+    def __init__(self, tree):
+        self.__tree = tree
+        self.__folded = 0
+        self.__simplified = 0
+        self.__eliminated = 0
+
+    def fold(self):
+        # the children of a node are folded before it
+        stack = [(self.__tree, False)]
+        while stack:
+            t, children_folded = stack.pop()
+            if children_folded:
+                t.children = tuple(child if child is None else self.__fold(child) for child in t.children)
+                continue
+
+            stack.append((t, True))
+            stack.extend((child, False) for child in t.children if child is not None)
+
+        return Folding(self.__folded, self.__simplified, self.__eliminated)
+
+    def __fold(self, t):
+        """
+        Returns
+        -------
+        ParseTree
+            t folded or simplified, its children being folded, otherwise t
+        """
+        pt = t.parse_type
+
+        if pt == ParseType.NEG:
+            operand = t.children[0]
+            if literal(operand) and operand.token == Token.NUMBER:
+                self.__folded += 1
+                self.__eliminated += 1
+                return make_literal(-operand.value, t)
+
+            return t
+
+        if pt not in OPERATIONS:
+            return t
+
+        left, right = t.children
+        if literal(left) and literal(right):
+            try:
+                value = OPERATIONS[pt](left.value, right.value)
+            except Exception:
+                # reported when it runs
+                return t
+
+            if type(value) not in (float, str):
+                return t
+
+            self.__folded += 1
+            self.__eliminated += 2
+            return make_literal(value, t)
+
+        return self.__simplify(t, left, right)
+
+    def __simplify(self, t, left, right):
+        """
+        Returns
+        -------
+        ParseTree
+            the identity t of a NUMBER expression simplified, otherwise t
+        """
+        pt = t.parse_type
+
+        if pt == ParseType.MUL and number_literal(right, 1.0) and left.expr_type == NUMBER:
+            simplified = left
+        elif pt == ParseType.MUL and number_literal(left, 1.0) and right.expr_type == NUMBER:
+            simplified = right
+        elif pt == ParseType.SUB and number_literal(right, 0.0) and left.expr_type == NUMBER:
+            simplified = left
+        elif pt in (ParseType.DIV, ParseType.POW) and number_literal(right, 1.0) and left.expr_type == NUMBER:
+            simplified = left
+        else:
+            return t
+
+        self.__simplified += 1
+        self.__eliminated += 2
+        return simplified
+
+
+def fold(tree):
+    """
+    Fold the constant expressions of the given parse tree, and simplify its identities
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM), resolved and type checked
+
+    Returns
+    -------
+    Folding
+    """
+    return HappyFolder(tree).fold()
+
+
+def report(folding, file=sys.stderr):
+    """
+    Print the number of expressions folded and of nodes eliminated
+    """
+    print(f"{folding.folded} constant expressions folded, {folding.simplified} identities simplified, "
+          f"{folding.eliminated} nodes eliminated", file=file)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Resource governor of the happy language.
+
+A Governor bounds the resources a program may use, each limit being
+optional (None):
+    max_steps: steps run, a step being an iteration of a loop or a call
+    max_time: wall time in seconds, checked with the steps
+    max_elements: elements allocated in total: the elements of the arrays
+                  declared, the values pushed to stacks, the characters of
+                  the strings made by +
+    max_depth: depth of the nested happy calls (a tail call does not nest)
+A limit reached stops the program with a HappyLimitError (HappyStepLimit,
+HappyTimeLimit, HappyAllocationLimit, HappyDepthLimit) on its line. A
+vectorized loop (see happylang_vectorizer) runs as no step.
+
+The engines count the iterations of a loop locally, and spend them to the
+governor every CHECK_STEPS iterations and when the loop ends: a limit of
+steps or time is reported up to CHECK_STEPS iterations of a loop late. The
+time is read once every CHECK_STEPS steps. The size of an array is checked
+before it is allocated, a string after it is made.
+
+While a program runs, governed installs its governor as
+happylang_runtime.governor, the governor of the arrays and of the tree
+engine; the closure and vm engines are given theirs (see
+happylang_closure.compile_governed, happylang_vm.run).
+
+The command lines (happy.py, happylang_batch, happylang_server) take the
+limits as --max-steps, --max-time, --max-elements and --max-call-depth (see
+add_arguments).
+"""
+
+from contextlib import contextmanager
+import time
+
+import happylang_runtime
+from happylang_errors import HappyStepLimit, HappyTimeLimit, HappyAllocationLimit, HappyDepthLimit
+
+"""
+Number of steps counted between two checks of the limits of steps and time
+"""
+CHECK_STEPS = 64
+
+
+class Governor:
+    """
+    Limits of the resources of a run, and their use
+
+    Parameters
+    ----------
+    max_steps : bound of the number of steps, None for no bound
+    max_time : bound of the wall time in seconds, None for no bound
+    max_elements : bound of the number of elements allocated, None for no bound
+    max_depth : bound of the depth of the nested happy calls, None for no bound
+    """
+    def __init__(self, max_steps=None, max_time=None, max_elements=None, max_depth=None):
+        self.max_steps = max_steps
+        self.max_time = max_time
+        self.max_elements = max_elements
+        self.max_depth = max_depth
+        # max_elements, compared to the elements allocated by the engines
+        self.element_bound = float("inf") if max_elements is None else max_elements
+        self.start()
+
+    def start(self):
+        """
+        Start a run, its use of the resources being 0
+        """
+        self.steps = 0
+        self.elements = 0
+        self.depth = 0
+        self.deadline = None if self.max_time is None else time.perf_counter() + self.max_time
+        # number of steps at which the limits of steps and time are checked next
+        self.next_check = self.__checked_at()
+
+    def __checked_at(self):
+        bound = float("inf") if self.max_steps is None else self.max_steps + 1
+        if self.deadline is not None:
+            bound = min(bound, self.steps + CHECK_STEPS)
+
+        return bound
+
+    def spend(self, steps, line):
+        """
+        Count steps run by line `line`
+        """
+        self.steps += steps
+        if self.steps >= self.next_check:
+            self.check(line)
+
+    def check(self, line):
+        """
+        Report the limits of steps and time reached at line `line`
+        """
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise HappyStepLimit(f"step limit of {self.max_steps} reached on line {line}", line)
+
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise HappyTimeLimit(f"time limit of {self.max_time}s reached on line {line}", line)
+
+        self.next_check = self.__checked_at()
+
+    def enter(self, line):
+        """
+        A call of line `line` starts: a step, one level deeper
+        """
+        if self.depth == self.max_depth:
+            raise self.depth_limit(line)
+
+        self.depth += 1
+        self.spend(1, line)
+
+    def leave(self):
+        self.depth -= 1
+
+    def allocate(self, elements, line):
+        """
+        Count elements allocated by line `line`
+        """
+        self.elements += elements
+        if self.elements > self.element_bound:
+            raise self.allocation_limit(line)
+
+    def depth_limit(self, line):
+        """
+        Returns
+        -------
+        HappyDepthLimit of a call of line `line`
+        """
+        return HappyDepthLimit(f"call depth limit of {self.max_depth} reached on line {line}", line)
+
+    def allocation_limit(self, line):
+        """
+        Returns
+        -------
+        HappyAllocationLimit of an allocation of line `line`
+        """
+        return HappyAllocationLimit(f"allocation limit of {self.max_elements} elements reached on line {line}", line)
+
+    def __repr__(self):
+        limits = [f"{name}={getattr(self, name)}" for name in ("max_steps", "max_time", "max_elements", "max_depth")
+                  if getattr(self, name) is not None]
+        return f"Governor({', '.join(limits)})"
+
+
+def add_arguments(arg_parser):
+    """
+    Add the options of the limits of a Governor to an argparse.ArgumentParser
+    """
+    arg_parser.add_argument("--max-steps", type=int, default=None,
+                            help="stop a program after this many steps: loop iterations and calls")
+    arg_parser.add_argument("--max-time", type=float, default=None,
+                            help="stop a program after this many seconds")
+    arg_parser.add_argument("--max-elements", type=int, default=None,
+                            help="stop a program after it allocates this many elements: array elements, pushed values, string characters")
+    arg_parser.add_argument("--max-call-depth", type=int, default=None,
+                            help="stop a program when its happy calls nest deeper than this")
+
+
+def from_arguments(args):
+    """
+    Parameters
+    ----------
+    args : options parsed by an argparse.ArgumentParser, see add_arguments
+
+    Returns
+    -------
+    Governor of the limits given, None when no limit is given
+    """
+    limits = (args.max_steps, args.max_time, args.max_elements, args.max_call_depth)
+    if all(limit is None for limit in limits):
+        return None
+
+    return Governor(*limits)
+
+
+@contextmanager
+def governed(governor):
+    """
+    Start a run of the governor, installed as happylang_runtime.governor until the end of the block
+    """
+    governor.start()
+    previous = happylang_runtime.governor
+    happylang_runtime.governor = governor
+    try:
+        yield governor
+    finally:
+        happylang_runtime.governor = previous
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Input/output layer of the happy language.
+
+Output
+------
+The engines write the output of print/println with sys.stdout.write, one
+write per statement. While a program runs, buffered_output installs a
+HappyOutput as sys.stdout: the writes are accumulated as parts, joined and
+written to the real stdout at once when flushed. The error messages, printed
+to sys.stdout too, stay in order with the output of the program.
+
+Flush policies (OUTPUT_MODES):
+    line: flush at the end of every line
+    block: flush when the buffer holds buffer_size characters
+    unbuffered: flush every write
+The buffer is also flushed before waiting for the input and when the program
+stops, normally or on an error.
+
+Input
+-----
+The engines read the input of the input statements with read_line, one line
+per variable. When stdin is not a terminal (a pipe, a file), bulk_input
+installs a HappyInput as sys.stdin: stdin is read in blocks of block_size
+bytes, split into lines as they are read, and the prompts of the input
+statements (see prompt) are not printed unless asked for.
+"""
+
+import codecs
+import io
+import sys
+from contextlib import contextmanager
+
+OUTPUT_MODES = ("line", "block", "unbuffered")
+DEFAULT_BUFFER_SIZE = 64*1024
+DEFAULT_BLOCK_SIZE = 64*1024
+
+
+class HappyOutput:
+    """
+    Buffered text stream in front of another one
+
+    Parameters
+    ----------
+    stream : text stream written when flushed
+    mode : one of OUTPUT_MODES
+    buffer_size : number of characters buffered in block mode
+    """
+    def __init__(self, stream, mode="block", buffer_size=DEFAULT_BUFFER_SIZE):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"unknown output mode {mode}")
+
+        self.stream = stream
+        self.mode = mode
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+
+        # the write of the mode, bound once
+        self.write = {"line": self.write_line, "block": self.write_block, "unbuffered": self.write_unbuffered}[mode]
+
+    def write_block(self, s):
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+        return len(s)
+
+    def write_line(self, s):
+        self.parts.append(s)
+        if "\n" in s:
+            self.flush()
+
+        return len(s)
+
+    def write_unbuffered(self, s):
+        self.parts.append(s)
+        self.flush()
+
+        return len(s)
+
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts.clear()
+            self.size = 0
+
+        self.stream.flush()
+
+    def isatty(self):
+        return self.stream.isatty()
+
+    def fileno(self):
+        return self.stream.fileno()
+
+
+def default_output_mode(stream):
+    """
+    Returns
+    -------
+    str
+        line for a terminal, block otherwise (a pipe, a file)
+    """
+    try:
+        return "line" if stream.isatty() else "block"
+    except (AttributeError, ValueError):
+        return "block"
+
+
+@contextmanager
+def buffered_output(mode=None, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Install a HappyOutput as sys.stdout, flushed and removed at the end of the block
+
+    Parameters
+    ----------
+    mode : one of OUTPUT_MODES, None for default_output_mode
+    buffer_size : number of characters buffered in block mode
+    """
+    stdout = sys.stdout
+    output = HappyOutput(stdout, mode or default_output_mode(stdout), buffer_size)
+    sys.stdout = output
+    try:
+        yield output
+    finally:
+        sys.stdout = stdout
+        output.flush()
+
+
+class HappyInput:
+    """
+    Text stream reading another one in blocks, line by line
+
+    Parameters
+    ----------
+    stream : text stream, stdin
+    prompts : print the prompts of the input statements
+    block_size : number of bytes read at once
+    """
+    def __init__(self, stream, prompts=False, block_size=DEFAULT_BLOCK_SIZE):
+        self.stream = stream
+        self.prompts = prompts
+        self.block_size = block_size
+
+        # complete lines of the last block, lines[pos] is the next line
+        self.lines = []
+        self.pos = 0
+
+        # start of a line continued in the next block
+        self.rest = ""
+        self.eof = False
+
+        # read1 returns the bytes available, without waiting for a full block
+        buffer = getattr(stream, "buffer", None)
+        if buffer is not None and hasattr(buffer, "read1"):
+            self.buffer = buffer
+            decoder = codecs.getincrementaldecoder(getattr(stream, "encoding", None) or "utf8")()
+            self.decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+        else:
+            self.buffer = None
+
+    def __read_block(self):
+        """
+        Returns
+        -------
+        str
+            the next block of text, "" at the end of the input
+        """
+        if self.buffer is None:
+            return self.stream.read(self.block_size)
+
+        while True:
+            data = self.buffer.read1(self.block_size)
+            text = self.decoder.decode(data, final=not data)
+            if text or not data:
+                return text
+
+    def __fill(self):
+        """
+        Read blocks until a complete line or the end of the input
+        """
+        # whoever writes the input may be waiting for the output
+        sys.stdout.flush()
+
+        while True:
+            block = self.__read_block()
+            if not block:
+                self.eof = True
+                self.lines = [self.rest] if self.rest else []
+                self.pos = 0
+                self.rest = ""
+                return
+
+            lines = (self.rest + block).split("\n")
+            self.rest = lines.pop()
+            if lines:
+                self.lines = lines
+                self.pos = 0
+                return
+
+    def input(self):
+        """
+        Returns
+        -------
+        str
+            the next line, without its newline, as builtins.input
+
+        Raises
+        ------
+        EOFError at the end of the input
+        """
+        if self.pos == len(self.lines):
+            if not self.eof:
+                self.__fill()
+
+            if self.pos == len(self.lines):
+                raise EOFError("EOF when reading a line")
+
+        line = self.lines[self.pos]
+        self.pos += 1
+        return line
+
+    def readline(self):
+        try:
+            return self.input() + "\n"
+        except EOFError:
+            return ""
+
+    def isatty(self):
+        return False
+
+    def fileno(self):
+        return self.stream.fileno()
+
+
+def read_line():
+    """
+    Returns
+    -------
+    str
+        the next line of the input, from the HappyInput installed by bulk_input,
+        otherwise from builtins.input
+    """
+    stdin = sys.stdin
+    if type(stdin) is HappyInput:
+        return stdin.input()
+
+    return input()
+
+
+def prompt(text):
+    """
+    Print the prompt of an input statement, unless it is read by a HappyInput without prompts
+    """
+    stdin = sys.stdin
+    if type(stdin) is not HappyInput or stdin.prompts:
+        print(text)
+
+
+@contextmanager
+def bulk_input(prompts=False, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Install a HappyInput as sys.stdin until the end of the block, unless stdin is a terminal
+
+    Parameters
+    ----------
+    prompts : print the prompts of the input statements anyway
+    block_size : number of bytes read at once
+    """
+    stdin = sys.stdin
+    try:
+        interactive = stdin.isatty()
+    except (AttributeError, ValueError):
+        interactive = False
+
+    if interactive:
+        yield None
+        return
+
+    sys.stdin = HappyInput(stdin, prompts, block_size)
+    try:
+        yield sys.stdin
+    finally:
+        sys.stdin = stdin
@@ -49,6 +49,7 @@ To Write a Lexer
 
 from enum import Enum, auto
 import sys
+import re
 from collections import namedtuple
 
 class Token(Enum):
@@ -105,17 +106,64 @@ class Token(Enum):
     
     
 TokenDetail = namedtuple('TokenDetail', ['token', 'lexeme', 'value', 'line', 'col'])
+
+def read_source(lex_file, chunk_size = 1 << 16):
+    """
+    Read the whole stream into memory.
+    A regular file is read at once, other streams (e.g. sys.stdin) are read 
+    in chunks until the end of the stream.
+
+    Returns
+    -------
+    str
+
+    """
+    try:
+        seekable = lex_file.seekable()
+    except (AttributeError, ValueError):
+        seekable = False
+        
+    if seekable:
+        return lex_file.read()
+    
+    chunks = []
+    chunk = lex_file.read(chunk_size)
+    while chunk:
+        chunks.append(chunk)
+        chunk = lex_file.read(chunk_size)
+        
+    return "".join(chunks)
+
 class HappyLexer:
     '''
     The lexer class for the happy language. 
     Converts a text stream into a token stream
     '''
-    def __init__(self, lex_file = sys.stdin):
+    def __init__(self, lex_file = sys.stdin, buffered = True, chunk_size = 1 << 16):
+        """
+        Parameters
+        ----------
+        lex_file : text stream of the source code
+        buffered : if True, load the source into memory and scan it by index,
+                   otherwise read the stream one character at a time
+        chunk_size : number of characters per read when loading a stream 
+                     which is not a regular file (e.g. sys.stdin)
+        """
         self.__lex_file = lex_file
         self.__line = 1
         self.__col = 0
         self.__cur_char = None
         
+        # in buffered mode, self.__src holds the whole source and
+        # self.__pos is the index of the current character
+        self.__buffered = buffered
+        self.__src = ""
+        self.__src_len = 0
+        self.__pos = -1
+        if buffered:
+            self.__src = read_source(lex_file, chunk_size)
+            self.__src_len = len(self.__src)
+        
         # scan the first character
         self.__consume()
         
@@ -132,13 +180,45 @@ class HappyLexer:
         None.
 
         """
-        self.__cur_char = self.__lex_file.read(1)
+        if self.__buffered:
+            self.__pos += 1
+            self.__cur_char = self.__src[self.__pos] if self.__pos < self.__src_len else ''
+        else:
+            self.__cur_char = self.__lex_file.read(1)
         self.__col += 1
         
         if (self.__cur_char=='\n'):
             self.__line += 1
             self.__col = 0
             
+    def __advance_to(self, end):
+        """
+        Buffered mode only. 
+        Make the character at index end the current character, keeping 
+        line and col as if the characters had been consumed one by one
+
+        Parameters
+        ----------
+        end : index in the source, end >= the current index
+
+        Returns
+        -------
+        None.
+
+        """
+        src = self.__src
+        pos = self.__pos
+        
+        newlines = src.count('\n', pos+1, end+1)
+        if newlines:
+            self.__line += newlines
+            self.__col = end - src.rfind('\n', pos+1, end+1)
+        else:
+            self.__col += end - pos
+            
+        self.__pos = end
+        self.__cur_char = src[end] if end < self.__src_len else ''
+        
     def __skip_spaces_and_comments(self):
         """
         Consumes characters until we encounter non-whitespace.
@@ -162,6 +242,24 @@ class HappyLexer:
             if (self.__cur_char == '\n'):
                 self.__consume()
         """
+        if self.__buffered:
+            src = self.__src
+            n = self.__src_len
+            i = self.__pos
+            while i < n and (src[i].isspace() or src[i] == '#'):
+                if src[i] == '#':
+                    # skip the rest of the line
+                    i = src.find('\n', i)
+                    if i == -1:
+                        i = n
+                        
+                while i < n and src[i].isspace():
+                    i += 1
+                    
+            if i != self.__pos:
+                self.__advance_to(i)
+            return
+        
         while self.__cur_char.isspace() or self.__cur_char == '#':
             if self.__cur_char == '#':
                 # consume the rest of the line
@@ -305,6 +403,23 @@ class HappyLexer:
         col = self.__col
         cur_lex = ""
         
+        if self.__buffered:
+            src = self.__src
+            n = self.__src_len
+            start = i = self.__pos
+            while i < n and src[i].isdigit():
+                i += 1
+                
+            if i < n and src[i] == '.':
+                i += 1
+                while i < n and src[i].isdigit():
+                    i += 1
+                    
+            cur_lex = src[start:i]
+            self.__advance_to(i)
+            self.__token_detail = self.__create_tok(Token.NUMBER, lexeme=cur_lex, value = float(cur_lex), line=line, col=col)
+            return True
+        
         while (self.__cur_char.isdigit()):
             cur_lex += self.__cur_char
             self.__consume()
@@ -334,6 +449,21 @@ class HappyLexer:
         col = self.__col
         cur_lex = '"'
         
+        if self.__buffered:
+            start = self.__pos
+            end = self.__src.find('"', start+1)
+            if end == -1:
+                # unterminated string, runs until the end of the source
+                cur_lex = self.__src[start:]
+                self.__advance_to(self.__src_len)
+                self.__token_detail = TokenDetail(Token.INVALID, lexeme = cur_lex, value=None, line=line, col=col)
+                return True
+            
+            cur_lex = self.__src[start+1:end]
+            self.__advance_to(end+1)
+            self.__token_detail = TokenDetail(Token.STRING, lexeme = cur_lex, value=cur_lex, line=line, col=col)
+            return True
+        
         self.__consume()
         while self.__cur_char and self.__cur_char!='"':
             cur_lex += self.__cur_char
@@ -369,6 +499,16 @@ class HappyLexer:
         col = self.__col
         cur_lex = ""
         
+        if self.__buffered:
+            src = self.__src
+            n = self.__src_len
+            start = i = self.__pos
+            while i < n and (src[i].isalpha() or src[i] == '_' or src[i].isdigit()):
+                i += 1
+                
+            cur_lex = src[start:i]
+            self.__advance_to(i)
+        
         while self.__cur_char.isalpha() or self.__cur_char == '_' or self.__cur_char.isdigit():
             cur_lex += self.__cur_char
             self.__consume()
@@ -395,6 +535,10 @@ class HappyLexer:
         if not self.__cur_char:
             self.__token_detail = self.__create_tok(Token.EOF)
             return self.__token_detail 
+        elif self.__buffered and self.__lex_other():
+            # identifiers, numbers and strings share no first character
+            # with the other groups, so they can be tried first
+            return self.__token_detail
         elif self.__lex_single():
             return self.__token_detail
         elif self.__lex_multi_fixed():
@@ -419,6 +563,200 @@ class HappyLexer:
          """
          return self.__token_detail
     
+KEYWORDS = {'main' : Token.MAIN,
+            'if': Token.IF,
+            'else': Token.ELSE,
+            'for': Token.FOR,
+            'push': Token.PUSH,
+            'pop': Token.POP,
+            'len': Token.LEN, 
+            'print': Token.PRINT,
+            'println': Token.PRINTLN,
+            'input': Token.INPUT,
+            'NUMBER': Token.NUMBER_TP,
+            'STRING': Token.STRING_TP, 
+            'return': Token.RETURN}
+
+"""
+Rules of the regex engine, tried in order at each position.
+Group names which are Token names produce that token, the others are:
+    SKIP: spaces and comments
+    INCOMPLETE: a prefix of a multi-character token that cannot be completed,
+                HappyLexer consumes it and reports the next character as INVALID
+    UNTERMINATED: a string missing its closing quote
+"""
+LEXER_RULES = [
+    ('SKIP', r'(?:\s|#[^\n]*)+'),
+    
+    # group 2, longest tokens first
+    ('INCOMPLETE', r':(?!=)|&(?!&)|\|_(?!\|)'),
+    ('SWAP', r':=:'),
+    ('ASSIGN', r':='),
+    ('AND', r'&&'),
+    ('STACK', r'\|_\|'),
+    ('OR', r'\|\|'),
+    ('PIPE', r'\|'),
+    ('NE', r'<>'),
+    ('LE', r'<='),
+    ('LT', r'<'),
+    ('GE', r'>='),
+    ('GT', r'>'),
+    ('POWER', r'\*\*'),
+    ('TIMES', r'\*'),
+    
+    # group 1
+    ('LPAREN', r'\('),
+    ('RPAREN', r'\)'),
+    ('LBRACKET', r'\['),
+    ('RBRACKET', r'\]'),
+    ('LCURLY', r'\{'),
+    ('RCURLY', r'\}'),
+    ('COMMA', r','),
+    ('SEMICOLON', r';'),
+    ('DOT', r'\.'),
+    ('EQ', r'='),
+    ('PLUS', r'\+'),
+    ('MINUS', r'-'),
+    ('DIVISION', r'/'),
+    ('MOD', r'%'),
+    
+    # group 3
+    ('NUMBER', r'\d+(?:\.\d*)?'),
+    ('STRING', r'"[^"]*"'),
+    ('UNTERMINATED', r'"[\s\S]*'),
+    ('IDENTIFIER', r'[^\W\d]\w*'),
+    ('INVALID', r'[\s\S]'),
+]
+
+LEXER_PATTERN = re.compile('|'.join(f'(?P<{name}>{rule})' for name, rule in LEXER_RULES))
+
+# group names producing a fixed token
+FIXED_TOKENS = {name: Token[name] for name, rule in LEXER_RULES if name in Token.__members__ and name not in ('NUMBER', 'STRING', 'IDENTIFIER', 'INVALID')}
+
+
+class HappyRegexLexer:
+    '''
+    Lexer for the happy language producing the same token stream as HappyLexer.
+    The whole source is matched against one compiled pattern (LEXER_PATTERN)
+    instead of being scanned character by character.
+    '''
+    def __init__(self, lex_file = sys.stdin, chunk_size = 1 << 16):
+        self.__src = read_source(lex_file, chunk_size)
+        self.__tokens = self.__scan()
+        
+        # store the current token
+        self.__token_detail = TokenDetail(Token.INVALID, '', None, 0, 0)
+        
+    def __scan(self):
+        """
+        Generate the TokenDetails of the source, ending with EOF
+
+        Yields
+        ------
+        TokenDetail
+
+        """
+        src = self.__src
+        fixed = FIXED_TOKENS
+        keywords = KEYWORDS
+        
+        match = LEXER_PATTERN.match
+        n = len(src)
+        
+        line = 1
+        line_start = 0
+        pos = 0
+        while pos < n:
+            m = match(src, pos)
+            kind = m.lastgroup
+            lexeme = m.group()
+            start = pos
+            pos = m.end()
+            
+            if kind == 'SKIP':
+                newlines = lexeme.count('\n')
+                if newlines:
+                    line += newlines
+                    line_start = src.rfind('\n', 0, pos) + 1
+                continue
+            
+            col = start - line_start + 1
+            
+            if kind == 'IDENTIFIER' and not lexeme.isascii():
+                # \w accepts a few numeric characters that HappyLexer does not,
+                # so rescan with the same character tests as HappyLexer
+                pos = start
+                if src[pos].isalpha() or src[pos] == '_':
+                    pos += 1
+                    while pos < n and (src[pos].isalpha() or src[pos] == '_' or src[pos].isdigit()):
+                        pos += 1
+                else:
+                    kind = 'INVALID'
+                    pos += 1
+                lexeme = src[start:pos]
+            
+            if kind in fixed:
+                yield TokenDetail(fixed[kind], lexeme, None, line, col)
+            elif kind == 'IDENTIFIER':
+                yield TokenDetail(keywords.get(lexeme, Token.IDENTIFIER), lexeme, None, line, col)
+            elif kind == 'NUMBER':
+                yield TokenDetail(Token.NUMBER, lexeme, float(lexeme), line, col)
+            elif kind == 'STRING':
+                yield TokenDetail(Token.STRING, lexeme[1:-1], lexeme[1:-1], line, col)
+            elif kind == 'INCOMPLETE':
+                yield TokenDetail(Token.INVALID, src[pos:pos+1], None, line, col)
+            else:
+                # INVALID or UNTERMINATED
+                yield TokenDetail(Token.INVALID, lexeme, None, line, col)
+                
+            if kind == 'STRING' or kind == 'UNTERMINATED':
+                newlines = lexeme.count('\n')
+                if newlines:
+                    line += newlines
+                    line_start = src.rfind('\n', 0, pos) + 1
+                    
+        eof = TokenDetail(Token.EOF, '', None, line, len(src) - line_start + 1)
+        while True:
+            yield eof
+            
+    def next(self):
+        """
+        Advance the lexer to the next token and return that token
+
+        Returns
+        -------
+        TokenDetail.
+
+        """
+        self.__token_detail = next(self.__tokens)
+        return self.__token_detail
+    
+    def get_tok(self):
+         """
+         Return current token
+
+         Returns
+         -------
+         TokenDetail
+
+         """
+         return self.__token_detail
+     
+        
+LEXER_ENGINES = {'scan': HappyLexer,
+                 'regex': HappyRegexLexer}
+
+def make_lexer(lex_file = sys.stdin, engine = 'scan'):
+    """
+    Create a lexer of the given engine ('scan' or 'regex')
+
+    Returns
+    -------
+    HappyLexer or HappyRegexLexer
+
+    """
+    return LEXER_ENGINES[engine](lex_file)
+    
 if __name__ == '__main__':
     lex = HappyLexer()
     while lex.get_tok().token != Token.EOF:
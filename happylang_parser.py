@@ -13,7 +13,8 @@ To write a parser:
     2.) Convert each BNF rule into a mutually recursive function.
     3.) Add data structures to build the parse tree.
 """
-from happylang_lexer import HappyLexer, Token, TokenDetail
+from happylang_lexer import HappyLexer, Token, TokenDetail, make_lexer
+from happylang_errors import HappySyntaxError
 import sys
 from enum import Enum, auto
 
@@ -80,15 +81,73 @@ class ParseTree:
     Parameters
     ----------
     parse_type: The ParseType of the root of the tree
-    token_detail: TokenDetail
-    children: ParseTree[]
+    token_detail: TokenDetail, stored as the fields token, lexeme, value, line, col
+    children: ParseTree[] while parsing, a tuple once the tree is frozen
+    
+    Set by happylang_resolver:
+    slot: frame slot of the declared or referenced variable
+    decl: the VAR or PARAM tree declaring the referenced variable
+    frame_size: number of frame slots of a FUN or MAIN
+    check_declared: the referenced variable may not be declared yet when the reference runs
+    
+    Set by happylang_typechecker:
+    expr_type: ExprType of an expression, None if not known before running
+    type_checked: the runtime type checks of the tree can be skipped
+    
+    Set by happylang_tailcall:
+    tail_call: TailCall of a CALL of a function to itself in tail position
+    
+    Set by happylang_vectorizer:
+    vector_loop: VectorLoop of a LOOP which can run as NumPy operations
     """
+    __slots__ = ('parse_type', 'token', 'lexeme', 'value', 'line', 'col', 'ref_type', 'children',
+                 'slot', 'decl', 'frame_size', 'check_declared', 'expr_type', 'type_checked',
+                 'tail_call', 'vector_loop')
+    
     def __init__(self, parse_type=ParseType.PROGRAM, token_detail=None, ref_type = None):
         self.parse_type = parse_type
-        self.token_detail = token_detail
+        if token_detail is None:
+            self.token, self.lexeme, self.value, self.line, self.col = None, None, None, None, None
+        else:
+            self.token, self.lexeme, self.value, self.line, self.col = token_detail
         self.ref_type = ref_type
         self.children = []
+        
+        self.slot = None
+        self.decl = None
+        self.frame_size = None
+        self.check_declared = False
+        
+        self.expr_type = None
+        self.type_checked = False
+        
+        self.tail_call = None
+        self.vector_loop = None
 
+    @property
+    def token_detail(self):
+        if self.token is None:
+            return None
+        
+        return TokenDetail(self.token, self.lexeme, self.value, self.line, self.col)
+    
+    @token_detail.setter
+    def token_detail(self, token_detail):
+        if token_detail is None:
+            self.token, self.lexeme, self.value, self.line, self.col = None, None, None, None, None
+        else:
+            self.token, self.lexeme, self.value, self.line, self.col = token_detail
+    
+    def freeze(self):
+        """
+        Turn the children of every node of the tree into tuples,
+        once the tree is parsed
+        """
+        stack = [self]
+        while stack:
+            t = stack.pop()
+            t.children = tuple(t.children) if t.children else ()
+            stack.extend(child for child in t.children if child is not None)
         
     def print_tree(self, level=0):
         """
@@ -106,7 +165,7 @@ class ParseTree:
         # the root
         indentation = "  "*level
         if self.parse_type in [ParseType.ATOMIC, ParseType.FUN]:
-            print(indentation, self.token_detail.lexeme, sep='')
+            print(indentation, self.lexeme, sep='')
         elif self.parse_type in [ParseType.VAR, ParseType.PARAM]:
             print(indentation, self.ref_type.name, sep='')
         else:
@@ -129,7 +188,7 @@ class ParseTree:
         None.
 
         """
-        self.children = parse_trees + self.children
+        self.children[:0] = parse_trees
  
     def children_extend_right(self, parse_trees):
         """
@@ -144,7 +203,7 @@ class ParseTree:
         None.
 
         """
-        self.children =  self.children + parse_trees
+        self.children.extend(parse_trees)
         
     def children_append_left(self, parse_tree):
         """
@@ -201,7 +260,19 @@ class HappyParser:
     Match our tokens, if no match is possible, 
     print an error and stop parsing.
     """
-    def __init__(self, lexer= HappyLexer()):
+    def __init__(self, lexer=None, engine='scan'):
+        """
+        Parameters
+        ----------
+        lexer : HappyLexer or HappyRegexLexer, 
+                if None, a lexer of the given engine reading stdin is created
+        engine : 'scan' (HappyLexer) or 'regex' (HappyRegexLexer)
+        """
+        # the default lexer is created here rather than as a default argument,
+        # otherwise importing this module would start reading from stdin
+        if lexer is None:
+            lexer = make_lexer(sys.stdin, engine)
+            
         self.__lexer = lexer
         
     def __next(self):
@@ -230,8 +301,7 @@ class HappyParser:
     def __must_be(self, t):
         """
         Return true if t matches the current token.
-        Otherwise, we print an error message and
-        exit.
+        Otherwise, we raise a HappySyntaxError.
 
         Parameters
         ----------
@@ -248,12 +318,13 @@ class HappyParser:
         line = self.__cur_token_detail.line
         col = self.__cur_token_detail.col
         token = self.__cur_token_detail.token
-        print(f"Parser error at line {line}, column {col}.\nReceived token {token.name} expected {t.name}")
-        sys.exit(-1)
+        raise HappySyntaxError(f"Parser error at line {line}, column {col}.\nReceived token {token.name} expected {t.name}", line)
         
     def parse(self):
         self.__next()
-        return self.__program()
+        tree = self.__program()
+        tree.freeze()
+        return tree
         
     def __program(self):
         """
@@ -614,8 +685,7 @@ class HappyParser:
                 
             else:
                 self.__factor2()
-                self.__term2()
-                self.__expr2()
+                self.__expr2(self.__term2(child1))
             
             
         return tree
@@ -727,38 +797,32 @@ class HappyParser:
         -------
         ParseTree(ParseType.AND)
         """
-        child = self.__condition()
-        
-        tree = self.__condition_list2()
-        
-        if tree:
-            tree.insert_left_leaf(child)
-        else: 
-            tree = child
-            
-        return tree
+        return self.__condition_list2(self.__condition())
         
-    def __condition_list2(self):
+    def __condition_list2(self, left):
         """
         Pre: The next token has been consumed 
         Post: Consume the next token before leaving this function
         
+        The chain is left-associative, c1 && c2 || c3 is OR(AND(c1, c2), c3):
+        it is built while reading it, in one pass.
+        
+        Parameters
+        ----------
+        left : ParseTree, the first condition of the chain
+        
         Returns
         -------------
-        ParseTree(ParseType.AND)
+        ParseTree(ParseType.AND), left if no && or || follows
         """
-        tree = None
-        if self.__has(Token.AND) or self.__has(Token.OR):
-            tree = ParseTree(ParseType.AND, self.__lexer.get_tok()) if self.__has(Token.AND, ) else ParseTree(ParseType.OR, self.__lexer.get_tok())
+        tree = left
+        while self.__has(Token.AND) or self.__has(Token.OR):
+            root = ParseTree(ParseType.AND, self.__lexer.get_tok()) if self.__has(Token.AND, ) else ParseTree(ParseType.OR, self.__lexer.get_tok())
             
             self.__next()
             child = self.__condition()
-            tree.children_append_left(child)
-            
-            cond_list_root = self.__condition_list2()
-            if cond_list_root:
-                cond_list_root.insert_left_leaf(tree)
-                tree = cond_list_root
+            root.children_extend_right([tree, child])
+            tree = root
             
         return tree
             
@@ -897,39 +961,31 @@ class HappyParser:
         -------
         ParseTree(ParseType.ADD) or ParseTree(ParseType.SUB)
         """
-        child = self.__term()
-        tree = self.__expr2()
+        return self.__expr2(self.__term())
         
-        if tree:
-            tree.insert_left_leaf(child)
-        else:
-            tree = child
+    def __expr2(self, left):
+        """
+        The chain is left-associative, a - b + c is ADD(SUB(a, b), c):
+        it is built while reading it, in one pass.
         
-        return tree
+        Parameters
+        ----------
+        left : ParseTree, the first term of the chain
         
-    def __expr2(self):
-        """
         Returns
         -------
-        ParseTree(ParseType.ADD) or ParseTree(ParseType.SUB)
+        ParseTree(ParseType.ADD) or ParseTree(ParseType.SUB), left if no + or - follows
 
         """
-        tree = None
-        
-        if self.__has(Token.PLUS) or self.__has(Token.MINUS):
+        tree = left
+        while self.__has(Token.PLUS) or self.__has(Token.MINUS):
             parse_type = ParseType.ADD if self.__has(Token.PLUS) else ParseType.SUB
-            tree = ParseTree(parse_type, self.__lexer.get_tok())
+            root = ParseTree(parse_type, self.__lexer.get_tok())
             
             self.__next()
             child = self.__term()  
-            tree.children_append_right(child)
-
-            expr_root = self.__expr2()
-            
-            if expr_root:
-                expr_root.insert_left_leaf(tree)
-                tree = expr_root       
-            
+            root.children_extend_right([tree, child])
+            tree = root
             
         return tree
         
@@ -940,26 +996,24 @@ class HappyParser:
         ParseTree(ParseType.DIV) or ParseTree(ParseType.MUL)
 
         """
-        child = self.__factor()
-        tree = self.__term2()
-        
-        if tree:
-            tree.insert_left_leaf(child)
-        else:
-            tree = child
-            
-        return tree
+        return self.__term2(self.__factor())
         
-    def __term2(self):
+    def __term2(self, left):
         """
+        The chain is left-associative, a / b * c is MUL(DIV(a, b), c):
+        it is built while reading it, in one pass.
+        
+        Parameters
+        ----------
+        left : ParseTree, the first factor of the chain
+        
         Returns
         -------
-        ParseTree(ParseType.DIV) or ParseTree(ParseType.MUL)
+        ParseTree(ParseType.DIV) or ParseTree(ParseType.MUL), left if no *, / or % follows
 
         """
-        tree = None
-        
-        if self.__has(Token.TIMES) or self.__has(Token.DIVISION) or self.__has(Token.MOD):
+        tree = left
+        while self.__has(Token.TIMES) or self.__has(Token.DIVISION) or self.__has(Token.MOD):
             if self.__has(Token.TIMES):
                 parse_type = ParseType.MUL     
             elif self.__has(Token.DIVISION):
@@ -967,16 +1021,12 @@ class HappyParser:
             else:
                 parse_type = ParseType.MOD
                 
-            tree = ParseTree(parse_type, self.__lexer.get_tok())
+            root = ParseTree(parse_type, self.__lexer.get_tok())
             
             self.__next()
             child = self.__factor()
-            tree.children_append_right(child)
-            
-            term_root = self.__term2()
-            if term_root:
-                term_root.insert_left_leaf(tree)
-                tree = term_root
+            root.children_extend_right([tree, child])
+            tree = root
             
         return tree
 
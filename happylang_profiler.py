@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Profiler of the tree engine of the happy language.
+
+The tree engine evaluates every node with eval_parse_tree. While a program
+is profiled (see happy.run_profiled), eval_parse_tree is replaced by
+HappyProfiler.wrap of it, which counts the evaluations of every node and
+accumulates their wall time:
+    inclusive: time of the evaluations of the node, its children included
+        (a node evaluated inside itself, by a recursion, is timed once)
+    exclusive: time of the node itself, its children excluded
+The default eval_parse_tree is left as is: profiling off costs nothing.
+
+The nodes are aggregated by source line and by function, the function of a
+node being the FUN (named by its lexeme) or the main containing it. The
+calls of a function are the evaluations of its block. The program itself,
+which defines the functions then runs main, is reported as PROGRAM.
+"""
+
+import json
+import sys
+import time
+
+from happylang_parser import ParseType
+
+"""
+Name of the function of the nodes outside the functions
+"""
+PROGRAM = "<program>"
+
+
+class NodeStats:
+    """
+    Counters of a node
+
+    Parameters
+    ----------
+    tree : ParseTree
+    function : name of the function containing the node
+    """
+    __slots__ = ("tree", "function", "count", "active", "inclusive", "exclusive")
+
+    def __init__(self, tree, function):
+        self.tree = tree
+        self.function = function
+        self.count = 0
+        self.active = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+
+class HappyProfiler:
+    """
+    Per node profile of a ParseTree(ParseType.PROGRAM) run by the tree engine
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM)
+    """
+    def __init__(self, tree):
+        self.tree = tree
+        self.total = 0.0
+
+        # id of a node -> NodeStats
+        self.stats = {}
+
+        # id of a node -> name of its function
+        self.functions = {}
+
+        # id of the block of a function -> name of the function
+        self.blocks = {id(tree): PROGRAM}
+
+        for fun in tree.children:
+            name = "main" if fun.parse_type == ParseType.MAIN else fun.lexeme
+            self.blocks[id(fun.children[-1])] = name
+            self.__own(fun, name)
+
+            # the program defines the functions
+            self.functions[id(fun)] = PROGRAM
+
+    def __own(self, t, name):
+        stack = [t]
+        while stack:
+            t = stack.pop()
+            if t is None:
+                continue
+
+            self.functions[id(t)] = name
+            stack.extend(t.children)
+
+    def wrap(self, evaluate):
+        """
+        Returns
+        -------
+        function(t, env)
+            evaluate, profiled
+        """
+        stats = self.stats
+        functions = self.functions
+        clock = time.perf_counter
+
+        # time of the children of the running evaluations, innermost last
+        children_time = [0.0]
+
+        def profiled(t, env):
+            s = stats.get(id(t))
+            if s is None:
+                s = stats[id(t)] = NodeStats(t, functions.get(id(t), PROGRAM))
+
+            s.count += 1
+            s.active += 1
+            children_time.append(0.0)
+            start = clock()
+            try:
+                return evaluate(t, env)
+            finally:
+                elapsed = clock() - start
+                s.exclusive += elapsed - children_time.pop()
+                children_time[-1] += elapsed
+                s.active -= 1
+                if not s.active:
+                    s.inclusive += elapsed
+
+        return profiled
+
+    def run(self, run, *args):
+        """
+        Run the program, timing the whole run
+
+        Parameters
+        ----------
+        run : function running the program
+        args : arguments of run
+        """
+        start = time.perf_counter()
+        try:
+            run(*args)
+        finally:
+            self.total += time.perf_counter() - start
+
+    def lines(self):
+        """
+        Returns
+        -------
+        dict []
+            line, evaluations and exclusive time of the source lines, hottest first
+        """
+        lines = {}
+        for s in self.stats.values():
+            line = lines.setdefault(s.tree.line, {"line": s.tree.line, "count": 0, "exclusive": 0.0})
+            line["count"] += s.count
+            line["exclusive"] += s.exclusive
+
+        return sorted(lines.values(), key=lambda line: line["exclusive"], reverse=True)
+
+    def function_stats(self):
+        """
+        Returns
+        -------
+        dict []
+            name, calls, inclusive and exclusive time of the functions, hottest first
+        """
+        result = {}
+        for s in self.stats.values():
+            fun = result.setdefault(s.function, {"name": s.function, "calls": 0, "inclusive": 0.0, "exclusive": 0.0})
+            fun["exclusive"] += s.exclusive
+
+            if id(s.tree) in self.blocks:
+                fun["calls"] += s.count
+                fun["inclusive"] += s.inclusive
+
+        return sorted(result.values(), key=lambda fun: fun["inclusive"], reverse=True)
+
+    def nodes(self):
+        """
+        Returns
+        -------
+        dict []
+            the counters of the evaluated nodes, hottest first
+        """
+        nodes = [{"line": s.tree.line, "col": s.tree.col, "parse_type": s.tree.parse_type.name,
+                  "function": s.function, "count": s.count,
+                  "inclusive": s.inclusive, "exclusive": s.exclusive}
+                 for s in self.stats.values()]
+        return sorted(nodes, key=lambda node: node["exclusive"], reverse=True)
+
+    def to_json(self):
+        """
+        Returns
+        -------
+        dict
+            the profile, as written by write_json
+        """
+        return {"total": self.total,
+                "evaluations": sum(s.count for s in self.stats.values()),
+                "lines": self.lines(),
+                "functions": self.function_stats(),
+                "nodes": self.nodes()}
+
+    def write_json(self, path):
+        """
+        Write the profile as JSON to the given file, "-" for stdout
+        """
+        if path == "-":
+            json.dump(self.to_json(), sys.stdout, indent=2)
+            sys.stdout.write("\n")
+            return
+
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def report(self, file=sys.stderr, top=10):
+        """
+        Print the hottest lines and the functions
+
+        Parameters
+        ----------
+        file : text stream
+        top : number of lines printed
+        """
+        evaluations = sum(s.count for s in self.stats.values())
+        print(f"profile: {evaluations} evaluations in {self.total:.6f}s", file=file)
+
+        print("hottest lines:", file=file)
+        print(f"  {'line':>6} {'count':>12} {'exclusive':>12} {'%':>6}", file=file)
+        for line in self.lines()[:top]:
+            print(f"  {line['line']:>6} {line['count']:>12} {line['exclusive']:>11.6f}s"
+                  f" {self.__percent(line['exclusive']):>6.1f}", file=file)
+
+        print("functions:", file=file)
+        print(f"  {'name':<20} {'calls':>10} {'inclusive':>12} {'exclusive':>12}", file=file)
+        for fun in self.function_stats():
+            print(f"  {fun['name']:<20} {fun['calls']:>10} {fun['inclusive']:>11.6f}s"
+                  f" {fun['exclusive']:>11.6f}s", file=file)
+
+    def __percent(self, elapsed):
+        return 100*elapsed/self.total if self.total else 0.0
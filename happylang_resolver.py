@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Static name resolution for the happy language.
+
+HappyResolver walks the ParseTree produced by HappyParser once, before the
+program runs, and gives every variable and parameter of a FUN/MAIN a fixed
+slot in the frame of that function. Each reference to a variable is
+annotated with the slot and the declaring tree, so the closure and vm
+engines read a per-call list by index instead of looking up names in a RefEnv.
+
+Blocks do not open a new scope: a declaration is visible from its position
+to the end of its function, as in happy.eval_parse_tree. A variable declared
+in a branch or a loop body may not be declared when it is used after that
+block: such references are marked with ParseTree.check_declared, and the
+engines check them at runtime.
+
+Errors found here are reported before the program runs, with the messages
+of happy.eval_parse_tree:
+    Function defined twice
+    Reference declared twice
+    Undefined variable
+    ... is not a variable
+
+Slot 0 of every frame holds the return value of the function.
+"""
+
+from happylang_parser import ParseType, RefType
+from happylang_lexer import Token
+from happylang_errors import HappyCheckError
+
+RETURN_SLOT = 0
+
+
+class HappyResolver:
+    """
+    Annotate a ParseTree(ParseType.PROGRAM) with frame slots
+    (see ParseTree.slot, ParseTree.decl, ParseTree.frame_size)
+    """
+    def __init__(self, tree):
+        self.__tree = tree
+
+        # function name -> FUN tree
+        self.__functions = {}
+
+        # variable name -> declaring tree, for the function being resolved
+        self.__scope = {}
+        self.__frame_size = RETURN_SLOT + 1
+
+        # blocks which may not run (branches, loop bodies) are regions:
+        # the regions enclosing the tree being resolved, and the region of every declaration
+        self.__regions = [0]
+        self.__region_count = 1
+        self.__decl_region = {}
+
+    def resolve(self):
+        """
+        Returns
+        -------
+        dict
+            function name -> ParseTree(ParseType.FUN)
+
+        """
+        t = self.__tree
+
+        # called function will be located below the calling function, thus define the called functions first
+        for fun_tree in t.children[-1:0:-1]:
+            fun_name = fun_tree.lexeme
+            if fun_name in self.__functions:
+                raise HappyCheckError(f"Function defined twice on line {fun_tree.line}", fun_tree.line)
+
+            self.__functions[fun_name] = fun_tree
+
+        self.__function(t.children[0], [])
+        for fun_tree in t.children[1:]:
+            self.__function(fun_tree, fun_tree.children[:-1:1])
+
+        return self.__functions
+
+    def __function(self, t, params):
+        """
+        Resolve a FUN or MAIN with its parameters
+        """
+        self.__scope = {}
+        self.__frame_size = RETURN_SLOT + 1
+        self.__regions = [0]
+
+        for param in params:
+            self.__declare(param, param.children[1])
+
+        self.__walk(t.children[-1])
+        t.frame_size = self.__frame_size
+
+    def __declare(self, decl, id_tree, slot=None):
+        """
+        Give a slot (a new one by default) to the variable declared by decl
+        """
+        if slot is None:
+            slot = self.__frame_size
+            self.__frame_size += 1
+
+        decl.slot = slot
+        id_tree.slot = slot
+        id_tree.decl = decl
+
+        self.__scope[id_tree.lexeme] = decl
+        self.__decl_region[decl] = self.__regions[-1]
+
+    def __declared(self, decl):
+        """
+        Returns
+        -------
+        bool
+            True if decl has certainly run before the tree being resolved
+        """
+        return self.__decl_region[decl] in self.__regions
+
+    def __region(self, trees):
+        """
+        Resolve the given trees as a block which may not run
+        """
+        self.__regions.append(self.__region_count)
+        self.__region_count += 1
+
+        for t in trees:
+            self.__walk(t)
+
+        self.__regions.pop()
+
+    def __use(self, t):
+        """
+        Annotate a reference to a variable
+        """
+        identifier = t.lexeme
+        decl = self.__scope.get(identifier)
+
+        if decl is None:
+            if identifier in self.__functions:
+                raise HappyCheckError(f"{identifier} is not a variable, on line {t.line}", t.line)
+            raise HappyCheckError(f"Undefined variable {identifier} on line {t.line}", t.line)
+
+        t.slot = decl.slot
+        t.decl = decl
+        t.check_declared = not self.__declared(decl)
+
+    def __walk(self, t):
+        """
+        Resolve the references of t, in the order they are evaluated
+        """
+        if t is None:
+            return
+
+        pt = t.parse_type
+
+        if pt == ParseType.VAR:
+            var_name = t.children[1].lexeme
+            decl = self.__scope.get(var_name)
+            if var_name in self.__functions or (decl is not None and self.__declared(decl)):
+                raise HappyCheckError(f"Reference declared twice on line {t.line}", t.line)
+
+            if t.ref_type == RefType.ARRAY:
+                # array length
+                self.__walk(t.children[-1])
+
+            # a declaration which may not have run shares its slot with the new one,
+            # declaring both is reported at runtime
+            self.__declare(t, t.children[1], None if decl is None else decl.slot)
+
+        elif pt == ParseType.ATOMIC:
+            if t.token == Token.IDENTIFIER:
+                self.__use(t)
+
+        elif pt == ParseType.INDEXING:
+            self.__use(t.children[0])
+            t.slot = t.children[0].slot
+            t.decl = t.children[0].decl
+            self.__walk(t.children[1])
+
+        elif pt == ParseType.CALL:
+            # a variable hides the function of the same name
+            fun_leaf = t.children[0]
+            decl = self.__scope.get(fun_leaf.lexeme)
+            if decl is not None:
+                fun_leaf.slot = decl.slot
+                fun_leaf.decl = decl
+
+            for arg in t.children[1:]:
+                self.__walk(arg)
+
+        elif pt == ParseType.PUSH or pt == ParseType.POP:
+            # the stack is only looked up, even when written as an INDEXING
+            self.__use(t.children[0])
+            for child in t.children[1:]:
+                self.__walk(child)
+
+        elif pt == ParseType.IF:
+            self.__walk(t.children[0])
+            self.__region(t.children[1:2])
+
+        elif pt == ParseType.IFELSE:
+            self.__walk(t.children[0])
+            self.__region(t.children[1:2])
+            self.__region(t.children[2:3])
+
+        elif pt == ParseType.LOOP:
+            condition_idx = 0
+            for i in range(len(t.children)):
+                if t.children[i].parse_type in [ParseType.AND, ParseType.OR, ParseType.LT, ParseType.LE, ParseType.GT, ParseType.GE, ParseType.NE, ParseType.EQ]:
+                    condition_idx = i
+                    break
+
+            # start loop assignments, condition, then block and loop assignments which may not run
+            for child in t.children[:condition_idx+1]:
+                self.__walk(child)
+            self.__region([t.children[-1], *t.children[condition_idx+1:-1]])
+
+        else:
+            for child in t.children:
+                self.__walk(child)
+
+
+def resolve(tree):
+    """
+    Resolve the names of the given parse tree
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM)
+
+    Returns
+    -------
+    dict
+        function name -> ParseTree(ParseType.FUN)
+
+    """
+    return HappyResolver(tree).resolve()
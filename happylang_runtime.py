@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Runtime structures shared by the execution engines of the happy language:
+the references and reference environments created while running a program.
+"""
+
+from happylang_parser import RefType
+from collections import ChainMap
+from array import array
+from happylang_errors import HappyStackOverflow, HappyRuntimeError
+from happylang_io import read_line
+
+"""
+Default bound of the depth of happy calls (see happylang_vm)
+"""
+DEFAULT_MAX_DEPTH = 100000
+
+"""
+Governor of the running program (see happylang_governor), None when it is not governed
+"""
+governor = None
+
+"""
+Outer reference  environments consist of functions
+Inner reference environments consist of variables, stacks, and arrays
+"""
+
+
+class Ref:
+    def __init__(self, ref_type, ref_tree, val=None):
+        """        
+
+        Parameters
+        ----------
+        ref_type : RefType
+        ref_tree: Parse Tree
+        val : Value of the reference
+
+        """
+        self.ref_type = ref_type
+        self.ref_tree = ref_tree
+        self.val = val
+
+
+class SlotRef:
+    """
+    Ref of a primitive variable whose value is stored in a frame slot
+    (see happylang_resolver), for the statements written against Ref
+    """
+    def __init__(self, frame, slot, ref_tree):
+        """
+
+        Parameters
+        ----------
+        frame : list, frame of the running FUN/MAIN
+        slot : slot of the variable
+        ref_tree: Parse Tree
+
+        """
+        self.ref_type = RefType.PRIMITIVE
+        self.ref_tree = ref_tree
+        self.frame = frame
+        self.slot = slot
+
+    @property
+    def val(self):
+        return self.frame[self.slot]
+
+    @val.setter
+    def val(self, val):
+        self.frame[self.slot] = val
+
+
+class RefEnv:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.table = ChainMap()
+
+        if parent:
+            self.table = ChainMap(self.table, parent.table)
+            
+        self.return_val = None
+        
+        # a return ran: the enclosing blocks and loops stop
+        self.returned = False
+
+        # env of a tail call run in place of this call (see happylang_tailcall),
+        # and whether its value is discarded
+        self.tail_env = None
+        self.tail_discard = False
+
+    def lookup(self, ref_name):
+        """
+        Looks up the value of the reference from the env, from the inner most to the outer most
+
+        Parameters
+        ----------
+        r : Ref name
+
+        Returns
+        -------
+        ParseTree
+
+        """
+
+        if ref_name in self.table:
+            return self.table[ref_name]
+
+        return None
+
+    def insert(self, ref_name, ref):
+        """
+        Insert the reference into the inner most env
+
+        Parameters
+        ----------
+        ref_name: the string name of the reference
+        ref: Ref
+        """
+        self.table[ref_name] = ref
+
+
+def default_number():
+    return float(0)
+
+
+"""
+Zeroed element of a NUMBER array
+"""
+ZERO_DOUBLE = array('d', [0.0])
+
+
+def new_array(t, length):
+    """
+    Parameters
+    ----------
+    t : ParseTree(ParseType.VAR) of an ARRAY
+    length : number of elements
+
+    Returns
+    -------
+    array('d') or list
+        the elements of a NUMBER array as contiguous doubles, those of a STRING
+        array as a list; both are initialized with 0.0
+    """
+    if governor is not None:
+        governor.allocate(max(0, int(length)), t.line)
+
+    if t.children[0].lexeme == "NUMBER":
+        return ZERO_DOUBLE*int(length)
+
+    return [default_number()]*int(length)
+
+
+def stack_overflow(line):
+    """
+    Report a call of line `line` going deeper than the bound of the engine
+    """
+    raise HappyStackOverflow(f"stack overflow on line {line}", line)
+
+
+def read_input(ref_tree, line):
+    """
+    Read the value of a variable from the input, for the input statement of line `line`
+
+    Parameters
+    ----------
+    ref_tree : VAR or PARAM parse tree declaring the variable
+
+    Returns
+    -------
+    float for a NUMBER variable, otherwise str
+
+    Raises
+    ------
+    HappyRuntimeError when the input is over, or is not a number for a NUMBER variable
+    """
+    try:
+        input_val = read_line()
+    except EOFError:
+        raise HappyRuntimeError(f"No input left to read on line {line}", line) from None
+
+    if ref_tree.children[0].lexeme=="NUMBER":
+        try:
+            return float(input_val)
+        except ValueError:
+            raise HappyRuntimeError(f"Expect a NUMBER as input on line {line}, but received {input_val!r}", line) from None
+
+    return input_val
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+"""
+Execution service of the happy language.
+
+HappyServer accepts happy programs over a Unix domain socket or a localhost
+TCP port, and runs them on a pool of worker processes, each keeping an
+Interpreter (see happylang_api): the event loop only moves messages, it
+never runs a program.
+
+Protocol
+--------
+Messages are JSON objects, one per line, in both directions. A client sends
+    {"id": 1, "source": "main(){ ... }", "stdin": "..."}   to run a program (stdin is optional)
+    {"cancel": 1}                                          to cancel a request
+and receives for every request, in order
+    {"id": 1, "output": "..."}                             the output of the program, as it is printed
+    {"id": 1, "status": "ok"}                              then how the request ended
+The statuses (STATUSES):
+    ok: the program ran to its end
+    error: the program stopped on a HappyError, with "error" (its message), "kind" and "line"
+    timeout: the program ran longer than the timeout of the server, stopped
+    cancelled: the request was cancelled
+    crash: the interpreter failed, with "error"
+    invalid: the request is not valid, with "error"
+The requests of a connection run concurrently, their messages interleave.
+An id is a string, a number or null (see valid_id); a message of another id
+or cancelling another id is answered {"id": null, "status": "invalid", ...}.
+
+A program being cancelled or timing out has its worker process killed and
+replaced. Backpressure: a connection has at most max_pending requests
+running or waiting for a worker. A request read while max_pending run is
+held until one of them ends, the messages following it being read and the
+cancels run meanwhile; the server reads past a second such request only
+once the first is started. The output of a request is read from its worker
+only as fast as the client reads it.
+
+The limits of happylang_governor (--max-steps, --max-time, --max-elements,
+--max-call-depth) stop a program with the error status, its kind being the
+HappyLimitError reached; the worker is kept.
+
+usage: python happylang_server.py (--unix PATH | --port PORT) [-j WORKERS] [--engine ENGINE] [--timeout SECONDS] [--max-pending N] [LIMITS]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import traceback
+
+from happylang_api import Interpreter
+from happylang_errors import HappyError
+from happylang_runtime import DEFAULT_MAX_DEPTH
+import happylang_governor
+from happy import ENGINES
+
+STATUSES = ("ok", "error", "timeout", "cancelled", "crash", "invalid")
+
+"""
+Bound of the requests of a connection running or waiting for a worker
+"""
+DEFAULT_MAX_PENDING = 16
+
+"""
+Bound of the size of a message in bytes
+"""
+MESSAGE_LIMIT = 64*1024*1024
+
+
+def valid_id(request_id):
+    """
+    The id of a request (or of a cancel) is a string, a number or null
+    """
+    return request_id is None or isinstance(request_id, (str, int, float))
+
+
+class PipeOutput:
+    """
+    Text stream sending what is written to the server, as the output of the running request
+
+    Parameters
+    ----------
+    conn : multiprocessing Connection of the worker to the server
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+    def write(self, s):
+        self.conn.send(("output", s))
+        return len(s)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def serve_worker(conn, engine, max_depth, governor=None):
+    """
+    Main function of a worker process: run the programs received from conn, one after the other,
+    until None is received
+    """
+    interpreter = Interpreter(engine, max_depth=max_depth, governor=governor)
+    output = PipeOutput(conn)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+
+        if request is None:
+            return
+
+        source, stdin = request
+        try:
+            interpreter.run(source, stdin, output, output_mode="line")
+            conn.send(("ok", {}))
+        except HappyError as e:
+            conn.send(("error", {"error": e.message, "kind": type(e).__name__, "line": e.line}))
+        except Exception:
+            conn.send(("crash", {"error": traceback.format_exc(limit=-1).strip()}))
+
+
+class Worker:
+    """
+    Worker process and the server end of its pipe
+    """
+    def __init__(self, context, engine, max_depth, governor=None):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=serve_worker, args=(child_conn, engine, max_depth, governor), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+
+class HappyServer:
+    """
+    Runs happy programs on a pool of worker processes
+
+    Parameters
+    ----------
+    workers : number of worker processes, None for the number of cores
+    engine : one of happy.ENGINES
+    max_depth : bound of the number of nested happy calls on the vm engine
+    timeout : bound of the wall time of a request in seconds, None for no bound
+    max_pending : bound of the requests of a connection running or waiting for a worker
+    governor : Governor bounding every request (see happylang_governor), None
+    """
+    def __init__(self, workers=None, engine="tree", max_depth=DEFAULT_MAX_DEPTH, timeout=None,
+                 max_pending=DEFAULT_MAX_PENDING, governor=None):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine}")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.engine = engine
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.governor = governor
+
+        self.__context = multiprocessing.get_context("spawn")
+        self.__idle = None
+        self.__all = set()
+        # the blocking pipe operations, a worker using one thread at a time
+        self.__threads = ThreadPoolExecutor(2*self.workers)
+
+    def __new_worker(self):
+        worker = Worker(self.__context, self.engine, self.max_depth, self.governor)
+        self.__all.add(worker)
+        return worker
+
+    def __kill(self, worker):
+        self.__all.discard(worker)
+        worker.kill()
+
+    def start(self):
+        """
+        Start the worker processes, in the running event loop
+        """
+        self.__idle = asyncio.Queue()
+        for _ in range(self.workers):
+            self.__idle.put_nowait(self.__new_worker())
+
+    def close(self):
+        for worker in list(self.__all):
+            self.__kill(worker)
+        self.__threads.shutdown(wait=False)
+
+    async def run(self, source, stdin, on_output):
+        """
+        Run a program on a worker
+
+        Parameters
+        ----------
+        source : str, source of the program
+        stdin : str, input of the program
+        on_output : async function(str), called with the output of the program as it is printed
+
+        Returns
+        -------
+        dict
+            the status of the request and its details (see STATUSES)
+        """
+        loop = asyncio.get_running_loop()
+        worker = await self.__idle.get()
+        try:
+            await loop.run_in_executor(self.__threads, worker.conn.send, (source, stdin))
+            while True:
+                kind, details = await loop.run_in_executor(self.__threads, worker.conn.recv)
+                if kind != "output":
+                    break
+                await on_output(details)
+        except (EOFError, OSError):
+            # the worker died
+            self.__kill(worker)
+            self.__idle.put_nowait(self.__new_worker())
+            return {"status": "crash", "error": "the worker process stopped"}
+        except BaseException:
+            # cancelled while the worker runs: it is replaced
+            self.__kill(worker)
+            self.__idle.put_nowait(self.__new_worker())
+            raise
+
+        self.__idle.put_nowait(worker)
+        return dict(status=kind, **details)
+
+    async def __request(self, message, send):
+        """
+        Run the request of a client, sending its output and its status
+        """
+        request_id = message.get("id")
+
+        async def on_output(s):
+            await send({"id": request_id, "output": s})
+
+        source = message.get("source")
+        stdin = message.get("stdin", "")
+        if not isinstance(source, str) or not isinstance(stdin, str):
+            await send({"id": request_id, "status": "invalid", "error": "source and stdin must be strings"})
+            return
+
+        try:
+            status = await asyncio.wait_for(self.run(source, stdin, on_output), self.timeout)
+        except asyncio.TimeoutError:
+            status = {"status": "timeout"}
+        except asyncio.CancelledError:
+            status = {"status": "cancelled"}
+
+        await send(dict(id=request_id, **status))
+
+    async def handle(self, reader, writer):
+        """
+        Serve the requests of a connection
+        """
+        lock = asyncio.Lock()
+        pending = asyncio.Semaphore(self.max_pending)
+        requests = {}
+
+        async def send(message):
+            async with lock:
+                writer.write((json.dumps(message) + "\n").encode("utf8"))
+                await writer.drain()
+
+        def done(request_id, task):
+            if requests.get(request_id) is task:
+                del requests[request_id]
+            pending.release()
+
+        def start(message):
+            request_id = message.get("id")
+            task = asyncio.create_task(self.__request(message, send))
+            requests[request_id] = task
+            task.add_done_callback(lambda task, request_id=request_id: done(request_id, task))
+
+        # a request read while max_pending requests run, and the acquiring of its slot:
+        # the messages are read meanwhile, so that the running requests can be cancelled
+        held = None
+        slot = None
+        read = None
+        try:
+            while True:
+                if read is None:
+                    read = asyncio.ensure_future(reader.readline())
+                if held is not None:
+                    await asyncio.wait({read, slot}, return_when=asyncio.FIRST_COMPLETED)
+                    if slot.done():
+                        start(held)
+                        held = slot = None
+                        continue
+
+                line = await read
+                read = None
+                if not line:
+                    break
+
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError()
+                except ValueError:
+                    await send({"id": None, "status": "invalid", "error": "a message is a JSON object"})
+                    continue
+
+                request_id = message["cancel"] if "cancel" in message else message.get("id")
+                if not valid_id(request_id):
+                    await send({"id": None, "status": "invalid", "error": "an id is a string, a number or null"})
+                    continue
+
+                if "cancel" in message:
+                    task = requests.get(request_id)
+                    if task is not None:
+                        task.cancel()
+                    elif held is not None and held.get("id") == request_id:
+                        if slot.done():
+                            pending.release()
+                        else:
+                            slot.cancel()
+                        held = slot = None
+                        await send({"id": request_id, "status": "cancelled"})
+                    continue
+
+                if held is not None:
+                    # backpressure: a second request waits, the messages are read once the first runs
+                    await slot
+                    start(held)
+                    held = slot = None
+
+                if pending.locked():
+                    held = message
+                    slot = asyncio.ensure_future(pending.acquire())
+                    continue
+
+                await pending.acquire()
+                start(message)
+
+            if held is not None:
+                await slot
+                start(held)
+                held = slot = None
+
+            # the client sent everything, its requests end
+            await asyncio.gather(*requests.values(), return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            for task in [read, slot, *requests.values()]:
+                if task is not None:
+                    task.cancel()
+            writer.close()
+
+    async def serve(self, unix=None, host="127.0.0.1", port=None):
+        """
+        Serve the connections of a Unix domain socket, otherwise of a TCP port, until cancelled
+        """
+        self.start()
+        try:
+            if unix is not None:
+                server = await asyncio.start_unix_server(self.handle, unix, limit=MESSAGE_LIMIT)
+            else:
+                server = await asyncio.start_server(self.handle, host, port, limit=MESSAGE_LIMIT)
+
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+
+class HappyClient:
+    """
+    Client of a HappyServer, over one connection (see connect)
+    """
+    def __init__(self, reader, writer):
+        self.__reader = reader
+        self.__writer = writer
+        self.__next_id = 0
+        # request id -> (on_output, output parts, future of the status)
+        self.__requests = {}
+        self.__receiver = asyncio.create_task(self.__receive())
+
+    async def __send(self, message):
+        self.__writer.write((json.dumps(message) + "\n").encode("utf8"))
+        await self.__writer.drain()
+
+    async def __receive(self):
+        error = ConnectionError("connection closed by the server")
+        try:
+            while True:
+                line = await self.__reader.readline()
+                if not line:
+                    break
+
+                message = json.loads(line)
+                request = self.__requests.get(message.get("id"))
+                if request is None:
+                    continue
+
+                on_output, parts, future = request
+                if "status" not in message:
+                    if on_output is None:
+                        parts.append(message["output"])
+                    else:
+                        on_output(message["output"])
+                    continue
+
+                del self.__requests[message["id"]]
+                if on_output is None:
+                    message["output"] = "".join(parts)
+                if not future.done():
+                    future.set_result(message)
+        except (ConnectionError, ValueError) as e:
+            error = e
+        finally:
+            for _, _, future in self.__requests.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.__requests.clear()
+
+    async def run(self, source, stdin="", on_output=None):
+        """
+        Run a program on the server; cancelling the task running it cancels the request
+
+        Parameters
+        ----------
+        source : str, source of the program
+        stdin : str, input of the program
+        on_output : function(str) called with the output as it is received, None to return it with the status
+
+        Returns
+        -------
+        dict
+            the status message of the request (see STATUSES), with the output of the program when on_output is None
+        """
+        request_id = self.__next_id
+        self.__next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.__requests[request_id] = (on_output, [], future)
+        await self.__send({"id": request_id, "source": source, "stdin": stdin})
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await self.__send({"cancel": request_id})
+            raise
+
+    async def close(self):
+        self.__writer.close()
+        await self.__writer.wait_closed()
+        await self.__receiver
+
+
+async def connect(unix=None, host="127.0.0.1", port=None):
+    """
+    Returns
+    -------
+    HappyClient
+        connected to the server of a Unix domain socket, otherwise of a TCP port
+    """
+    if unix is not None:
+        reader, writer = await asyncio.open_unix_connection(unix, limit=MESSAGE_LIMIT)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=MESSAGE_LIMIT)
+
+    return HappyClient(reader, writer)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run happy programs sent over a socket")
+    address = arg_parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--unix", metavar="PATH", help="path of the Unix domain socket")
+    address.add_argument("--port", type=int, help="TCP port, on --host")
+    arg_parser.add_argument("--host", default="127.0.0.1", help="address of the TCP port (default: %(default)s)")
+    arg_parser.add_argument("-j", "--workers", type=int, default=None,
+                            help="number of worker processes (default: the number of cores)")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES), default="tree",
+                            help="execution engine (default: tree)")
+    arg_parser.add_argument("--max-depth", type=int, default=DEFAULT_MAX_DEPTH,
+                            help="bound of the number of nested happy calls on the vm engine (default: %(default)s)")
+    arg_parser.add_argument("--timeout", type=float, default=None, help="bound of the wall time of a request in seconds")
+    arg_parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                            help="bound of the requests of a connection running or waiting (default: %(default)s)")
+    happylang_governor.add_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    happy_server = HappyServer(args.workers, args.engine, args.max_depth, args.timeout, args.max_pending,
+                               happylang_governor.from_arguments(args))
+    try:
+        asyncio.run(happy_server.serve(args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tail calls of the happy language.
+
+mark_tail_calls finds, in a resolved parse tree, the calls of a function to
+itself in tail position:
+    return f(...)   anywhere in the block of f
+    f(...)          as the last statement of the block of f, or of the
+                    blocks of an if (else) ending it
+and marks them with ParseTree.tail_call. The engines run such a call in
+place of the running one, instead of nesting it: a tail-recursive function
+runs in constant memory, without reaching the Python recursion limit or
+--max-depth.
+
+The value of a call in tail position as a statement is discarded: the
+function then returns nothing, as if the call had been nested.
+"""
+
+from enum import Enum, auto
+
+from happylang_parser import ParseType
+
+
+class TailCall(Enum):
+    RETURN = auto()     # return f(...)
+    STATEMENT = auto()  # f(...) as the last statement run by f
+
+
+def self_call(t, fun):
+    """
+    t is a call of fun to itself, with its number of parameters
+    """
+    return (t is not None and t.parse_type == ParseType.CALL
+            and t.children[0].lexeme == fun.lexeme and t.children[0].decl is None
+            and len(t.children) == len(fun.children))
+
+
+def mark_tail_calls(tree):
+    """
+    Mark the calls in tail position of the given program
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+
+    Returns
+    -------
+    ParseTree(ParseType.CALL) []
+        the calls marked
+    """
+    marked = []
+
+    # a function defined twice is reported when the program runs
+    names = [fun.lexeme for fun in tree.children[1:]]
+    for fun in tree.children[1:]:
+        if names.count(fun.lexeme) > 1:
+            continue
+
+        block = fun.children[-1]
+        stack = [block]
+        while stack:
+            t = stack.pop()
+            if t is None:
+                continue
+
+            if t.parse_type == ParseType.RETURN and self_call(t.children[0], fun):
+                t.children[0].tail_call = TailCall.RETURN
+                marked.append(t.children[0])
+
+            stack.extend(t.children)
+
+        # the last statement of the block, or of the blocks of an if ending it
+        blocks = [block]
+        while blocks:
+            children = blocks.pop().children
+            last = children[-1] if children else None
+            if last is None:
+                continue
+
+            if self_call(last, fun):
+                last.tail_call = TailCall.STATEMENT
+                marked.append(last)
+            elif last.parse_type == ParseType.IF:
+                blocks.append(last.children[1])
+            elif last.parse_type == ParseType.IFELSE:
+                blocks.extend(last.children[1:])
+
+    return marked
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Static type checker for the happy language.
+
+HappyTypeChecker walks a resolved ParseTree (see happylang_resolver) once,
+before the program runs. It infers the type of every expression from the
+declarations of the variables and the literals, and reports the type errors
+which would certainly happen at runtime, with the messages of
+happy.eval_parse_tree:
+    Unmatched type when do the assignment
+    Unmatched data type when do the swap
+    On line ..., stack is of type ...
+    Data Type not matched ... Expect ..., but received ...
+    Indexing only applies to ARRAY or STACK or STRING
+    len() expects argument of type ARRAY or STACK or STRING
+
+An ASSIGN, SWAP, PUSH, CALL or ADD whose operand types are all known is
+marked with ParseTree.type_checked: the engines then skip its runtime type
+checks (bounds and division by 0 are still checked at runtime).
+
+Types which are not known before running (None):
+    the value returned by a CALL (a function may not return)
+    the elements of STRING arrays (initialized with 0.0) and of stacks
+    POP, POW (may not be a NUMBER), conditions
+"""
+
+from happylang_parser import ParseType, RefType
+from happylang_lexer import Token
+from happylang_errors import HappyCheckError
+from collections import namedtuple
+
+
+"""
+data_type: "NUMBER", "STRING", or "INTEGER" for the value of len()
+ref_type: RefType, PRIMITIVE for values, ARRAY or STACK for the Ref of a variable
+"""
+ExprType = namedtuple('ExprType', ['data_type', 'ref_type'])
+
+NUMBER = ExprType("NUMBER", RefType.PRIMITIVE)
+STRING = ExprType("STRING", RefType.PRIMITIVE)
+INTEGER = ExprType("INTEGER", RefType.PRIMITIVE)
+
+"""
+Parse types of arithmetic on numbers, the result is a NUMBER unless both operands are INTEGER
+"""
+ARITHMETIC = {ParseType.SUB, ParseType.MUL, ParseType.MOD}
+
+
+def declared_type(decl):
+    """
+    Returns
+    -------
+    ExprType
+        type of the variable declared by the VAR or PARAM tree
+
+    """
+    return ExprType(decl.children[0].lexeme, decl.ref_type)
+
+
+class HappyTypeChecker:
+    """
+    Annotate a resolved ParseTree(ParseType.PROGRAM) with the types of its
+    expressions (see ParseTree.expr_type, ParseTree.type_checked)
+    """
+    def __init__(self, tree):
+        self.__tree = tree
+
+        # function name -> FUN tree
+        self.__functions = {fun_tree.lexeme: fun_tree for fun_tree in tree.children[1:]}
+
+    def check(self):
+        t = self.__tree
+
+        self.__walk(t.children[0])
+        for fun_tree in t.children[1:]:
+            self.__walk(fun_tree.children[-1])
+
+    def __error(self, message, line):
+        raise HappyCheckError(message, line)
+
+    def __element_type(self, t):
+        """
+        Returns
+        -------
+        ExprType or None
+            type of the value of a reference (ATOMIC or INDEXING) when assigned
+
+        """
+        decl = t.decl
+        if t.parse_type == ParseType.INDEXING:
+            if decl.ref_type == RefType.ARRAY and decl.children[0].lexeme == "NUMBER":
+                return NUMBER
+
+            return None
+
+        if decl.ref_type == RefType.PRIMITIVE:
+            return declared_type(decl)
+
+        # an array or a stack as a whole
+        return None
+
+    def __walk_ref(self, t):
+        """
+        Check the index of a reference which is assigned, pushed to or popped from
+        """
+        if t.parse_type == ParseType.INDEXING:
+            self.__walk(t.children[1])
+
+    def __walk(self, t):
+        """
+        Check t and the trees below it
+
+        Returns
+        -------
+        ExprType or None
+            type of the expression t
+        """
+        if t is None:
+            return None
+
+        pt = t.parse_type
+        expr_type = None
+
+        if pt == ParseType.ATOMIC:
+            if t.token == Token.NUMBER:
+                expr_type = NUMBER
+            elif t.token == Token.STRING:
+                expr_type = STRING
+            else:
+                expr_type = declared_type(t.decl)
+
+        elif pt == ParseType.ADD:
+            left = self.__walk(t.children[0])
+            right = self.__walk(t.children[1])
+
+            if left == STRING or right == STRING:
+                expr_type = STRING
+            elif left in (NUMBER, INTEGER) and right in (NUMBER, INTEGER):
+                expr_type = INTEGER if left == right == INTEGER else NUMBER
+
+            t.type_checked = expr_type is not None
+
+        elif pt in ARITHMETIC or pt == ParseType.DIV:
+            left = self.__walk(t.children[0])
+            right = self.__walk(t.children[1])
+
+            if left in (NUMBER, INTEGER) and right in (NUMBER, INTEGER):
+                expr_type = INTEGER if left == right == INTEGER and pt != ParseType.DIV else NUMBER
+
+        elif pt == ParseType.NEG:
+            operand = self.__walk(t.children[0])
+            if operand in (NUMBER, INTEGER):
+                expr_type = operand
+
+        elif pt == ParseType.INDEXING:
+            self.__walk(t.children[1])
+
+            decl = t.decl
+            if decl.ref_type == RefType.PRIMITIVE:
+                if declared_type(decl) == STRING:
+                    expr_type = STRING
+                else:
+                    self.__error(f"Indexing only applies to ARRAY or STACK or STRING, on line {t.line}", t.line)
+            elif decl.ref_type == RefType.ARRAY and decl.children[0].lexeme == "NUMBER":
+                expr_type = NUMBER
+
+        elif pt == ParseType.LEN:
+            if declared_type(t.children[0].decl) == NUMBER:
+                self.__error(f"len() expects argument of type ARRAY or STACK or STRING on line {t.line}", t.line)
+
+            expr_type = INTEGER
+
+        elif pt == ParseType.ASSIGN:
+            target = self.__element_type(t.children[0])
+            self.__walk_ref(t.children[0])
+            val = self.__walk(t.children[1])
+
+            if target is not None and val is not None:
+                if target != val:
+                    self.__error(f"Unmatched type when do the assignment on line {t.line}", t.line)
+
+                t.type_checked = True
+
+        elif pt == ParseType.SWAP:
+            left = self.__element_type(t.children[0])
+            right = self.__element_type(t.children[1])
+            self.__walk_ref(t.children[0])
+            self.__walk_ref(t.children[1])
+
+            if left is not None and right is not None:
+                if left != right:
+                    self.__error(f"Unmatched data type when do the swap on line {t.line}", t.line)
+
+                t.type_checked = True
+
+        elif pt == ParseType.PUSH:
+            expr_type = self.__walk(t.children[1])
+
+            decl = t.children[0].decl
+            if decl.ref_type == RefType.STACK and expr_type is not None:
+                stack_data_type = decl.children[0].lexeme
+                if (expr_type == STRING and stack_data_type!="STRING") or (expr_type == NUMBER and stack_data_type!="NUMBER"):
+                    self.__error(f"On line {t.line}, stack is of type {stack_data_type}, but the pushed value is not a {stack_data_type}", t.line)
+
+                t.type_checked = True
+
+        elif pt == ParseType.CALL:
+            self.__call(t)
+
+        elif pt == ParseType.INPUT:
+            for ref in t.children:
+                self.__walk_ref(ref)
+
+        elif pt == ParseType.POP:
+            pass
+
+        elif pt == ParseType.VAR:
+            if t.ref_type == RefType.ARRAY:
+                # array length
+                self.__walk(t.children[-1])
+
+        else:
+            for child in t.children:
+                self.__walk(child)
+
+        t.expr_type = expr_type
+        return expr_type
+
+    def __call(self, t):
+        arg_types = [self.__walk(arg) for arg in t.children[1:]]
+
+        fun_tree = self.__functions.get(t.children[0].lexeme)
+        if t.children[0].decl is not None or fun_tree is None or len(arg_types) != len(fun_tree.children)-1:
+            # reported at runtime
+            return
+
+        checked = True
+        for param, arg_type in zip(fun_tree.children[:-1:1], arg_types):
+            # len() is not an argument the runtime can check
+            if arg_type is None or arg_type == INTEGER:
+                checked = False
+                continue
+
+            param_type = declared_type(param)
+            if param_type != arg_type:
+                self.__error(
+                    f"Data Type not matched on line {t.line}, column {param.children[1].col}.\nExpect {param_type.data_type+' '+param_type.ref_type.name}, but received {arg_type.data_type+' '+arg_type.ref_type.name}", t.line)
+
+        t.type_checked = checked
+
+
+def type_check(tree):
+    """
+    Check the types of the given parse tree
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM), resolved by happylang_resolver
+
+    """
+    HappyTypeChecker(tree).check()
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorizer of element-wise loops for the happy language.
+
+vectorize walks a resolved and type checked ParseTree (see happylang_resolver,
+happylang_typechecker) and marks the counted loops whose body only assigns
+elements of NUMBER arrays at the loop index, e.g.
+
+    for (i:=0; i<len(array); i:=i+1){
+        array[i] := array[i]**2
+    }
+
+with ParseTree.vector_loop, a VectorLoop. When NumPy is installed, the
+engines run such a loop as one NumPy operation per assignment over the
+whole index range, otherwise (or when the vectorized run cannot give the
+result of the loop, see VectorLoop.run) they run the loop as usual.
+
+A loop is vectorized when:
+    its start is `i := x`, its condition `i < bound` or `i <= bound`, its step `i := i + 1`,
+        with i a NUMBER variable, x a number or a NUMBER variable, bound a number,
+        a NUMBER variable or the len() of an array
+    every statement of its block is `a[i] := expr`, a a NUMBER array
+    expr only uses numbers, NUMBER variables, i, b[i] with b a NUMBER array,
+        +, -, *, /, %, ** and the negation
+Every array element read or written in an iteration is at the index i, so
+running the assignments one after the other over all the indexes gives the
+values of the loop, even when two arrays are the same.
+The results are the results of the scalar operations: +, -, *, /, % and the
+negation are the IEEE operations of NumPy, ** is computed by Python's pow.
+"""
+
+from happylang_parser import ParseType, RefType
+from happylang_lexer import Token
+from happylang_typechecker import declared_type, NUMBER
+from array import array
+import math
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+"""
+Parse types of the operations of a vectorized expression -> NumPy function
+(POW is computed by Python's pow, see VectorLoop)
+"""
+NUMPY_OPS = {ParseType.ADD: "add",
+             ParseType.SUB: "subtract",
+             ParseType.MUL: "multiply",
+             ParseType.DIV: "divide",
+             ParseType.MOD: "remainder"}
+
+CONDITIONS = {ParseType.AND, ParseType.OR, ParseType.LT, ParseType.LE, ParseType.GT, ParseType.GE,
+              ParseType.NE, ParseType.EQ}
+
+
+class VectorLoop:
+    """
+    A loop run as NumPy operations
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.LOOP)
+    index : ATOMIC parse tree of the loop variable in its start assignment
+    start : ATOMIC parse tree of the start value
+    bound : ATOMIC or LEN parse tree of the bound of the condition
+    inclusive : the condition is <=
+    assigns : ASSIGN parse trees of the block
+    """
+    def __init__(self, tree, index, start, bound, inclusive, assigns):
+        self.tree = tree
+        self.index = index
+        self.start = start
+        self.bound = bound
+        self.inclusive = inclusive
+        self.assigns = assigns
+
+    def run(self, load, store):
+        """
+        Run the loop with NumPy
+
+        Parameters
+        ----------
+        load : function(ATOMIC parse tree of a variable), value of the variable
+               (a float, the elements of an array)
+        store : function(ATOMIC parse tree of a variable, value), set the value of a NUMBER variable
+
+        Returns
+        -------
+        bool
+            False if the loop was not run: NumPy is not installed, or an element is
+            out of range, or an operation fails (division by 0, overflow, a complex
+            power...) and the loop must run as usual to report it
+        """
+        if np is None:
+            return False
+
+        start = self.__value(self.start, load)
+        if start != int(start):
+            # i is not an exact index
+            return False
+
+        start = int(start)
+        bound = self.__value(self.bound, load)
+        if not math.isfinite(bound):
+            return False
+
+        last = math.floor(bound) if self.inclusive else math.ceil(bound) - 1
+        n = max(0, last - start + 1)
+
+        if n > 0:
+            if start < 0:
+                return False
+
+            # arrays by identity, so that a copy is shared by every name of an array
+            copies = {}
+            for assign in self.assigns:
+                for ref in self.__arrays(assign):
+                    elements = load(ref)
+                    if type(elements) is not array or start + n > len(elements):
+                        return False
+
+                    if id(elements) not in copies:
+                        copies[id(elements)] = (elements, np.array(elements, dtype=np.float64))
+
+            indexes = np.arange(start, start + n, dtype=np.float64)
+            try:
+                with np.errstate(over="raise", divide="raise", invalid="raise", under="ignore"):
+                    for assign in self.assigns:
+                        target = copies[id(load(assign.children[0].children[0]))][1]
+                        target[start:start+n] = self.__expr(assign.children[1], load, copies, indexes, start, n)
+            except (FloatingPointError, ArithmeticError, TypeError, ValueError):
+                return False
+
+            for elements, copy in copies.values():
+                np.frombuffer(elements, dtype=np.float64)[start:start+n] = copy[start:start+n]
+
+        # value of i once the condition is false
+        store(self.index, float(start + n))
+        return True
+
+    def run_frame(self, frame):
+        """
+        run, the variables being in the given frame (see happylang_resolver)
+        """
+        def load(t):
+            if t.decl.ref_type == RefType.PRIMITIVE:
+                return frame[t.slot]
+
+            return frame[t.slot].val
+
+        def store(t, val):
+            frame[t.slot] = val
+
+        return self.run(load, store)
+
+    def __value(self, t, load):
+        if t.parse_type == ParseType.LEN:
+            return len(load(t.children[0]))
+
+        if t.token == Token.NUMBER:
+            return t.value
+
+        return load(t)
+
+    def __arrays(self, t):
+        """
+        Returns
+        -------
+        ATOMIC parse tree []
+            the arrays indexed in the tree
+        """
+        if t.parse_type == ParseType.INDEXING:
+            return [t.children[0]]
+
+        return [ref for child in t.children for ref in self.__arrays(child)]
+
+    def __expr(self, t, load, copies, indexes, start, n):
+        """
+        Returns
+        -------
+        float or ndarray of n floats
+            the values of the expression for all the indexes
+        """
+        pt = t.parse_type
+
+        if pt == ParseType.ATOMIC:
+            if t.token == Token.NUMBER:
+                return t.value
+            if t.decl is self.index.decl:
+                return indexes
+
+            return load(t)
+
+        if pt == ParseType.INDEXING:
+            return copies[id(load(t.children[0]))][1][start:start+n]
+
+        if pt == ParseType.NEG:
+            return np.negative(self.__expr(t.children[0], load, copies, indexes, start, n))
+
+        left = self.__expr(t.children[0], load, copies, indexes, start, n)
+        right = self.__expr(t.children[1], load, copies, indexes, start, n)
+
+        if pt == ParseType.POW:
+            # pow of NumPy may not round as Python's
+            left = np.broadcast_to(left, (n,)).tolist()
+            right = np.broadcast_to(right, (n,)).tolist()
+            return np.fromiter(map(pow, left, right), dtype=np.float64, count=n)
+
+        if (pt == ParseType.DIV or pt == ParseType.MOD) and not np.all(right):
+            # Division by 0 is reported by the loop
+            raise ZeroDivisionError
+
+        return getattr(np, NUMPY_OPS[pt])(left, right)
+
+
+class HappyVectorizer:
+    """
+    Find the loops of a resolved and type checked ParseTree(ParseType.PROGRAM) which can be vectorized
+    """
+    def __init__(self, tree):
+        self.__tree = tree
+        self.__loops = []
+
+    def vectorize(self):
+        """
+        Returns
+        -------
+        ParseTree(ParseType.LOOP) []
+            the loops marked with a VectorLoop
+        """
+        self.__walk(self.__tree)
+        return self.__loops
+
+    def __walk(self, t):
+        if t is None:
+            return
+
+        if t.parse_type == ParseType.LOOP:
+            t.vector_loop = self.__loop(t)
+            if t.vector_loop is not None:
+                self.__loops.append(t)
+                return
+
+        for child in t.children:
+            self.__walk(child)
+
+    def __number_var(self, t):
+        """
+        t is a NUMBER variable, declared when used
+        """
+        return (t.parse_type == ParseType.ATOMIC and t.decl is not None and not t.check_declared
+                and declared_type(t.decl) == NUMBER)
+
+    def __number_array(self, t):
+        return (t.parse_type == ParseType.ATOMIC and t.decl is not None and not t.check_declared
+                and t.decl.ref_type == RefType.ARRAY and t.decl.children[0].lexeme == "NUMBER")
+
+    def __is_index(self, t, index):
+        return t.parse_type == ParseType.ATOMIC and t.decl is index.decl and not t.check_declared
+
+    def __loop(self, t):
+        """
+        Returns
+        -------
+        VectorLoop or None
+        """
+        condition_idx = 0
+        for i in range(len(t.children)):
+            if t.children[i].parse_type in CONDITIONS:
+                condition_idx = i
+                break
+
+        starts = t.children[:condition_idx]
+        condition = t.children[condition_idx]
+        steps = t.children[condition_idx+1:-1]
+        block = t.children[-1]
+
+        # i := x
+        if len(starts) != 1 or len(steps) != 1:
+            return None
+
+        index, start = starts[0].children
+        if not self.__number_var(index):
+            return None
+        if not (start.parse_type == ParseType.ATOMIC and (start.token == Token.NUMBER or self.__number_var(start))):
+            return None
+
+        # i < bound, i <= bound
+        if condition.parse_type not in (ParseType.LT, ParseType.LE) or not self.__is_index(condition.children[0], index):
+            return None
+
+        bound = condition.children[1]
+        if bound.parse_type == ParseType.LEN:
+            ref = bound.children[0]
+            if not (ref.parse_type == ParseType.ATOMIC and ref.decl is not None and not ref.check_declared
+                    and ref.decl.ref_type == RefType.ARRAY):
+                return None
+        elif not (bound.parse_type == ParseType.ATOMIC and (bound.token == Token.NUMBER or self.__number_var(bound))):
+            return None
+
+        if self.__is_index(bound, index) or self.__is_index(start, index):
+            return None
+
+        # i := i + 1
+        step = steps[0]
+        target, increment = step.children
+        if not (self.__is_index(target, index) and increment.parse_type == ParseType.ADD):
+            return None
+
+        left, right = increment.children
+        if not (self.__is_index(left, index) and right.parse_type == ParseType.ATOMIC
+                and right.token == Token.NUMBER and right.value == 1.0):
+            return None
+
+        # a[i] := expr
+        assigns = list(block.children)
+        if not assigns:
+            return None
+
+        for assign in assigns:
+            if assign is None or assign.parse_type != ParseType.ASSIGN:
+                return None
+
+            target, expr = assign.children
+            if not (target.parse_type == ParseType.INDEXING and self.__number_array(target.children[0])
+                    and self.__is_index(target.children[1], index)):
+                return None
+
+            if not self.__element_wise(expr, index):
+                return None
+
+        return VectorLoop(t, index, start, bound, condition.parse_type == ParseType.LE, assigns)
+
+    def __element_wise(self, t, index):
+        """
+        t is an expression of the values at the index i
+        """
+        pt = t.parse_type
+
+        if pt == ParseType.ATOMIC:
+            return t.token == Token.NUMBER or self.__number_var(t)
+
+        if pt == ParseType.INDEXING:
+            return self.__number_array(t.children[0]) and self.__is_index(t.children[1], index)
+
+        if pt == ParseType.NEG:
+            return self.__element_wise(t.children[0], index)
+
+        if pt in NUMPY_OPS or pt == ParseType.POW:
+            return all(self.__element_wise(child, index) for child in t.children)
+
+        return False
+
+
+def vectorize(tree):
+    """
+    Mark the loops of the given parse tree which can be vectorized
+
+    Parameters
+    ----------
+    tree : ParseTree(ParseType.PROGRAM), resolved and type checked
+
+    Returns
+    -------
+    ParseTree(ParseType.LOOP) []
+        the loops marked with a VectorLoop
+    """
+    return HappyVectorizer(tree).vectorize()
+
+
+def report(loops, file=sys.stderr):
+    """
+    Print the vectorized loops
+    """
+    for t in loops:
+        if np is None:
+            print(f"loop on line {t.line} can be vectorized, but NumPy is not installed", file=file)
+        else:
+            print(f"vectorized loop on line {t.line}", file=file)
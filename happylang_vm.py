@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+Stack-based virtual machine for the happy language.
+
+run executes a Program produced by happylang_compiler with an operand stack
+and a stack of call frames (return address, frame of the caller), without
+any Python recursion: the depth of happy calls is only bounded by max_depth,
+not by the Python recursion limit. A frame is the list of the slots of a FUN/MAIN
+(see happylang_resolver). It behaves as happy.eval_parse_tree (same output, same
+error messages).
+"""
+
+from happylang_parser import RefType
+from happylang_compiler import OpCode
+from happylang_io import prompt
+from happylang_runtime import Ref, SlotRef, default_number, new_array, stack_overflow, read_input, DEFAULT_MAX_DEPTH
+from happylang_resolver import RETURN_SLOT
+from happylang_errors import HappyRuntimeError
+from happylang_governor import CHECK_STEPS
+import sys
+
+
+def run(program, max_depth=DEFAULT_MAX_DEPTH, stacks=None, governor=None):
+    """
+    Run the compiled program
+
+    Parameters
+    ----------
+    program : Program
+    max_depth : bound of the number of nested happy calls
+    stacks : CallStacks (see happylang_flamegraph) the calls are reported to, None
+    governor : Governor (see happylang_governor) the steps and the allocations are reported to, None
+
+    """
+    # opcodes as locals, compared by identity in the loop below
+    CONST = OpCode.CONST
+    LOAD = OpCode.LOAD
+    LOAD_SEQ = OpCode.LOAD_SEQ
+    INDEX = OpCode.INDEX
+    LEN = OpCode.LEN
+    ADD = OpCode.ADD
+    ADD_NUMBER = OpCode.ADD_NUMBER
+    CONCAT = OpCode.CONCAT
+    SUB = OpCode.SUB
+    MUL = OpCode.MUL
+    DIV = OpCode.DIV
+    MOD = OpCode.MOD
+    POW = OpCode.POW
+    NEG = OpCode.NEG
+    AND = OpCode.AND
+    OR = OpCode.OR
+    EQ = OpCode.EQ
+    NE = OpCode.NE
+    LT = OpCode.LT
+    LE = OpCode.LE
+    GT = OpCode.GT
+    GE = OpCode.GE
+    CHECK_DECLARED = OpCode.CHECK_DECLARED
+    LOAD_REF = OpCode.LOAD_REF
+    STORE_LOCAL = OpCode.STORE_LOCAL
+    STORE_LOCAL_FAST = OpCode.STORE_LOCAL_FAST
+    STORE = OpCode.STORE
+    STORE_INDEX = OpCode.STORE_INDEX
+    SWAP = OpCode.SWAP
+    PUSH = OpCode.PUSH
+    POP = OpCode.POP
+    VAR = OpCode.VAR
+    ENTER_MAIN = OpCode.ENTER_MAIN
+    POP_TOP = OpCode.POP_TOP
+    PRINT = OpCode.PRINT
+    PRINTLN = OpCode.PRINTLN
+    PROMPT = OpCode.PROMPT
+    INPUT = OpCode.INPUT
+    INPUT_INDEX = OpCode.INPUT_INDEX
+    JUMP = OpCode.JUMP
+    JUMP_BACK = OpCode.JUMP_BACK
+    JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE
+    VECTOR_LOOP = OpCode.VECTOR_LOOP
+    CALL_BEGIN = OpCode.CALL_BEGIN
+    BIND_ARG = OpCode.BIND_ARG
+    BIND_ARG_FAST = OpCode.BIND_ARG_FAST
+    CALL = OpCode.CALL
+    TAIL_CALL = OpCode.TAIL_CALL
+    RETURN = OpCode.RETURN
+    END_FUN = OpCode.END_FUN
+    FAIL = OpCode.FAIL
+    HALT = OpCode.HALT
+
+    PRIMITIVE = RefType.PRIMITIVE
+    ARRAY = RefType.ARRAY
+    STACK = RefType.STACK
+
+    code = program.code
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    frames = []
+    frame = None
+    pc = 0
+
+    # the steps (iterations of the loops, calls) are counted here and spent
+    # CHECK_STEPS at a time to the governor, the arrays being allocated
+    # through happylang_runtime.governor (see happylang_governor.governed)
+    steps = 0
+    if governor is not None:
+        spend = governor.spend
+        allocate = governor.allocate
+        governor_depth = governor.max_depth
+
+    while True:
+        op, arg, line = code[pc]
+        pc += 1
+
+        # the most frequent instructions first
+        if op is LOAD:
+            push(frame[arg])
+
+        elif op is CONST:
+            push(arg)
+
+        elif op is JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+
+        elif op is JUMP_BACK:
+            pc = arg
+            if governor is not None:
+                steps += 1
+                if steps == CHECK_STEPS:
+                    spend(steps, line)
+                    steps = 0
+
+        elif op is JUMP:
+            pc = arg
+
+        elif op is LT:
+            right = pop()
+            stack[-1] = stack[-1] < right
+
+        elif op is LE:
+            right = pop()
+            stack[-1] = stack[-1] <= right
+
+        elif op is GT:
+            right = pop()
+            stack[-1] = stack[-1] > right
+
+        elif op is GE:
+            right = pop()
+            stack[-1] = stack[-1] >= right
+
+        elif op is EQ:
+            right = pop()
+            stack[-1] = stack[-1] == right
+
+        elif op is NE:
+            right = pop()
+            stack[-1] = stack[-1] != right
+
+        elif op is STORE_LOCAL_FAST:
+            frame[arg] = pop()
+
+        elif op is ADD_NUMBER:
+            right = pop()
+            stack[-1] = stack[-1] + right
+
+        elif op is CONCAT:
+            right = pop()
+            stack[-1] = str(stack[-1]) + str(right)
+            if governor is not None:
+                allocate(len(stack[-1]), line)
+
+        elif op is ADD:
+            right = pop()
+            left = stack[-1]
+            if type(left)==str or type(right)==str:
+                left = str(left)
+                right = str(right)
+
+            stack[-1] = left + right
+            if governor is not None and type(left)==str:
+                allocate(len(stack[-1]), line)
+
+        elif op is SUB:
+            right = pop()
+            stack[-1] = stack[-1] - right
+
+        elif op is MUL:
+            right = pop()
+            stack[-1] = stack[-1] * right
+
+        elif op is STORE_LOCAL:
+            val = pop()
+            if type(val)!=type(frame[arg]):
+                raise HappyRuntimeError(f"Unmatched type when do the assignment on line {line}", line)
+
+            frame[arg] = val
+
+        elif op is LOAD_SEQ:
+            a = frame[arg]
+            if type(a)==Ref and a.ref_type in [ARRAY, STACK]:
+                push(a.val)
+            elif type(a)==str:
+                push(a)
+            else:
+                raise HappyRuntimeError(f"Indexing only applies to ARRAY or STACK or STRING, on line {line}", line)
+
+        elif op is INDEX:
+            index = int(pop())
+            seq = stack[-1]
+            if type(seq)!=str and (index<0 or index>=len(seq)):
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            stack[-1] = seq[index]
+
+        elif op is LOAD_REF:
+            push(SlotRef(frame, arg[0], arg[1]))
+
+        elif op is CHECK_DECLARED:
+            if frame[arg[0]] is None:
+                raise HappyRuntimeError(f"Undefined variable {arg[1]} on line {line}", line)
+
+        elif op is STORE:
+            val = pop()
+            var_ref = pop()
+            if not arg and type(val)!=type(var_ref.val):
+                raise HappyRuntimeError(f"Unmatched type when do the assignment on line {line}", line)
+
+            var_ref.val = val
+
+        elif op is STORE_INDEX:
+            val = pop()
+            idx = int(pop())
+            var_ref = pop()
+            if idx<0 or idx>=len(var_ref.val):
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            if not arg and type(val)!=type(var_ref.val[idx]):
+                raise HappyRuntimeError(f"Unmatched type when do the assignment on line {line}", line)
+
+            var_ref.val[idx] = val
+
+        elif op is SWAP:
+            left_indexed, right_indexed, type_checked = arg
+            right_idx = int(pop()) if right_indexed else None
+            right_var_ref = pop()
+            left_idx = int(pop()) if left_indexed else None
+            left_var_ref = pop()
+
+            if left_idx is None:
+                left_val = left_var_ref.val
+            else:
+                if left_idx<0 or left_idx>=len(left_var_ref.val):
+                    raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+                left_val = left_var_ref.val[left_idx]
+
+            if right_idx is None:
+                right_val = right_var_ref.val
+            else:
+                if right_idx<0 or right_idx>=len(right_var_ref.val):
+                    raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+                right_val = right_var_ref.val[right_idx]
+
+            # check data type
+            if not type_checked and type(left_val)!=type(right_val):
+                raise HappyRuntimeError(f"Unmatched data type when do the swap on line {line}", line)
+
+            # assign the swapped values to Refs
+            if left_idx is None:
+                left_var_ref.val = right_val
+            else:
+                left_var_ref.val[left_idx] = right_val
+
+            if right_idx is None:
+                right_var_ref.val = left_val
+            else:
+                right_var_ref.val[right_idx] = left_val
+
+        elif op is CALL_BEGIN:
+            push((arg, [None]*arg.frame_size))
+
+        elif op is BIND_ARG:
+            arg_val = pop()
+            fun, called_fun_frame = stack[-1]
+            param_data_type, param_ref_type, param_slot, param_tree, param_col = fun.params[arg]
+
+            if type(arg_val)==str:
+                arg_ref_type = PRIMITIVE
+                arg_data_type = "STRING"
+                arg_value = arg_val
+            elif type(arg_val)==float:
+                arg_ref_type = PRIMITIVE
+                arg_data_type = "NUMBER"
+                arg_value = arg_val
+            else:
+                arg_ref_type = arg_val.ref_type
+                arg_data_type = arg_val.ref_tree.children[0].lexeme
+                arg_value = arg_val.val
+
+            # check param and arg
+            if param_data_type != arg_data_type or param_ref_type != arg_ref_type:
+                raise HappyRuntimeError(
+                    f"Data Type not matched on line {line}, column {param_col}.\nExpect {param_data_type+' '+param_ref_type.name}, but received {arg_data_type+' '+arg_ref_type.name}", line)
+
+            # bind the variable to the frame
+            if param_ref_type is PRIMITIVE:
+                called_fun_frame[param_slot] = arg_value
+            else:
+                called_fun_frame[param_slot] = Ref(param_ref_type, param_tree, arg_value)
+
+        elif op is BIND_ARG_FAST:
+            arg_val = pop()
+            fun, called_fun_frame = stack[-1]
+            param_data_type, param_ref_type, param_slot, param_tree, param_col = fun.params[arg]
+
+            if param_ref_type is PRIMITIVE:
+                called_fun_frame[param_slot] = arg_val
+            else:
+                called_fun_frame[param_slot] = Ref(param_ref_type, param_tree, arg_val.val)
+
+        elif op is CALL:
+            fun, called_fun_frame = pop()
+            if len(frames) == max_depth:
+                stack_overflow(line)
+            if governor is not None:
+                if len(frames) == governor_depth:
+                    raise governor.depth_limit(line)
+                steps += 1
+                if steps == CHECK_STEPS:
+                    spend(steps, line)
+                    steps = 0
+
+            frames.append((pc, frame))
+            frame = called_fun_frame
+            pc = fun.entry
+            if stacks is not None:
+                stacks.enter(fun.name, line)
+
+        elif op is TAIL_CALL:
+            fun, called_fun_frame = pop()
+            if arg is not None and frames[-1][0] != arg:
+                # the value is discarded: the current call returns through the
+                # discarding return, pushed once (see happylang_compiler)
+                if len(frames) == max_depth:
+                    stack_overflow(line)
+                if governor is not None and len(frames) == governor_depth:
+                    raise governor.depth_limit(line)
+
+                frames.append((arg, None))
+            elif stacks is not None:
+                stacks.leave()
+
+            if stacks is not None:
+                stacks.enter(fun.name, line)
+            if governor is not None:
+                steps += 1
+                if steps == CHECK_STEPS:
+                    spend(steps, line)
+                    steps = 0
+
+            frame = called_fun_frame
+            pc = fun.entry
+
+        elif op is END_FUN:
+            return_val = frame[RETURN_SLOT]
+            pc, frame = frames.pop()
+            push(return_val)
+            if stacks is not None:
+                stacks.leave()
+
+        elif op is RETURN:
+            return_val = pop()
+            pc, frame = frames.pop()
+            push(return_val)
+            if stacks is not None:
+                stacks.leave()
+
+        elif op is POP_TOP:
+            pop()
+
+        elif op is PUSH:
+            pushed_value = pop()
+            var_ref = pop()
+
+            if not arg:
+                stack_data_type = var_ref.ref_tree.children[0].lexeme
+                if (type(pushed_value)==str and stack_data_type!="STRING") or (type(pushed_value)==float and stack_data_type!="NUMBER"):
+                    raise HappyRuntimeError(f"On line {line}, stack is of type {stack_data_type}, but the pushed value is not a {stack_data_type}", line)
+
+            if governor is not None:
+                allocate(1, line)
+
+            var_ref.val.append(pushed_value)
+            push(pushed_value)
+
+        elif op is POP:
+            var_ref = stack[-1]
+            popped_val = var_ref.val[-1]
+            del var_ref.val[-1]
+            stack[-1] = popped_val
+
+        elif op is PRINT or op is PRINTLN:
+            # one write of the joined values (see happylang_io)
+            parts = stack[len(stack)-arg:]
+            del stack[len(stack)-arg:]
+
+            for i, val in enumerate(parts):
+                if type(val) == float:
+                    parts[i] = str(val)
+
+            if op is PRINTLN:
+                parts.append("\n")
+
+            sys.stdout.write("".join(parts))
+
+        elif op is DIV or op is MOD:
+            right = pop()
+            left = stack[-1]
+
+            if right == 0:
+                raise HappyRuntimeError(f"Division by 0 on line {line}", line)
+
+            stack[-1] = left/right if op is DIV else left%right
+
+        elif op is POW:
+            right = pop()
+            stack[-1] = stack[-1] ** right
+
+        elif op is NEG:
+            stack[-1] = -stack[-1]
+
+        elif op is AND:
+            right = pop()
+            stack[-1] = stack[-1] and right
+
+        elif op is OR:
+            right = pop()
+            stack[-1] = stack[-1] or right
+
+        elif op is LEN:
+            v = frame[arg]
+            if type(v)==Ref and v.ref_type in [ARRAY, STACK]:
+                push(len(v.val))
+            elif type(v)==str:
+                push(len(v))
+            else:
+                raise HappyRuntimeError(f"len() expects argument of type ARRAY or STACK or STRING on line {line}", line)
+
+        elif op is VAR:
+            slot, t = arg
+            if frame[slot] is not None:
+                raise HappyRuntimeError(f"Reference declared twice on line {line}", line)
+
+            val = default_number()
+            if t.ref_type == PRIMITIVE and t.children[0].lexeme=="STRING":
+                val = ""
+
+            if t.ref_type == ARRAY:
+                val = Ref(ARRAY, t, new_array(t, pop()))
+
+            if t.ref_type == STACK:
+                val = Ref(STACK, t, [])
+
+            frame[slot] = val
+
+        elif op is PROMPT:
+            prompt(arg)
+
+        elif op is INPUT or op is INPUT_INDEX:
+            idx = int(pop()) if op is INPUT_INDEX else None
+            var_ref = pop()
+            if idx is not None and idx<0:
+                raise HappyRuntimeError(f"Index out of range on line {line}", line)
+
+            # read the input
+            input_val = read_input(var_ref.ref_tree, line)
+
+            # assign the input value to the Ref object
+            if idx is None:
+                var_ref.val = input_val
+            else:
+                if idx>=len(var_ref.val):
+                    raise HappyRuntimeError(f"Index out of range on line {line}\nList of size {len(var_ref.val)}", line)
+
+                var_ref.val[idx] = input_val
+
+        elif op is VECTOR_LOOP:
+            vector_loop, target = arg
+            if vector_loop.run_frame(frame):
+                pc = target
+
+        elif op is ENTER_MAIN:
+            frame = [None]*arg
+
+        elif op is FAIL:
+            raise HappyRuntimeError(arg, line)
+
+        elif op is HALT:
+            if governor is not None:
+                governor.steps += steps
+            return
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Batch runner (see happylang_batch): a job which cannot be checked or which
+kills its worker process is reported as such, the other jobs being run.
+
+usage: python -m pytest tests
+"""
+
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import happylang_batch
+from happylang_batch import Job, init_worker, run_batch, run_job, summary
+
+SOURCE = "main(){\n  println 1 + 2\n}\n"
+
+
+def write_jobs(tmp_path, names):
+    """
+    Returns
+    -------
+    Job [] of a script printing 3 for each name, its expected output written
+    """
+    jobs = []
+    for name in names:
+        script = tmp_path / f"{name}.happy"
+        script.write_text(SOURCE)
+        expected = tmp_path / f"{name}.out"
+        expected.write_text("3.0\n")
+        jobs.append(Job(str(script), None, str(expected)))
+
+    return jobs
+
+
+def test_missing_expected(tmp_path):
+    job = Job(write_jobs(tmp_path, ["p"])[0].script, None, str(tmp_path / "missing.out"))
+
+    init_worker("tree", 1000)
+    result = run_job(job)
+    assert result.status == "ok"
+    assert result.matched is None
+    assert "missing.out" in result.error
+
+
+def test_missing_expected_batch(tmp_path):
+    jobs = write_jobs(tmp_path, ["a", "b"])
+    jobs.insert(1, Job(jobs[0].script, None, str(tmp_path / "missing.out")))
+
+    results = run_batch(jobs, workers=1)
+    assert [r.matched for r in results] == [True, None, True]
+    assert summary(jobs, results, 0.0)["unchecked"] == 1
+
+
+def exit_on_crash_script(path):
+    """
+    read_text of the workers, whose process exits reading a script named crash.happy
+    """
+    if os.path.basename(path) == "crash.happy":
+        os._exit(3)
+
+    with open(path, encoding="utf8") as f:
+        return f.read()
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the workers must inherit the read_text of the test")
+def test_worker_exits(tmp_path, monkeypatch):
+    monkeypatch.setattr(happylang_batch, "read_text", exit_on_crash_script)
+    jobs = write_jobs(tmp_path, ["a", "crash", "b", "c"])
+
+    results = run_batch(jobs, workers=2)
+    assert [r.script for r in results] == [job.script for job in jobs]
+    assert [r.status for r in results] == ["ok", "crash", "ok", "ok"]
+    assert [r.matched for r in results] == [True, None, True, True]
+    assert results[1].error == "the worker process stopped"
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of precompiled programs (see happylang_cache): only the files signed
+with the secret of the user are unpickled.
+
+usage: python -m pytest tests
+"""
+
+import io
+import os
+import pickle
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_cache import ProgramCache, MAGIC, cache_key
+from happy import parse_program
+
+SOURCE = b"main(){\n  println 1 + 2\n}\n"
+
+
+class Payload:
+    """
+    Pickle creating a file when it is unpickled
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, "w"))
+
+
+def make_cache(tmp_path):
+    return ProgramCache(str(tmp_path / "cache"), secret_path=str(tmp_path / "config" / "cache.secret"))
+
+
+def parse():
+    return parse_program(io.StringIO(SOURCE.decode("utf8")))
+
+
+def test_store_and_load(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("p.happy", SOURCE, parse())
+
+    tree = cache.load("p.happy", SOURCE)
+    assert tree is not None
+    assert tree.parse_type == parse().parse_type
+    assert os.stat(tmp_path / "config" / "cache.secret").st_mode & 0o077 == 0
+
+
+def test_foreign_pickle_is_not_loaded(tmp_path):
+    cache = make_cache(tmp_path)
+    path = cache.path("p.happy", SOURCE)
+    os.makedirs(os.path.dirname(path))
+    marker = tmp_path / "unpickled"
+
+    # the format of the cache before signatures, and a header of a forged signature
+    key = cache_key(SOURCE).encode("ascii")
+    for content in [pickle.dumps((cache_key(SOURCE), Payload(str(marker)))),
+                    b"\n".join([MAGIC, key, b"0"*64, pickle.dumps(Payload(str(marker)))])]:
+        with open(path, "wb") as f:
+            f.write(content)
+
+        assert cache.load("p.happy", SOURCE) is None
+        assert not marker.exists()
+
+
+def test_tampered_file_is_not_loaded(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("p.happy", SOURCE, parse())
+    path = cache.path("p.happy", SOURCE)
+    with open(path, "rb") as f:
+        content = f.read()
+    with open(path, "wb") as f:
+        f.write(content[:-1] + bytes([content[-1] ^ 1]))
+
+    assert cache.load("p.happy", SOURCE) is None
+
+
+def test_other_secret_is_not_trusted(tmp_path):
+    make_cache(tmp_path).store("p.happy", SOURCE, parse())
+    other = ProgramCache(str(tmp_path / "cache"), secret_path=str(tmp_path / "other" / "cache.secret"))
+
+    assert other.load("p.happy", SOURCE) is None
+
+
+def test_shared_secret_is_not_trusted(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.store("p.happy", SOURCE, parse())
+    os.chmod(tmp_path / "config" / "cache.secret", 0o644)
+
+    assert make_cache(tmp_path).load("p.happy", SOURCE) is None
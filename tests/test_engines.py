@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Programs run with every engine (see happy.ENGINES), which must give the
+same output and report the same errors on the same lines.
+
+usage: python -m pytest tests
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_api import Interpreter
+from happylang_batch import Job, init_worker, run_job
+from happylang_errors import HappyRuntimeError
+from happylang_flamegraph import CallStacks
+from happylang_io import buffered_output
+from happy import ENGINES, parse_program, run_traced
+
+
+def run(engine, source, stdin=""):
+    """
+    Returns
+    -------
+    (output, message of the HappyRuntimeError raised or None)
+    """
+    output = []
+    try:
+        Interpreter(engine).compile(source).run(stdin, stdout=Output(output))
+    except HappyRuntimeError as e:
+        return "".join(output), e.message
+
+    return "".join(output), None
+
+
+class Output:
+    def __init__(self, parts):
+        self.parts = parts
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def flush(self):
+        pass
+
+
+"""
+Programs indexing arrays out of range, each reported as such on line 4
+"""
+NEGATIVE_INDEXES = {
+    "assign": "main(){\n  NUMBER [3] a\n  println \"start\"\n  a[0-1] := 5\n  println a[2]\n}\n",
+    "read": "main(){\n  NUMBER [3] a\n  println \"start\"\n  println a[0-1]\n}\n",
+    "swap left": "main(){\n  NUMBER [3] a\n  println \"start\"\n  a[0-2] :=: a[0]\n}\n",
+    "swap right": "main(){\n  NUMBER [3] a\n  println \"start\"\n  a[0] :=: a[0-2]\n}\n",
+    "input": "main(){\n  NUMBER [3] a\n  println \"start\"\n  input a[0-1]\n  println a[2]\n}\n",
+    "stack": "main(){\n  NUMBER|_| st\n  st.push(1)\n  println st[0-1]\n}\n",
+    "past the end": "main(){\n  NUMBER [3] a\n  println \"start\"\n  a[3] := 5\n}\n",
+}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", NEGATIVE_INDEXES)
+def test_index_out_of_range(engine, name):
+    output, error = run(engine, NEGATIVE_INDEXES[name], "7\n")
+    assert error == "Index out of range on line 4"
+    assert output == run("tree", NEGATIVE_INDEXES[name], "7\n")[0]
+
+
+"""
+Assignments and swaps of an element at index -1, which must not replace the whole variable
+"""
+MINUS_ONE = {
+    "assign": "main(){\n  NUMBER [3] a\n  a[0-1] := 5\n  println len(a)\n}\n",
+    "swap": "main(){\n  NUMBER [3] a\n  a[0] :=: a[0-1]\n  println len(a)\n}\n",
+}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", MINUS_ONE)
+def test_index_minus_one(engine, name):
+    assert run(engine, MINUS_ONE[name]) == ("", "Index out of range on line 3")
+
+
+class RecordedStacks(CallStacks):
+    """
+    CallStacks recording the calls entered and left
+    """
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def enter(self, name, line):
+        self.events.append(f"enter {name}:{line}")
+        super().enter(name, line)
+
+    def leave(self):
+        self.events.append("leave")
+        super().leave()
+
+
+"""
+Programs of tail calls: their value returned, discarded, and both
+"""
+TAIL_CALLS = {
+    "hanoi": "main(){\n  NUMBER |_| s\n  NUMBER |_| t\n  NUMBER |_| a\n  s.push(2)\n  s.push(1)\n  move(2, s, t, a)\n}\n\n"
+             "move(NUMBER n, NUMBER |_| s, NUMBER |_| t, NUMBER |_| a){\n  if n>0 {\n    move(n-1, s, a, t)\n"
+             "    NUMBER last := s.pop()\n    t.push(last)\n    move(n-1, a, t, s)\n  }\n}\n",
+    "countdown": "main(){\n  println countdown(3, 0)\n}\n\n"
+                 "countdown(NUMBER n, NUMBER acc){\n  if n = 0 {\n    return acc\n  }\n  return countdown(n - 1, acc + 1)\n}\n",
+    "mixed": "main(){\n  f(3)\n  println g(2)\n}\n\nf(NUMBER n){\n  if n > 0 {\n    println n\n    f(n - 1)\n  }\n}\n\n"
+             "g(NUMBER n){\n  if n > 0 {\n    f(n)\n    return g(n - 1)\n  }\n  return n\n}\n",
+}
+
+
+@pytest.mark.parametrize("name", TAIL_CALLS)
+def test_tail_call_stacks(name):
+    events = {}
+    for engine in ENGINES:
+        stacks = RecordedStacks()
+        tree = parse_program(io.StringIO(TAIL_CALLS[name]))
+        with buffered_output("block"):
+            run_traced(tree, stacks, engine)
+        events[engine] = stacks.events
+        assert stacks.stack == [0]
+
+    assert events["tree"] == events["vm"]
+    assert events["closure"] == events["vm"]
+
+
+"""
+Programs reading an input which is not a number, or no input -> (input, error)
+"""
+BAD_INPUTS = {
+    "not a number": ("abc\n", "Expect a NUMBER as input on line 3, but received 'abc'"),
+    "no input": ("", "No input left to read on line 3"),
+    "input over": ("1\n", "No input left to read on line 3"),
+}
+
+INPUT_PROGRAM = "main(){\n  NUMBER [2] a\n  input \"numbers:\"; a[0], a[1]\n  println a[0] + a[1]\n}\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", BAD_INPUTS)
+def test_bad_input(engine, name):
+    stdin, error = BAD_INPUTS[name]
+    assert run(engine, INPUT_PROGRAM, stdin) == ("", error)
+
+
+def test_bad_input_batch(tmp_path):
+    script = tmp_path / "p.happy"
+    script.write_text(INPUT_PROGRAM)
+    stdin = tmp_path / "p.in"
+    stdin.write_text("abc\n")
+
+    init_worker("tree", 1000)
+    result = run_job(Job(str(script), str(stdin), None))
+    assert result.status == "error"
+    assert result.error == BAD_INPUTS["not a number"][1]
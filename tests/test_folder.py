@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Programs run folded and not folded (see happylang_folder) with every
+engine, which must give the same output and fail the same way.
+
+usage: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_api import Interpreter
+from happy import ENGINES
+
+
+def run(interpreter, source):
+    """
+    Returns
+    -------
+    the output, or the type and the message of the exception raised
+    """
+    try:
+        return interpreter.run(source)
+    except Exception as e:
+        return (type(e), str(e))
+
+
+"""
+Programs of foldable expressions and identities
+"""
+PROGRAMS = {
+    "constants": "main(){\n  println 2**10*4 - -1\n  println (60*60 - 1) / 7 % 5\n  println 0-0\n}\n",
+    "strings": "main(){\n  STRING s\n  s := \"a\" + 1 + \"b\" + 2*3\n  println s\n}\n",
+    "identities": "main(){\n  NUMBER x\n  x := 0-0.5\n  println x*1, 1*x, x-0, x/1, x**1\n}\n",
+    "square": "main(){\n  NUMBER x\n  x := 4317.656\n  println x**2\n}\n",
+    "square overflow": "main(){\n  NUMBER x\n  x := 10**200\n  println x**2\n}\n",
+    "overflow": "main(){\n  println 10**400\n}\n",
+    "division by 0": "main(){\n  println \"start\"\n  println 1/(1-1)\n}\n",
+    "modulo by 0": "main(){\n  println 1%0\n}\n",
+}
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_fold(engine, name):
+    source = PROGRAMS[name]
+    assert run(Interpreter(engine), source) == run(Interpreter(engine, fold=False), source)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Messages of the execution service (see happylang_server).
+
+usage: python -m pytest tests
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from happylang_server import HappyServer
+
+SOURCE = "main(){\n  println \"hello\"\n}\n"
+
+LOOP = "main(){\n  NUMBER i\n  for (i:=0; i<1; i:=i*1){\n  }\n}\n"
+
+
+async def exchange(path, messages, replies):
+    """
+    Send the messages over a connection
+
+    Returns
+    -------
+    the first `replies` messages received
+    """
+    reader, writer = await asyncio.open_unix_connection(path)
+    for message in messages:
+        writer.write((json.dumps(message) + "\n").encode("utf8"))
+    await writer.drain()
+
+    received = [json.loads(await reader.readline()) for _ in range(replies)]
+    writer.close()
+    return received
+
+
+async def serve_and_exchange(path, messages, replies, **options):
+    server = HappyServer(workers=1, **options)
+    serving = asyncio.create_task(server.serve(unix=path))
+    try:
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            await asyncio.sleep(0.05)
+
+        return await asyncio.wait_for(exchange(path, messages, replies), 60)
+    finally:
+        serving.cancel()
+        await asyncio.gather(serving, return_exceptions=True)
+
+
+def test_unhashable_ids(tmp_path):
+    messages = [{"cancel": [1]},
+                {"id": [1], "source": SOURCE},
+                {"id": {"a": 1}, "source": SOURCE},
+                {"id": 7, "source": SOURCE}]
+    received = asyncio.run(serve_and_exchange(str(tmp_path / "happy.sock"), messages, 5))
+
+    invalid = {"id": None, "status": "invalid", "error": "an id is a string, a number or null"}
+    assert received[:3] == [invalid]*3
+    assert received[3:] == [{"id": 7, "output": "hello\n"}, {"id": 7, "status": "ok"}]
+
+
+def test_cancel_when_full(tmp_path):
+    messages = [{"id": 1, "source": LOOP}, {"cancel": 1}]
+    received = asyncio.run(serve_and_exchange(str(tmp_path / "happy.sock"), messages, 1, max_pending=1))
+
+    assert received == [{"id": 1, "status": "cancelled"}]
+
+
+def test_cancel_with_a_request_held(tmp_path):
+    messages = [{"id": 1, "source": LOOP}, {"id": 2, "source": SOURCE}, {"cancel": 1}]
+    received = asyncio.run(serve_and_exchange(str(tmp_path / "happy.sock"), messages, 3, max_pending=1))
+
+    assert received == [{"id": 1, "status": "cancelled"}, {"id": 2, "output": "hello\n"}, {"id": 2, "status": "ok"}]
+
+
+def test_cancel_held_request(tmp_path):
+    messages = [{"id": 1, "source": LOOP}, {"id": 2, "source": SOURCE}, {"cancel": 2}, {"cancel": 1}]
+    received = asyncio.run(serve_and_exchange(str(tmp_path / "happy.sock"), messages, 2, max_pending=1))
+
+    assert received == [{"id": 2, "status": "cancelled"}, {"id": 1, "status": "cancelled"}]